@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark lắp ráp ngữ cảnh: số token ngữ cảnh trước/sau khi gộp chunk chồng lấn, bỏ đoạn gần trùng
+và xếp vào ngân sách token, trên dữ liệu trong data/ với cấu hình chunk của ingestion
+
+Với mỗi câu hỏi trong golden_set.json, top_k chunk được chọn bằng embedding băm (không gọi API) rồi
+đưa qua ContextAssembler. "Giữ nội dung" là tỉ lệ câu (khác nhau) của các chunk đã chọn còn nằm trong
+ngữ cảnh sau khi gộp + khử trùng lặp (không giới hạn ngân sách): gộp chồng lấn không được làm mất nội dung.
+
+Chạy: python benchmarks/benchmark_context_assembly.py --top-ks 5 10 20 50 --budget 8000
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from ingestion import CHUNK_OVERLAP_TOKEN_SIZE, CHUNK_TOKEN_SIZE, _get_token_encoder, chunk_text, read_data_file  # noqa: E402
+from util.context_assembly_util import ContextAssembler                                                          # noqa: E402
+from util.local_backend_util import hash_embed                                                                   # noqa: E402
+
+DATA_FILES = [os.path.join(ROOT_DIR, "data", "data.txt"), os.path.join(ROOT_DIR, "data", "data.json")]
+GOLDEN_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_set.json")
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_token_encoder()
+    return len(encoder.encode(text)) if encoder else len(text.split())
+
+
+def build_chunks(chunk_size: int, overlap: int) -> list:
+    """
+    Chia từng file như pipeline ingestion, giữ file nguồn như chunk của LightRAG
+    """
+    chunks = []
+    for file_path in DATA_FILES:
+        pieces, _ = chunk_text(read_data_file(file_path), chunk_size, overlap)
+        chunks.extend({"chunk_id": f"{os.path.basename(file_path)}-{i}", "content": piece, "file_path": file_path}
+                      for i, piece in enumerate(pieces))
+    return chunks
+
+
+def sentences(texts: list) -> set:
+    return {" ".join(sentence.split()) for text in texts
+            for sentence in re.split(r"(?<=[.!?])\s+|\n+", text) if len(sentence.split()) >= 4}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Context assembly token reduction benchmark")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_TOKEN_SIZE)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKEN_SIZE)
+    parser.add_argument("--top-ks", type=int, nargs="+", default=[5, 10, 20, 50])
+    parser.add_argument("--budget", type=int, default=8000, help="Ngân sách token của phần chunk")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    with open(GOLDEN_SET, "r", encoding="utf-8") as f:
+        questions = [item["question"] for item in json.load(f)["questions"]]
+    chunks = build_chunks(args.chunk_size, args.overlap)
+    embeddings = hash_embed([chunk["content"] for chunk in chunks])
+    unbounded = ContextAssembler(token_budget=0, dedup_threshold=args.dedup_threshold)
+    budgeted = ContextAssembler(token_budget=args.budget, dedup_threshold=args.dedup_threshold)
+
+    tokenizer_name = "tiktoken" if _get_token_encoder() else "whitespace (tiktoken unavailable)"
+    print(f"🚀 Context assembly: {len(chunks)} chunks (size {args.chunk_size}, overlap {args.overlap}), "
+          f"{len(questions)} questions, budget {args.budget}, tokens counted with {tokenizer_name}")
+    print("=" * 104)
+    print(f"{'top_k':>5} {'raw tokens':>11} {'merged+dedup':>13} {'reduction':>10} {'budgeted':>9} "
+          f"{'reduction':>10} {'merged':>7} {'dups':>5} {'kept content':>13} {'ms':>7}")
+
+    results = []
+    for top_k in args.top_ks:
+        raw, deduped, packed, merged, dups, kept, latencies = [], [], [], [], [], [], []
+        for question in questions:
+            ranked = np.argsort(-(embeddings @ hash_embed([question])[0]), kind="stable")[:top_k]
+            retrieved = [chunks[int(i)] for i in ranked]
+
+            started = time.perf_counter()
+            assembled, stats = unbounded.assemble(retrieved, count_tokens)
+            latencies.append((time.perf_counter() - started) * 1000)
+            _, budget_stats = budgeted.assemble(retrieved, count_tokens)
+
+            raw.append(stats["tokens_before"])
+            deduped.append(stats["tokens_after"])
+            packed.append(budget_stats["tokens_after"])
+            merged.append(stats["chunks_merged"])
+            dups.append(stats["duplicates_dropped"])
+            before = sentences([chunk["content"] for chunk in retrieved])
+            after = " ".join(" ".join(chunk["content"].split()) for chunk in assembled)
+            kept.append(sum(sentence in after for sentence in before) / max(len(before), 1))
+
+        r = {
+            "top_k": top_k,
+            "raw_tokens": statistics.mean(raw),
+            "assembled_tokens": statistics.mean(deduped),
+            "budgeted_tokens": statistics.mean(packed),
+            "chunks_merged": statistics.mean(merged),
+            "duplicates_dropped": statistics.mean(dups),
+            "content_kept": statistics.mean(kept),
+            "p50_ms": statistics.median(latencies),
+        }
+        results.append(r)
+        print(f"{top_k:>5} {r['raw_tokens']:>11.0f} {r['assembled_tokens']:>13.0f} "
+              f"{1 - r['assembled_tokens'] / r['raw_tokens']:>9.1%} {r['budgeted_tokens']:>9.0f} "
+              f"{1 - r['budgeted_tokens'] / r['raw_tokens']:>9.1%} {r['chunks_merged']:>7.1f} "
+              f"{r['duplicates_dropped']:>5.1f} {r['content_kept']:>12.1%} {r['p50_ms']:>7.2f}")
+
+    print("=" * 104)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Results written to {args.output}")
+    print("🏁 Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-corpus: bộ nhớ và độ trễ khi số corpus tăng dần
+Dùng MockLightRAG làm backend cục bộ nên không cần OpenAI/Neo4j
+
+Chạy: python benchmarks/benchmark_corpus.py --counts 1 4 16 64 --max-loaded 8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from mock_lightrag import MockLightRAG                # noqa: E402
+from service.corpus_service import CorpusService      # noqa: E402
+from service.rag_service import RAGService            # noqa: E402
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+QUESTIONS = ["Napoleon là ai?", "Trận Waterloo diễn ra khi nào?", "Garde Impériale là gì?"]
+
+
+async def mock_rag_factory(working_dir: str) -> MockLightRAG:
+    """
+    Tạo backend cục bộ thay cho LightRAG thật
+    """
+    rag = MockLightRAG(working_dir=working_dir)
+    await rag.initialize_storages()
+    return rag
+
+
+def mock_service_factory(corpus_id, data_path, data_path_json, working_dir):
+    return RAGService(data_path, data_path_json, working_dir=working_dir, rag_factory=mock_rag_factory)
+
+
+def prepare_corpora(root: str, count: int) -> str:
+    """
+    Tạo `count` corpus, mỗi corpus là một bản sao của dữ liệu mẫu
+    """
+    data_root = os.path.join(root, "corpora")
+    for i in range(count):
+        corpus_dir = os.path.join(data_root, f"corpus-{i}")
+        os.makedirs(corpus_dir, exist_ok=True)
+        shutil.copy(os.path.join(DATA_DIR, "data.txt"), corpus_dir)
+        shutil.copy(os.path.join(DATA_DIR, "data.json"), corpus_dir)
+    return data_root
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+async def run_scenario(count: int, max_loaded: int, max_memory_mb: float, queries: int) -> dict:
+    """
+    Chạy truy vấn ngẫu nhiên (phân bố lệch về các corpus đầu) trên `count` corpus
+    """
+    root = tempfile.mkdtemp(prefix="corpus_bench_")
+    try:
+        data_root = prepare_corpora(root, count)
+        tracemalloc.start()
+        manager = CorpusService(
+            os.path.join(DATA_DIR, "data.txt"), os.path.join(DATA_DIR, "data.json"),
+            data_root=data_root, storage_root=os.path.join(root, "storage"),
+            max_loaded=max_loaded, max_memory_mb=max_memory_mb,
+            service_factory=mock_service_factory,
+        )
+
+        rng = random.Random(42)
+        weights = [1.0 / (i + 1) for i in range(count)]
+        latencies = []
+        for _ in range(queries):
+            corpus_id = f"corpus-{rng.choices(range(count), weights=weights)[0]}"
+            started = time.perf_counter()
+            async with manager.use(corpus_id) as service:
+                await service.get_answer(rng.choice(QUESTIONS), mode="mix", top_k=5)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        status = manager.get_status()
+        return {
+            "corpora": count,
+            "loaded": status["items"],
+            "evictions": status["evictions"],
+            "hit_rate": status["hit_rate"],
+            "est_mb": status["total_bytes"] / 1024 / 1024,
+            "heap_mb": current / 1024 / 1024,
+            "peak_mb": peak / 1024 / 1024,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 0.95),
+            "max_ms": max(latencies),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-corpus memory/latency benchmark")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--max-loaded", type=int, default=8)
+    parser.add_argument("--max-memory-mb", type=float, default=64)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    print("🚀 Multi-corpus benchmark")
+    print(f"max_loaded={args.max_loaded}, max_memory_mb={args.max_memory_mb}, queries={args.queries}")
+    print("=" * 100)
+    header = f"{'corpora':>8} {'loaded':>7} {'evict':>6} {'hit%':>6} {'est MB':>8} {'heap MB':>8} {'peak MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+    print(header)
+    for count in args.counts:
+        # Ẩn log chi tiết của service để bảng kết quả dễ đọc
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = asyncio.run(run_scenario(count, args.max_loaded, args.max_memory_mb, args.queries))
+        print(f"{r['corpora']:>8} {r['loaded']:>7} {r['evictions']:>6} {r['hit_rate'] * 100:>5.1f}% "
+              f"{r['est_mb']:>8.2f} {r['heap_mb']:>8.2f} {r['peak_mb']:>8.2f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['max_ms']:>8.2f}")
+    print("=" * 100)
+    print("🏁 Done. Cold loads show up in p95/max; heap stays bounded by max_loaded/max_memory_mb.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark tìm kiếm dự phòng: TextSearchUtil (chuỗi thô + set token mỗi truy vấn)
+so với FallbackIndex (mảng NumPy + buffer memory-map) ở 10x, 100x, 1000x data.txt
+
+Chạy: python benchmarks/benchmark_fallback_index.py --scales 10 100 1000
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from util.fallback_index_util import FallbackIndex    # noqa: E402
+from util.text_search_util import TextSearchUtil      # noqa: E402
+
+QUESTIONS = [
+    "Napoleon là ai?",
+    "Napoleon sinh năm nào?",
+    "Trận Austerlitz là gì?",
+    "Trận Waterloo diễn ra khi nào?",
+    "Chiến dịch Nga diễn ra năm nào?",
+]
+
+
+def load_corpus(scale: int) -> str:
+    """
+    Tạo corpus bằng cách lặp lại data.txt `scale` lần (mỗi bản có tiêu đề riêng)
+    """
+    with open(os.path.join(ROOT_DIR, "data", "data.txt"), "r", encoding="utf-8") as f:
+        base = f.read()
+    return "\n\n".join(f"=== Bản sao {i} ===\n\n{base}" for i in range(scale))
+
+
+def measure_latency(search, repeats: int) -> list:
+    latencies = []
+    for _ in range(repeats):
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            search(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def bench_legacy(text: str, repeats: int) -> dict:
+    """
+    Cách cũ: giữ nguyên chuỗi thô, tách đoạn và tạo set token ở mỗi truy vấn
+    """
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    latencies = measure_latency(lambda q: TextSearchUtil.local_search(text, q, 5), repeats)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "resident_mb": len(text.encode("utf-8")) / 1024 / 1024,
+        "peak_mb": peak / 1024 / 1024,
+        "build_s": 0.0,
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+    }
+
+
+def bench_index(text: str, repeats: int) -> dict:
+    """
+    Cách mới: xây FallbackIndex một lần, truy vấn bằng phép nhân ma trận thưa
+    """
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = FallbackIndex.from_text(text)
+    build_s = time.perf_counter() - started
+    _, build_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    latencies = measure_latency(lambda q: index.local_search(q, 5), repeats)
+    _, query_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "resident_mb": index.memory_bytes() / 1024 / 1024,
+        "mmap_mb": index.text_bytes() / 1024 / 1024,
+        "peak_mb": query_peak / 1024 / 1024,
+        "build_peak_mb": build_peak / 1024 / 1024,
+        "build_s": build_s,
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+    }
+    index.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fallback search memory/latency benchmark")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--legacy-max-scale", type=int, default=100,
+                        help="Bỏ qua cách cũ ở quy mô lớn hơn (mỗi truy vấn mất hàng chục giây)")
+    args = parser.parse_args()
+
+    print("🚀 Fallback search benchmark")
+    print("=" * 110)
+    print(f"{'scale':>6} {'engine':>8} {'resident MB':>12} {'mmap MB':>8} {'query peak MB':>14} "
+          f"{'build s':>8} {'p50 ms':>9} {'max ms':>9}")
+    for scale in args.scales:
+        text = load_corpus(scale)
+        if scale <= args.legacy_max_scale:
+            r = bench_legacy(text, args.repeats)
+            print(f"{scale:>6} {'legacy':>8} {r['resident_mb']:>12.2f} {'-':>8} {r['peak_mb']:>14.2f} "
+                  f"{r['build_s']:>8.2f} {r['p50_ms']:>9.2f} {r['max_ms']:>9.2f}")
+        r = bench_index(text, args.repeats)
+        del text
+        print(f"{scale:>6} {'index':>8} {r['resident_mb']:>12.2f} {r['mmap_mb']:>8.2f} {r['peak_mb']:>14.2f} "
+              f"{r['build_s']:>8.2f} {r['p50_ms']:>9.2f} {r['max_ms']:>9.2f}")
+    print("=" * 110)
+    print("resident MB: legacy = chuỗi raw_text giữ trong heap; index = mảng NumPy + từ vựng (văn bản nằm trong mmap)")
+    print("🏁 Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark cache graph storage: số round-trip tới graph và độ trễ mỗi truy vấn trước/sau khi bật cache
+
+Đồ thị được dựng từ dữ liệu trong data/ (entity = cụm từ viết hoa, cạnh = cùng xuất hiện trong một câu)
+trên LocalGraphStorage (mô phỏng Neo4j, mỗi lời gọi chờ --latency-ms). Truy vấn đi qua đúng các hàm
+truy xuất local/global của LightRAG (_get_node_data / _get_edge_data), chỉ thay vector DB bằng
+embedding băm cục bộ. Cuối cùng một lần upsert mô phỏng ingestion để đo chi phí sau invalidation.
+
+Chạy: python benchmarks/benchmark_graph_cache.py --passes 5 --latency-ms 2 --modes local global mix
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from lightrag import QueryParam                                        # noqa: E402
+from lightrag.operate import _get_edge_data, _get_node_data            # noqa: E402
+from lightrag.utils import logger as lightrag_logger                   # noqa: E402
+
+from ingestion import read_data_file                                   # noqa: E402
+from util.graph_cache_util import CachedGraphStorage                   # noqa: E402
+from util.local_backend_util import LocalGraphStorage, hash_embed      # noqa: E402
+
+DATA_FILES = [os.path.join(ROOT_DIR, "data", "data.txt"), os.path.join(ROOT_DIR, "data", "data.json")]
+GOLDEN_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_set.json")
+MODES = ["local", "global", "mix"]
+
+
+class LocalVectorIndex:
+    """
+    Thay entities_vdb / relationships_vdb: cosine trên embedding băm, cùng dạng kết quả với LightRAG
+    """
+
+    cosine_better_than_threshold = 0.0
+
+    def __init__(self, records: list, texts: list):
+        self.records = records
+        self.embeddings = hash_embed(texts)
+
+    async def query(self, query: str, top_k: int, query_embedding=None) -> list:
+        scores = self.embeddings @ hash_embed([query])[0]
+        ranked = sorted(range(len(self.records)), key=lambda i: (-scores[i], i))[:top_k]
+        return [self.records[i] for i in ranked if scores[i] > 0]
+
+
+def extract_entities(sentence: str) -> list:
+    """
+    Entity thô: các cụm từ liên tiếp viết hoa chữ cái đầu (Napoleon, Trận Waterloo, ...)
+    """
+    entities, current = [], []
+    for word in re.findall(r"[^\W\d_][\w'-]*", sentence):
+        if word[0].isupper():
+            current.append(word)
+            continue
+        if current:
+            entities.append(" ".join(current))
+            current = []
+    if current:
+        entities.append(" ".join(current))
+    return list(dict.fromkeys(entity for entity in entities if len(entity) > 2))
+
+
+async def build_graph(graph: LocalGraphStorage) -> tuple:
+    """
+    Dựng đồ thị và hai vector index từ các file dữ liệu
+
+    Returns:
+        (entities_vdb, relationships_vdb)
+    """
+    descriptions, edges = {}, {}
+    for file_path in DATA_FILES:
+        for sentence in re.split(r"(?<=[.!?])\s+|\n+", read_data_file(file_path)):
+            entities = extract_entities(sentence)
+            for entity in entities:
+                descriptions.setdefault(entity, []).append(sentence.strip())
+            for i, src in enumerate(entities):
+                for tgt in entities[i + 1:]:
+                    key = tuple(sorted((src, tgt)))
+                    edge = edges.setdefault(key, {"weight": 0.0, "description": sentence.strip(),
+                                                  "keywords": "", "source_id": os.path.basename(file_path)})
+                    edge["weight"] += 1.0
+
+    for entity, sentences in descriptions.items():
+        await graph.upsert_node(entity, {"entity_id": entity, "entity_type": "unknown",
+                                         "description": " ".join(sentences)[:500], "source_id": "data"})
+    for (src, tgt), edge in edges.items():
+        await graph.upsert_edge(src, tgt, edge)
+
+    entity_names = sorted(descriptions)
+    entities_vdb = LocalVectorIndex([{"entity_name": name} for name in entity_names],
+                                    [f"{name} {graph.nodes[name]['description']}" for name in entity_names])
+    edge_keys = sorted(edges)
+    relationships_vdb = LocalVectorIndex([{"src_id": src, "tgt_id": tgt} for src, tgt in edge_keys],
+                                         [f"{src} {tgt} {edges[(src, tgt)]['description']}"
+                                          for src, tgt in edge_keys])
+    return entities_vdb, relationships_vdb
+
+
+async def run_query(graph, entities_vdb, relationships_vdb, question: str, mode: str, top_k: int):
+    param = QueryParam(mode=mode, top_k=top_k)
+    if mode in ("local", "mix"):
+        await _get_node_data(question, graph, entities_vdb, param)
+    if mode in ("global", "mix"):
+        await _get_edge_data(question, graph, relationships_vdb, param)
+
+
+async def run_pass(backend: LocalGraphStorage, graph, vdbs: tuple, questions: list, mode: str,
+                   top_k: int) -> tuple:
+    """
+    Chạy một vòng qua bộ câu hỏi
+
+    Returns:
+        (số round-trip mỗi câu, độ trễ mỗi câu tính bằng ms)
+    """
+    round_trips, latencies = [], []
+    for question in questions:
+        before = backend.round_trips
+        started = time.perf_counter()
+        await run_query(graph, *vdbs, question, mode, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        round_trips.append(backend.round_trips - before)
+    return round_trips, latencies
+
+
+async def run_workload(backend: LocalGraphStorage, graph, vdbs: tuple, questions: list, mode: str,
+                       top_k: int, passes: int) -> dict:
+    """
+    Vòng đầu (cache lạnh), các vòng sau (cache nóng, thứ tự câu hỏi xáo trộn cố định),
+    rồi một lần upsert mô phỏng ingestion và thêm một vòng sau invalidation
+    """
+    rng = random.Random(0)
+    cold_trips, _ = await run_pass(backend, graph, vdbs, questions, mode, top_k)
+    warm_trips, warm_latencies = [], []
+    for _ in range(passes - 1):
+        order = questions[:]
+        rng.shuffle(order)
+        trips, latencies = await run_pass(backend, graph, vdbs, order, mode, top_k)
+        warm_trips.extend(trips)
+        warm_latencies.extend(latencies)
+
+    # Ingestion ghi vào graph -> cache bị xóa, truy vấn kế tiếp đọc lại từ storage
+    await graph.upsert_node("Benchmark Ingestion", {"entity_id": "Benchmark Ingestion", "description": ""})
+    ingest_trips, _ = await run_pass(backend, graph, vdbs, questions, mode, top_k)
+
+    warm_latencies.sort()
+    return {
+        "cold": statistics.mean(cold_trips),
+        "warm": statistics.mean(warm_trips) if warm_trips else None,
+        "after_ingest": statistics.mean(ingest_trips),
+        "mean_ms": statistics.mean(warm_latencies) if warm_latencies else None,
+        "p95_ms": warm_latencies[min(len(warm_latencies) - 1, int(len(warm_latencies) * 0.95))]
+        if warm_latencies else None,
+    }
+
+
+async def main_async(args):
+    with open(GOLDEN_SET, "r", encoding="utf-8") as f:
+        questions = [item["question"] for item in json.load(f)["questions"]]
+
+    latency = args.latency_ms / 1000
+    template = LocalGraphStorage()
+    vdbs = await build_graph(template)
+    print(f"🚀 Graph cache benchmark: {len(template.nodes)} nodes, {len(template.edges)} edges, "
+          f"{len(questions)} questions x {args.passes} passes, simulated latency {args.latency_ms}ms/round-trip")
+    print("=" * 96)
+    print(f"{'mode':>7} {'cache':>6} {'cold rt/q':>10} {'warm rt/q':>10} {'ingest rt/q':>12} "
+          f"{'warm ms':>9} {'warm p95':>9} {'hit rate':>9} {'cache KB':>9}")
+
+    for mode in args.modes:
+        for cached in (False, True):
+            backend = LocalGraphStorage(latency)
+            backend.nodes = {key: dict(value) for key, value in template.nodes.items()}
+            backend.edges = {key: dict(value) for key, value in template.edges.items()}
+            backend.adjacency = {key: set(value) for key, value in template.adjacency.items()}
+            graph = CachedGraphStorage(backend, max_bytes=args.cache_mb * 1024 * 1024) if cached else backend
+
+            r = await run_workload(backend, graph, vdbs, questions, mode, args.top_k, args.passes)
+            stats = graph.get_status() if cached else None
+            hit_rate = f"{stats['hit_rate']:>9.2f}" if stats else f"{'-':>9}"
+            size_kb = f"{stats['total_bytes'] / 1024:>9.1f}" if stats else f"{'-':>9}"
+            print(f"{mode:>7} {'on' if cached else 'off':>6} {r['cold']:>10.2f} {r['warm']:>10.2f} "
+                  f"{r['after_ingest']:>12.2f} {r['mean_ms']:>9.2f} {r['p95_ms']:>9.2f} {hit_rate} {size_kb}")
+    print("=" * 96)
+    print("🏁 Done.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph storage read-through cache benchmark")
+    parser.add_argument("--passes", type=int, default=5, help="Số vòng lặp qua bộ câu hỏi (>= 2)")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Độ trễ mô phỏng mỗi round-trip")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--cache-mb", type=float, default=64)
+    args = parser.parse_args()
+    args.passes = max(2, args.passes)
+    lightrag_logger.setLevel(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
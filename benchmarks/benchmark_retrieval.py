@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark chất lượng truy xuất so với độ trễ trên bộ câu hỏi chuẩn (golden_set.json)
+
+Quét chunk size / overlap / top_k / mode trên backend cục bộ xác định
+(embedding băm + chỉ mục từ khóa, không gọi API) và báo cáo cho mỗi cấu hình:
+recall@k, MRR, thời gian build index, kích thước index, độ trễ truy vấn và số token ngữ cảnh.
+
+Mode:
+- naive:   tương tự vector (embedding băm, cosine) trên các chunk
+- keyword: chỉ mục từ khóa FallbackIndex trên các chunk
+- hybrid:  gộp hai danh sách trên bằng reciprocal rank fusion
+
+Chạy: python benchmarks/benchmark_retrieval.py --chunk-sizes 200 500 1500 --overlaps 0 100 300
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from ingestion import _get_token_encoder, chunk_text, read_data_file     # noqa: E402
+from util.fallback_index_util import FallbackIndex                       # noqa: E402
+from util.local_backend_util import hash_embed                           # noqa: E402
+
+DATA_FILES = [os.path.join(ROOT_DIR, "data", "data.txt"), os.path.join(ROOT_DIR, "data", "data.json")]
+GOLDEN_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_set.json")
+MODES = ["naive", "keyword", "hybrid"]
+RRF_K = 60
+
+
+def load_golden_set(path: str = GOLDEN_SET) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["questions"]
+
+
+class LocalRetriever:
+    """
+    Index cục bộ trên một cách chia chunk: ma trận embedding + FallbackIndex
+    """
+
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+        self.embeddings = hash_embed(chunks)
+        self.keyword_index = FallbackIndex.build(chunks)
+
+    def size_bytes(self) -> int:
+        return int(self.embeddings.nbytes + self.keyword_index.memory_bytes() + self.keyword_index.text_bytes())
+
+    def rank_naive(self, question: str) -> np.ndarray:
+        scores = self.embeddings @ hash_embed([question])[0]
+        return np.argsort(-scores, kind="stable")
+
+    def rank_keyword(self, question: str) -> np.ndarray:
+        scores = self.keyword_index.score(question)
+        matched = np.flatnonzero(scores)
+        return matched[np.lexsort((matched, -scores[matched]))]
+
+    def retrieve(self, question: str, mode: str, top_k: int) -> list:
+        if mode == "naive":
+            ranked = self.rank_naive(question)[:top_k]
+        elif mode == "keyword":
+            ranked = self.rank_keyword(question)[:top_k]
+        else:
+            fused = {}
+            for ranking in (self.rank_naive(question), self.rank_keyword(question)):
+                for rank, chunk_id in enumerate(ranking[:max(top_k * 4, 20)]):
+                    fused[int(chunk_id)] = fused.get(int(chunk_id), 0.0) + 1.0 / (RRF_K + rank + 1)
+            ranked = sorted(fused, key=lambda chunk_id: (-fused[chunk_id], chunk_id))[:top_k]
+        return [self.chunks[int(chunk_id)] for chunk_id in ranked]
+
+    def close(self):
+        self.keyword_index.close()
+
+
+def build_chunks(chunk_size: int, overlap: int) -> tuple:
+    """
+    Chia từng file dữ liệu thành chunk như pipeline ingestion
+
+    Returns:
+        (danh sách chunk, tổng số token)
+    """
+    chunks, total_tokens = [], 0
+    for file_path in DATA_FILES:
+        file_chunks, num_tokens = chunk_text(read_data_file(file_path), chunk_size, overlap)
+        chunks.extend(file_chunks)
+        total_tokens += num_tokens
+    return chunks, total_tokens
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_token_encoder()
+    return len(encoder.encode(text)) if encoder else len(text.split())
+
+
+def evaluate(retriever: LocalRetriever, golden: list, mode: str, top_k: int, repeats: int) -> dict:
+    """
+    Đo recall@k, MRR, độ trễ và số token ngữ cảnh cho một (mode, top_k)
+    """
+    hits, reciprocal_rank, judged, context_tokens = 0, 0.0, 0, []
+    latencies = []
+    for item in golden:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            retrieved = retriever.retrieve(item["question"], mode, top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        context_tokens.append(sum(count_tokens(chunk) for chunk in retrieved))
+
+        if item["expected"] is None:
+            continue
+        judged += 1
+        for rank, chunk in enumerate(retrieved, 1):
+            if any(snippet in chunk for snippet in item["expected"]):
+                hits += 1
+                reciprocal_rank += 1.0 / rank
+                break
+
+    latencies.sort()
+    return {
+        "recall": hits / judged if judged else 0.0,
+        "mrr": reciprocal_rank / judged if judged else 0.0,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "context_tokens": statistics.mean(context_tokens),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality vs latency sweep")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[200, 500, 1000, 1500])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 100, 300])
+    parser.add_argument("--top-ks", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--repeats", type=int, default=5, help="Số lần lặp mỗi câu hỏi khi đo độ trễ")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    golden = load_golden_set()
+    tokenizer_name = "tiktoken" if _get_token_encoder() else "whitespace (tiktoken unavailable)"
+    print(f"🚀 Retrieval sweep: {len(golden)} golden questions, chunk tokens counted with {tokenizer_name}")
+    print("=" * 118)
+    print(f"{'chunk':>6} {'overlap':>7} {'chunks':>6} {'build s':>8} {'index KB':>9} {'mode':>8} {'top_k':>5} "
+          f"{'recall@k':>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8} {'ctx tokens':>10}")
+
+    results = []
+    for chunk_size in args.chunk_sizes:
+        for overlap in args.overlaps:
+            if overlap >= chunk_size:
+                continue
+            started = time.perf_counter()
+            chunks, _ = build_chunks(chunk_size, overlap)
+            retriever = LocalRetriever(chunks)
+            build_s = time.perf_counter() - started
+            size_kb = retriever.size_bytes() / 1024
+
+            for mode in args.modes:
+                for top_k in args.top_ks:
+                    r = evaluate(retriever, golden, mode, top_k, args.repeats)
+                    results.append({"chunk_size": chunk_size, "overlap": overlap, "chunks": len(chunks),
+                                    "build_s": build_s, "index_kb": size_kb, "mode": mode, "top_k": top_k, **r})
+                    print(f"{chunk_size:>6} {overlap:>7} {len(chunks):>6} {build_s:>8.3f} {size_kb:>9.1f} "
+                          f"{mode:>8} {top_k:>5} {r['recall']:>9.2f} {r['mrr']:>6.2f} {r['p50_ms']:>8.3f} "
+                          f"{r['p95_ms']:>8.3f} {r['context_tokens']:>10.0f}")
+            retriever.close()
+
+    print("=" * 118)
+    # Cấu hình tốt nhất: recall cao nhất, hòa thì ít token ngữ cảnh hơn, rồi nhanh hơn
+    best = max(results, key=lambda r: (r["recall"], r["mrr"], -r["context_tokens"], -r["p50_ms"]))
+    print(f"🏆 Best: chunk={best['chunk_size']} overlap={best['overlap']} mode={best['mode']} "
+          f"top_k={best['top_k']} recall={best['recall']:.2f} MRR={best['mrr']:.2f} "
+          f"ctx tokens={best['context_tokens']:.0f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Results written to {args.output}")
+    print("🏁 Done.")
+
+
+if __name__ == "__main__":
+    main()
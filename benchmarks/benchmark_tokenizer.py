@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark tách từ tiếng Việt cho tìm kiếm dự phòng:
+- Throughput tách từ (MB/s, term/s) của \\w+ cũ so với VietnameseTokenizer
+- Recall@k trên bộ câu hỏi chuẩn golden_set.json (có dấu và gõ không dấu), tìm trong data.txt và data.json
+
+Chạy: python benchmarks/benchmark_tokenizer.py --scale 10 --top-k 3
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from ingestion import read_data_file                                 # noqa: E402
+from util.fallback_index_util import FallbackIndex                  # noqa: E402
+from util.vietnamese_tokenizer_util import VietnameseTokenizer      # noqa: E402
+
+DATA_FILES = [os.path.join(ROOT_DIR, "data", "data.txt"), os.path.join(ROOT_DIR, "data", "data.json")]
+# Bộ câu hỏi chuẩn dùng chung với benchmark_retrieval.py (expected = None: không có trong dữ liệu)
+GOLDEN_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_set.json")
+
+
+def load_golden_set(path: str = GOLDEN_SET) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["questions"]
+
+
+class LegacyTokenizer:
+    """
+    Cách tách từ cũ của TextSearchUtil: \\w+ trên chữ thường
+    """
+
+    def terms(self, text: str):
+        return re.findall(r"\w+", text.lower())
+
+
+def load_text(scale: int) -> str:
+    with open(os.path.join(ROOT_DIR, "data", "data.txt"), "r", encoding="utf-8") as f:
+        return f.read() * scale
+
+
+def bench_throughput(name: str, tokenizer, paragraphs: list) -> None:
+    total_bytes = sum(len(p.encode("utf-8")) for p in paragraphs)
+    started = time.perf_counter()
+    total_terms = sum(len(tokenizer.terms(p)) for p in paragraphs)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>12} {total_bytes / 1024 / 1024 / elapsed:>10.2f} MB/s {total_terms / elapsed:>14,.0f} term/s "
+          f"{total_terms:>12,} terms")
+
+
+def first_hit_rank(index: FallbackIndex, question: str, expected: list, top_k: int):
+    """
+    Vị trí (1-based) của đoạn văn hỗ trợ đầu tiên trong top-k, None nếu không có
+    """
+    for rank, (_, passage) in enumerate(index.search(question, top_k), 1):
+        if any(snippet in passage for snippet in expected):
+            return rank
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vietnamese tokenizer benchmark")
+    parser.add_argument("--scale", type=int, default=10, help="Số lần lặp data.txt khi đo throughput")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizers = {
+        "legacy": LegacyTokenizer(),
+        "vi": VietnameseTokenizer(fold_accents=False),
+        "vi+fold": VietnameseTokenizer(fold_accents=True),
+    }
+
+    print("🚀 Tokenization throughput")
+    print("=" * 70)
+    paragraphs = list(FallbackIndex.iter_paragraphs(load_text(args.scale)))
+    for name, tokenizer in tokenizers.items():
+        bench_throughput(name, tokenizer, paragraphs)
+
+    golden = load_golden_set()
+    print(f"\n🇻🇳 Recall@{args.top_k} on {len(golden)} golden questions")
+    print("=" * 70)
+    # Văn bản dự phòng như RAGService dựng: mỗi file có dòng tiêu đề nguồn
+    text = "".join(read_data_file(file_path) for file_path in DATA_FILES)
+    indexes = {name: FallbackIndex.from_text(text, tokenizer) for name, tokenizer in tokenizers.items()}
+    print(f"{'question':<48}" + "".join(f"{name:>10}" for name in indexes))
+
+    hits = {name: 0 for name in indexes}
+    reciprocal_ranks = {name: 0.0 for name in indexes}
+    judged = 0
+    for item in golden:
+        question, expected = item["question"], item["expected"]
+        if expected is None:
+            continue
+        # Kiểm tra cả câu hỏi gốc và dạng gõ không dấu
+        for variant in (question, VietnameseTokenizer.fold(question)):
+            judged += 1
+            row = f"{variant:<48}"
+            for name, index in indexes.items():
+                rank = first_hit_rank(index, variant, expected, args.top_k)
+                if rank is not None:
+                    hits[name] += 1
+                    reciprocal_ranks[name] += 1.0 / rank
+                row += f"{'rank ' + str(rank) if rank else 'miss':>10}"
+            print(row)
+
+    print("-" * 70)
+    print(f"{'recall@' + str(args.top_k):<48}" + "".join(f"{hits[name] / judged:>10.2f}" for name in indexes))
+    print(f"{'MRR':<48}" + "".join(f"{reciprocal_ranks[name] / judged:>10.2f}" for name in indexes))
+    print("🏁 Done.")
+
+
+if __name__ == "__main__":
+    main()
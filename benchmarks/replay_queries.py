@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Replay lưu lượng /query đã ghi (QUERY_CAPTURE_PATH) lên một hoặc hai server để so sánh hai bản build
+
+Các request được gửi lại đúng thứ tự và đúng nhịp như lúc ghi (hoặc nhanh hơn với --speed),
+sau đó báo cáo phân phối độ trễ (p50/p90/p95/p99), tỉ lệ lỗi và khác biệt câu trả lời.
+Không có --baseline thì so với độ trễ / mã băm câu trả lời lưu trong chính file capture.
+Trả mã thoát 1 khi vượt ngưỡng (--max-p95-regression, --max-answer-diff, --max-error-rate)
+nên dùng được làm cổng kiểm tra hồi quy hiệu năng trong CI.
+
+Chạy:
+    python benchmarks/replay_queries.py --capture logs/query_capture.jsonl \\
+        --target http://localhost:8001 --baseline http://localhost:8000 --speed 2 --max-p95-regression 0.2
+
+Lưu ý: server đích nên tắt QUERY_CAPTURE_PATH để không ghi lại chính lưu lượng replay.
+"""
+
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from util.query_capture_util import QueryCaptureLog, answer_digest   # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(results: List[dict], wall_s: Optional[float] = None) -> dict:
+    """
+    Thống kê độ trễ của các request thành công và tỉ lệ lỗi
+    """
+    latencies = sorted(r["latency_ms"] for r in results if r["status"] == 200)
+    errors = sum(1 for r in results if r["status"] != 200)
+    summary = {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": errors / len(results) if results else 0.0,
+        "max_ms": latencies[-1] if latencies else None,
+        "throughput_rps": len(results) / wall_s if wall_s else None,
+    }
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = percentile(latencies, q)
+    return summary
+
+
+def compare_answers(baseline: List[dict], target: List[dict], show: int = 5) -> dict:
+    """
+    So sánh câu trả lời từng request giữa hai lần chạy (theo mã băm, tỉ lệ giống nhau nếu có toàn văn)
+    """
+    compared, different, source_changes, examples = 0, 0, 0, []
+    for before, after in zip(baseline, target):
+        if before["status"] != 200 or after["status"] != 200 or before.get("answer_sha1") is None:
+            continue
+        compared += 1
+        if before.get("answer_source") and after.get("answer_source") != before.get("answer_source"):
+            source_changes += 1
+        if before["answer_sha1"] == after["answer_sha1"]:
+            continue
+        different += 1
+        if len(examples) < show:
+            similarity = None
+            if before.get("answer") is not None and after.get("answer") is not None:
+                similarity = difflib.SequenceMatcher(None, before["answer"], after["answer"]).ratio()
+            examples.append({"question": after["question"], "similarity": similarity,
+                             "source": [before.get("answer_source"), after.get("answer_source")]})
+    return {
+        "compared": compared,
+        "different": different,
+        "diff_rate": different / compared if compared else 0.0,
+        "source_changes": source_changes,
+        "examples": examples,
+    }
+
+
+async def replay(records: List[dict], base_url: str, speed: float, concurrency: int,
+                 timeout: float) -> tuple:
+    """
+    Gửi lại các request theo nhịp ghi được, chia cho `speed` (speed <= 0: gửi ngay, chỉ giới hạn đồng thời)
+
+    Returns:
+        (kết quả theo đúng thứ tự capture, thời gian chạy tính bằng giây)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    first_ts = records[0].get("ts", 0) if records else 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+
+        async def send(record: dict) -> dict:
+            # Bước 1: Chờ tới thời điểm gửi tương ứng trong capture
+            if speed > 0:
+                delay = (record.get("ts", first_ts) - first_ts) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            payload = {"question": record["question"], "mode": record["mode"], "top_k": record["top_k"]}
+            if record.get("corpus_id") not in (None, "default"):
+                payload["corpus_id"] = record["corpus_id"]
+            payload.update(record.get("filters") or {})
+
+            # Bước 2: Gửi request và đo độ trễ phía client
+            async with semaphore:
+                sent = time.perf_counter()
+                try:
+                    response = await client.post("/query", json=payload)
+                    status = response.status_code
+                    body = response.json() if status == 200 else {}
+                except (httpx.HTTPError, ValueError) as e:
+                    status, body = 0, {"error": str(e)}
+                latency_ms = (time.perf_counter() - sent) * 1000
+
+            answer = body.get("answer")
+            return {"question": record["question"], "status": status, "latency_ms": latency_ms,
+                    "answer": answer, "answer_sha1": answer_digest(answer), "answer_source": body.get("source")}
+
+        results = await asyncio.gather(*(send(record) for record in records))
+        return list(results), time.perf_counter() - started
+
+
+def format_summary(name: str, summary: dict) -> str:
+    def ms(value):
+        return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+    rps = f"{summary['throughput_rps']:>7.2f}" if summary["throughput_rps"] else f"{'-':>7}"
+    return (f"{name:<10} {summary['requests']:>6} {summary['errors']:>6} "
+            + " ".join(ms(summary[f"p{q}_ms"]) for q in PERCENTILES) + f" {ms(summary['max_ms'])} {rps}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured /query traffic and compare two builds")
+    parser.add_argument("--capture", required=True, help="File capture (đọc kèm các bản xoay vòng .1, .2, ...)")
+    parser.add_argument("--target", required=True, help="URL server cần kiểm tra, ví dụ http://localhost:8001")
+    parser.add_argument("--baseline", help="URL server bản build cũ; bỏ trống thì so với số liệu trong capture "
+                        "(độ trễ lúc ghi đo phía server, không gồm thời gian mạng)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Hệ số tăng nhịp (2 = nhanh gấp đôi lúc ghi, 0 = gửi liên tục)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Số request đồng thời tối đa mỗi server")
+    parser.add_argument("--limit", type=int, help="Chỉ replay N request đầu tiên")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--include-errors", action="store_true", help="Replay cả request từng lỗi lúc ghi")
+    parser.add_argument("--show-diffs", type=int, default=5, help="Số ví dụ câu trả lời khác nhau in ra")
+    parser.add_argument("--max-p95-regression", type=float, help="Ngưỡng p95 tăng tối đa (0.2 = 20%%)")
+    parser.add_argument("--max-answer-diff", type=float, help="Tỉ lệ câu trả lời khác nhau tối đa")
+    parser.add_argument("--max-error-rate", type=float, help="Tỉ lệ lỗi tối đa của server đích")
+    parser.add_argument("--output", help="Ghi kết quả chi tiết ra file JSON")
+    args = parser.parse_args(argv)
+
+    records = QueryCaptureLog.read(args.capture)
+    if not args.include_errors:
+        records = [record for record in records if record.get("status") == 200]
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print(f"❌ No replayable requests in {args.capture}")
+        return 1
+    span_s = records[-1]["ts"] - records[0]["ts"]
+    print(f"🚀 Replaying {len(records)} captured requests (captured over {span_s:.1f}s, speed x{args.speed})")
+
+    # Hai bản build chạy lần lượt để không tranh tài nguyên (LLM, Neo4j) của nhau
+    runs = {}
+    if args.baseline:
+        print(f"   baseline: {args.baseline}")
+        runs["baseline"] = asyncio.run(replay(records, args.baseline, args.speed, args.concurrency, args.timeout))
+    print(f"   target:   {args.target}")
+    runs["target"] = asyncio.run(replay(records, args.target, args.speed, args.concurrency, args.timeout))
+
+    if args.baseline:
+        baseline_results, baseline_wall = runs["baseline"]
+    else:
+        baseline_results = [{"question": r["question"], "status": r["status"], "latency_ms": r["latency_ms"],
+                             "answer": r.get("answer"), "answer_sha1": r.get("answer_sha1"),
+                             "answer_source": r.get("answer_source")} for r in records]
+        baseline_wall = span_s or None
+    target_results, target_wall = runs["target"]
+
+    baseline_summary = summarize(baseline_results, baseline_wall)
+    target_summary = summarize(target_results, target_wall)
+    answers = compare_answers(baseline_results, target_results, args.show_diffs)
+
+    print("=" * 96)
+    print(f"{'build':<10} {'reqs':>6} {'errors':>6} " + " ".join(f"{f'p{q} ms':>9}" for q in PERCENTILES)
+          + f" {'max ms':>9} {'req/s':>7}")
+    print(format_summary("baseline" if args.baseline else "captured", baseline_summary))
+    print(format_summary("target", target_summary))
+    print("=" * 96)
+    print(f"📝 Answers: {answers['different']}/{answers['compared']} different "
+          f"({answers['diff_rate']:.1%}), {answers['source_changes']} changed source")
+    for example in answers["examples"]:
+        similarity = f"{example['similarity']:.2f}" if example["similarity"] is not None else "n/a"
+        print(f"   - {example['question'][:70]!r} similarity={similarity} source={example['source']}")
+
+    # Cổng hồi quy
+    failures = []
+    p95_before, p95_after = baseline_summary["p95_ms"], target_summary["p95_ms"]
+    if args.max_p95_regression is not None and p95_before and p95_after is not None:
+        regression = p95_after / p95_before - 1.0
+        print(f"⏱️  p95 change: {regression:+.1%}")
+        if regression > args.max_p95_regression:
+            failures.append(f"p95 regressed {regression:+.1%} (limit {args.max_p95_regression:.0%})")
+    if args.max_answer_diff is not None and answers["diff_rate"] > args.max_answer_diff:
+        failures.append(f"answer diff rate {answers['diff_rate']:.1%} (limit {args.max_answer_diff:.0%})")
+    if args.max_error_rate is not None and target_summary["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {target_summary['error_rate']:.1%} (limit {args.max_error_rate:.0%})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"baseline": baseline_summary, "target": target_summary, "answers": answers,
+                       "failures": failures, "results": {"baseline": baseline_results, "target": target_results}},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("🏁 Done.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,30 @@ Chứa các endpoint API và logic điều khiển luồng xử lý
 """
 
 import os
-from fastapi import HTTPException
-from service.rag_service import RAGService
+import time
+from contextlib import AsyncExitStack
+from typing import Optional
+from fastapi import HTTPException, Response
+from fastapi.responses import RedirectResponse
+from service.corpus_service import CorpusService, CorpusNotFoundError, DEFAULT_CORPUS_ID
+from service.warmup_service import WarmupService
+from service.health_probe_service import create_health_probe_service
+from service.session_service import create_session_service
 from dto.QueryRequest import QueryRequest
 from dto.QueryResponse import QueryResponse
 from util.text_search_util import ValidationUtil, LogUtil
+from util.admission_util import AdmissionLimiter, AdmissionRejectedError
+from util.metrics_util import MetricsUtil
+from util.tracing_util import TracingUtil
+from util.profiling_util import ProfilingUtil
+from util.llm_client_util import llm_priority, PRIORITY_INTERACTIVE
+from util.query_log_util import QueryFrequencyLog
+from util.query_capture_util import create_query_capture
+from util.io_util import run_blocking, shutdown_io_executor
+from util.metadata_index_util import FILTER_FIELDS
+from util.http_cache_util import (
+    CACHEABLE_SOURCES, cache_control, canonical_query_params, canonical_query_string, etag_matches, make_etag,
+)
 
 
 class RAGController:
@@ -24,7 +43,45 @@ class RAGController:
         if data_path_json is None:
             data_path_json = os.getenv("DATA_PATH_JSON", "/app/data/data.json")
         
-        self.rag_service = RAGService(data_path, data_path_json)
+        # Mỗi corpus có RAGService riêng; corpus mặc định dùng đường dẫn cũ
+        self.corpus_service = CorpusService(
+            data_path, data_path_json,
+            data_root=os.getenv("CORPUS_DATA_ROOT"),
+            storage_root=os.getenv("RAG_STORAGE_PATH", "./rag_storage"),
+            max_loaded=int(os.getenv("CORPUS_MAX_LOADED", "4")),
+            max_memory_mb=float(os.getenv("CORPUS_MAX_MEMORY_MB", "1024")),
+            snapshot_path=os.getenv("RAG_SNAPSHOT_PATH") or None,
+            faq_path=os.getenv("FAQ_PATH") or None,
+        )
+        self.rag_service = self.corpus_service.default_service
+
+        # Giới hạn số truy vấn đồng thời và hàng đợi chờ để tránh quá tải LLM
+        self.admission = AdmissionLimiter(
+            max_in_flight=int(os.getenv("QUERY_MAX_IN_FLIGHT", "8")),
+            max_queue=int(os.getenv("QUERY_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("QUERY_QUEUE_TIMEOUT", "10")),
+        )
+
+        # Thống kê câu hỏi phổ biến (giữ qua các lần deploy) và warm-up cache từ thống kê đó.
+        # Nằm ngoài RAG_STORAGE_PATH: thư mục chỉ mục bị thay thế khi nạp snapshot/đánh chỉ mục lại
+        self.query_log = QueryFrequencyLog(os.getenv("QUERY_LOG_PATH", "./logs/query_frequencies.json"))
+        self.warmup = WarmupService(
+            self.corpus_service, self.query_log,
+            top_n=int(os.getenv("WARMUP_TOP_N", "20")),
+            rate_per_second=float(os.getenv("WARMUP_RATE", "1")),
+        )
+
+        # Thời gian proxy/CDN dùng lại phản hồi GET /query không ghim phiên bản trước khi hỏi lại bằng ETag
+        self.query_cache_max_age = int(os.getenv("QUERY_CACHE_MAX_AGE", "60"))
+
+        # Phiên hội thoại nhiều lượt (request có session_id)
+        self.sessions = create_session_service()
+
+        # Ghi lại lưu lượng /query để replay khi so sánh hai bản build (bật bằng QUERY_CAPTURE_PATH)
+        self.query_capture = create_query_capture()
+
+        # Probe sâu (graph, vector, embedding, LLM) chạy nền; /health/ready và /health/deep đọc kết quả đã cache
+        self.health_probe = create_health_probe_service(lambda: self.rag_service.rag)
         LogUtil.log_info(f"RAG Controller initialized with {data_path} and {data_path_json}", "CONTROLLER")
 
     async def initialize_system(self):
@@ -33,51 +90,222 @@ class RAGController:
         """
         try:
             await self.rag_service.initialize()
+            await self.corpus_service.refresh_size(DEFAULT_CORPUS_ID)
             LogUtil.log_info("RAG system initialized successfully", "CONTROLLER")
         except Exception as e:
             LogUtil.log_error("Failed to initialize RAG system", "CONTROLLER", e)
             raise
 
-    async def process_query(self, request: QueryRequest) -> QueryResponse:
+        # Làm nóng cache và probe sức khỏe ở nền, không chặn việc nhận request
+        self.warmup.start()
+        self.health_probe.system_ready = True
+        self.health_probe.start()
+
+    async def shutdown_system(self):
+        """
+        Dừng warm-up và probe sức khỏe, lưu thống kê câu hỏi và dừng thread pool I/O khi ứng dụng tắt
+        """
+        self.health_probe.system_ready = False
+        await self.health_probe.stop()
+        await self.warmup.stop()
+        await run_blocking(self.query_log.save)
+        self.query_capture.close()
+        shutdown_io_executor()
+
+    async def process_query(self, request: QueryRequest, profile: bool = False) -> QueryResponse:
         """
         Xử lý yêu cầu truy vấn từ người dùng
         
         Args:
             request: Yêu cầu truy vấn chứa câu hỏi và tham số
+            profile: Chạy request dưới profiler lấy mẫu (hoặc request.profile)
             
         Returns:
-            QueryResponse: Phản hồi chứa câu trả lời
+            QueryResponse: Phản hồi chứa câu trả lời, trace_id và tóm tắt profile (nếu có)
             
         Raises:
             HTTPException: Nếu có lỗi trong quá trình xử lý
         """
+        profiler = ProfilingUtil.start() if (profile or request.profile) else None
+        profile_summary = None
+        started_at, started = time.time(), time.perf_counter()
+        response, status = None, 500
+        with TracingUtil.span("query", mode=request.mode, top_k=request.top_k,
+                              corpus_id=request.corpus_id or DEFAULT_CORPUS_ID) as span:
+            try:
+                response = await self._process_query(request)
+                status = 200
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            finally:
+                # Profile được lưu cả khi request lỗi
+                if profiler is not None:
+                    profile_summary = ProfilingUtil.finish(profiler, span.trace_id)
+                # Truy vấn đánh chỉ mục lại không được ghi vì replay chúng sẽ xóa index của server đích;
+                # câu hỏi tiếp nối trong phiên cũng không, vì replay riêng lẻ thì mất ngữ cảnh hội thoại
+                if self.query_capture.enabled and not request.force_reindex and not request.session_id:
+                    self.query_capture.record(
+                        request.question, request.mode, request.top_k, request.corpus_id or DEFAULT_CORPUS_ID,
+                        status=status, latency_ms=(time.perf_counter() - started) * 1000, started_at=started_at,
+                        answer=response.answer if response else None,
+                        answer_source=response.source if response else None, trace_id=span.trace_id,
+                        filters=self._query_filters(request),
+                    )
+            response.trace_id = span.trace_id
+            response.profile = profile_summary
+        return response
+
+    @staticmethod
+    def _query_filters(request: QueryRequest) -> dict:
+        """
+        Bộ lọc metadata có trong request (bỏ các trường không truyền)
+        """
+        return {field: getattr(request, field) for field in FILTER_FIELDS if getattr(request, field) is not None}
+
+    @staticmethod
+    def _validate_request(request: QueryRequest):
+        """
+        Kiểm tra tham số truy vấn
+
+        Raises:
+            HTTPException: 400 nếu tham số không hợp lệ
+        """
+        is_valid, error_msg = ValidationUtil.validate_query_params(request.question, request.mode, request.top_k)
+        if is_valid and request.corpus_id is not None:
+            is_valid, error_msg = ValidationUtil.validate_corpus_id(request.corpus_id)
+        if is_valid:
+            is_valid, error_msg = ValidationUtil.validate_filters(request.section, request.date_from, request.date_to)
+        if is_valid and request.session_id is not None:
+            is_valid, error_msg = ValidationUtil.validate_session_id(request.session_id)
+        if not is_valid:
+            LogUtil.log_warning(f"Invalid query parameters: {error_msg}", "CONTROLLER")
+            raise HTTPException(status_code=400, detail=error_msg)
+
+    async def process_get_query(self, request: QueryRequest, query_string: str,
+                                if_none_match: Optional[str] = None,
+                                requested_version: Optional[int] = None) -> Response:
+        """
+        Truy vấn qua GET, cache được bởi trình duyệt/proxy/CDN: mỗi truy vấn có một URL chuẩn,
+        ETag theo phiên bản chỉ mục của corpus và hỗ trợ If-None-Match (304 không cần trả lời lại)
+
+        Args:
+            request: Tham số truy vấn từ query string (không có session_id/force_reindex/profile)
+            query_string: Query string nguyên văn của request (để so với dạng chuẩn)
+            if_none_match: Header If-None-Match
+            requested_version: Tham số `v` (ghim phiên bản chỉ mục)
+
+        Returns:
+            Response: 308 tới URL chuẩn, 304 nếu ETag còn khớp, hoặc 200 kèm ETag/Cache-Control
+
+        Raises:
+            HTTPException: Như process_query
+        """
+        # Bước 1: Validate trước khi chuyển hướng để URL lỗi không được cache như URL chuẩn
+        self._validate_request(request)
+        corpus_id = request.corpus_id or DEFAULT_CORPUS_ID
+        params = canonical_query_params(
+            request.question, request.mode, request.top_k,
+            None if corpus_id == DEFAULT_CORPUS_ID else corpus_id, **self._query_filters(request)
+        )
+        canonical = canonical_query_string(params)
+
+        # Bước 2: Cách viết khác của cùng truy vấn chuyển hướng về URL chuẩn (một bản cache cho mỗi truy vấn)
+        target = canonical_query_string(params, requested_version)
+        if query_string != target:
+            MetricsUtil.increment("query_get_redirects_total")
+            return RedirectResponse(f"/query?{target}", status_code=308,
+                                    headers={"Cache-Control": f"public, max-age={self.query_cache_max_age}"})
+
+        # Bước 3: Corpus đã tải và ETag còn khớp (cùng phiên bản chỉ mục và FAQ): trả 304 ngay,
+        # không chờ slot hay gọi LLM
+        version = self.corpus_service.index_version(corpus_id)
+        faq_revision = self.corpus_service.faq_revision(corpus_id)
+        if version:
+            for faq in (False, True):
+                if etag_matches(if_none_match, make_etag(canonical, version, faq_revision, faq)):
+                    MetricsUtil.increment("query_not_modified_total")
+                    return Response(status_code=304, headers=self._cache_headers(
+                        canonical, version, requested_version, faq_revision, faq))
+
+        # Bước 4: Trả lời như POST; phiên bản chỉ mục/FAQ đổi trong lúc trả lời (đang reindex) thì không cache
+        result = await self.process_query(request)
+        current = self.corpus_service.index_version(corpus_id)
+        current_faq = self.corpus_service.faq_revision(corpus_id)
+        headers = {"X-Trace-Id": result.trace_id or ""}
+        unchanged = current == (version or current) and (not version or current_faq == faq_revision)
+        if current and unchanged and result.source in CACHEABLE_SOURCES:
+            headers.update(self._cache_headers(canonical, current, requested_version, current_faq,
+                                               result.source == "faq"))
+            if etag_matches(if_none_match, headers["ETag"]):
+                MetricsUtil.increment("query_not_modified_total")
+                return Response(status_code=304, headers=headers)
+        else:
+            headers["Cache-Control"] = "no-store"
+        # Pydantic serialize thẳng ra JSON bytes (pydantic-core), không qua dict + json.dumps
+        return Response(content=result.model_dump_json(), media_type="application/json", headers=headers)
+
+    def _cache_headers(self, canonical: str, version: int, requested_version: Optional[int],
+                       faq_revision: Optional[str] = None, faq: bool = False) -> dict:
+        """
+        ETag, Cache-Control và X-Index-Version của phản hồi GET /query
+        """
+        return {
+            "ETag": make_etag(canonical, version, faq_revision, faq),
+            "Cache-Control": cache_control(version, requested_version, self.query_cache_max_age, faq),
+            "X-Index-Version": str(version),
+        }
+
+    async def _process_query(self, request: QueryRequest) -> QueryResponse:
+        """
+        Các bước xử lý truy vấn, mỗi bước nằm trong một span
+        """
         try:
             # Bước 1: Validate đầu vào
-            is_valid, error_msg = ValidationUtil.validate_query_params(
-                request.question, request.mode, request.top_k
-            )
-            if not is_valid:
-                LogUtil.log_warning(f"Invalid query parameters: {error_msg}", "CONTROLLER")
-                raise HTTPException(status_code=400, detail=error_msg)
+            with TracingUtil.span("validate"):
+                self._validate_request(request)
 
             # Bước 2: Log thông tin truy vấn
             LogUtil.log_info(f"Processing query: {request.question[:50]}...", "CONTROLLER")
             
-            # Bước 3: Gọi service để xử lý
-            answer = await self.rag_service.get_answer(
-                question=request.question,
-                mode=request.mode,
-                top_k=request.top_k,
-                force_reindex=request.force_reindex
-            )
+            # Bước 3: Chờ slot xử lý rồi gọi service (từ chối nhanh khi quá tải)
+            async with AsyncExitStack() as stack:
+                with TracingUtil.span("admission.wait"):
+                    await stack.enter_async_context(self.admission.admit())
+                with TracingUtil.span("corpus.acquire"):
+                    rag_service = await stack.enter_async_context(self.corpus_service.use(request.corpus_id))
+                session = None
+                if request.session_id is not None:
+                    session = self.sessions.get(request.session_id, request.corpus_id or DEFAULT_CORPUS_ID)
+                # Lời gọi LLM của truy vấn được ưu tiên hơn trích xuất khi ingestion
+                with llm_priority(PRIORITY_INTERACTIVE):
+                    answer, source = await rag_service.get_answer_with_source(
+                        question=request.question,
+                        mode=request.mode,
+                        top_k=request.top_k,
+                        force_reindex=request.force_reindex,
+                        filters=self._query_filters(request),
+                        session=session
+                    )
+                if session is not None:
+                    session.add_turn(request.question, answer)
             
+            # Ghi nhận câu hỏi để warm-up sau các lần deploy tiếp theo. Warm-up chạy lại câu hỏi không kèm
+            # phiên/bộ lọc, nên câu hỏi nối tiếp trong phiên và câu hỏi có bộ lọc không được ghi nhận
+            if not request.force_reindex and request.session_id is None and not self._query_filters(request):
+                if self.query_log.record(request.question, request.mode, request.top_k,
+                                         request.corpus_id or DEFAULT_CORPUS_ID):
+                    await run_blocking(self.query_log.save)
+
             # Bước 4: Tạo phản hồi
             response = QueryResponse(
                 question=request.question,
                 answer=answer,
                 mode=request.mode,
                 top_k=request.top_k,
-                status="success"
+                status="success",
+                source=source,
+                session_id=request.session_id
             )
             
             LogUtil.log_info("Query processed successfully", "CONTROLLER")
@@ -86,6 +314,17 @@ class RAGController:
         except HTTPException:
             # Re-raise HTTP exceptions (validation errors)
             raise
+        except CorpusNotFoundError as e:
+            LogUtil.log_warning(str(e), "CONTROLLER")
+            raise HTTPException(status_code=404, detail=str(e))
+        except AdmissionRejectedError as e:
+            # Hệ thống quá tải: trả 429/503 kèm Retry-After
+            LogUtil.log_warning(f"Query rejected by admission control: {e.reason}", "CONTROLLER")
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"Server is overloaded ({e.reason}), please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
         except Exception as e:
             # Log và chuyển đổi các exception khác thành HTTP 500
             LogUtil.log_error("Error processing query", "CONTROLLER", e)
@@ -105,7 +344,13 @@ class RAGController:
             service_status = self.rag_service.get_status()
             return {
                 "status": "healthy",
-                **service_status
+                **service_status,
+                "admission": self.admission.get_status(),
+                "corpora": self.corpus_service.get_status(),
+                "warmup": self.warmup.get_status(),
+                "query_capture": self.query_capture.get_status(),
+                "sessions": self.sessions.get_status(),
+                "probes": self.health_probe.deep()["probes"]
             }
         except Exception as e:
             LogUtil.log_error("Error getting health status", "CONTROLLER", e)
@@ -114,24 +359,58 @@ class RAGController:
                 "error": str(e)
             }
 
-    async def reindex_data(self) -> dict:
+    def get_liveness(self) -> dict:
+        """
+        Liveness: chỉ xác nhận tiến trình còn phục vụ được request (O(1), không chạm storage)
+        """
+        return self.health_probe.liveness()
+
+    def get_readiness(self) -> dict:
+        """
+        Readiness từ kết quả probe đã cache (không gọi tới Neo4j/LLM trong request)
+
+        Returns:
+            dict: "ready" quyết định mã 200/503 ở endpoint
+        """
+        return self.health_probe.readiness()
+
+    def get_deep_health(self) -> dict:
+        """
+        Kết quả probe sâu gần nhất: độ trễ, lỗi và thời điểm kiểm tra của từng phụ thuộc
+        """
+        return self.health_probe.deep()
+
+    async def reindex_data(self, corpus_id: str = None) -> dict:
         """
         Buộc đánh chỉ mục lại dữ liệu
         
+        Args:
+            corpus_id: Corpus cần đánh chỉ mục lại (mặc định: corpus mặc định)
+        
         Returns:
             dict: Kết quả của quá trình đánh chỉ mục
             
         Raises:
             HTTPException: Nếu có lỗi trong quá trình đánh chỉ mục
         """
+        if corpus_id is not None:
+            is_valid, error_msg = ValidationUtil.validate_corpus_id(corpus_id)
+            if not is_valid:
+                raise HTTPException(status_code=400, detail=error_msg)
+        corpus_id = corpus_id or DEFAULT_CORPUS_ID
+
         try:
-            LogUtil.log_info("Starting data reindexing", "CONTROLLER")
-            await self.rag_service.initialize(force_reindex=True)
+            LogUtil.log_info(f"Starting data reindexing for corpus '{corpus_id}'", "CONTROLLER")
+            async with self.corpus_service.use(corpus_id) as rag_service:
+                await rag_service.initialize(force_reindex=True)
+            await self.corpus_service.refresh_size(corpus_id)
             LogUtil.log_info("Data reindexing completed successfully", "CONTROLLER")
             return {
                 "message": "Data reindexed successfully", 
                 "status": "success"
             }
+        except CorpusNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
         except Exception as e:
             LogUtil.log_error("Error reindexing data", "CONTROLLER", e)
             raise HTTPException(
@@ -139,6 +418,27 @@ class RAGController:
                 detail=f"Error reindexing data: {str(e)}"
             )
 
+    def get_metrics(self) -> dict:
+        """
+        Lấy metrics vận hành (độ sâu hàng đợi, số yêu cầu bị từ chối, ...)
+        
+        Returns:
+            dict: Snapshot metrics hiện tại
+        """
+        return MetricsUtil.snapshot()
+
+    def get_profile(self, profile_id: str) -> str:
+        """
+        Lấy profile đã lưu của một request (collapsed stack)
+        
+        Raises:
+            HTTPException: 404 nếu không có profile
+        """
+        profile = ProfilingUtil.load(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+        return profile
+
     def get_basic_info(self) -> dict:
         """
         Lấy thông tin cơ bản của API
@@ -5,4 +5,13 @@ class QueryRequest(BaseModel):
     question: str
     mode: Optional[str] = "mix"
     top_k: Optional[int] = 5
-    force_reindex: Optional[bool] = False
\ No newline at end of file
+    force_reindex: Optional[bool] = False
+    corpus_id: Optional[str] = None
+    profile: Optional[bool] = False
+    # Bộ lọc metadata (tùy chọn): chỉ tìm trong chunk thuộc file/mục JSON/khoảng ngày này
+    source_file: Optional[str] = None
+    section: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    # Phiên hội thoại (tùy chọn): câu hỏi nối tiếp dùng lại tóm tắt và ngữ cảnh đã truy xuất của phiên
+    session_id: Optional[str] = None
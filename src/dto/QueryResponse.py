@@ -1,8 +1,13 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class QueryResponse(BaseModel):
     question: str
     answer: str
     mode: str
     top_k: int
-    status: str
\ No newline at end of file
+    status: str
+    source: Optional[str] = None
+    trace_id: Optional[str] = None
+    session_id: Optional[str] = None
+    profile: Optional[dict] = None
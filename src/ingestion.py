@@ -1,4 +1,20 @@
 import os
+import io
+import re
+import sys
+import time
+import json
+import shutil
+import asyncio
+import hashlib
+import tarfile
+import argparse
+import tempfile
+import dataclasses
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 
 import nest_asyncio
 from lightrag.llm.openai import gpt_4o_mini_complete, openai_embed
@@ -6,6 +22,16 @@ from lightrag.kg.shared_storage import initialize_share_data, initialize_pipelin
 from dotenv import load_dotenv
 
 from lightrag import LightRAG, QueryParam
+from lightrag.utils import compute_mdhash_id
+
+from util.fallback_index_util import FallbackIndex
+from util.vietnamese_tokenizer_util import VietnameseTokenizer
+from util.tracing_util import TracedStorage, traced
+from util.embedding_batcher_util import create_embedding_batcher
+from util.llm_client_util import create_llm_client
+from util.graph_cache_util import wrap_graph_storage
+from util.io_util import map_blocking, run_blocking
+from util.metadata_index_util import SOURCE_HEADER, attach_metadata_index
 
 # cho phép chạy vòng lặp lồng nhau (trong Jupyter hoặc môi trường đã có vòng lặp)
 nest_asyncio.apply()
@@ -13,19 +39,53 @@ nest_asyncio.apply()
 # Load các biến môi trường
 load_dotenv()
 
+# Cấu hình snapshot chỉ mục
+SNAPSHOT_FORMAT_VERSION = 2                   # 2: archive chứa cả đồ thị tri thức (SNAPSHOT_GRAPH_FILE)
+SNAPSHOT_MANIFEST = "snapshot_manifest.json"   # Manifest nằm trong archive và trong working_dir sau khi giải nén
+SNAPSHOT_GRAPH_FILE = "snapshot_graph.json"    # Node/cạnh của đồ thị (Neo4j nằm ngoài working_dir)
+SNAPSHOT_STAGING_PREFIX = ".snapshot_"         # Thư mục giải nén tạm bên trong working_dir
+FALLBACK_INDEX_DIR = "fallback_index"          # Thư mục con chứa FallbackIndex đã lưu
+INDEX_VERSION_FILE = "index_version.json"      # Phiên bản chỉ mục (tăng dần) dùng cho ETag của GET /query
+CHUNK_TOKEN_SIZE = 1500
+CHUNK_OVERLAP_TOKEN_SIZE = 300
+CHUNK_SEPARATOR = "\x1e"                       # Phân tách chunk đã tách sẵn khi chèn (ASCII record separator)
+INGEST_EXTENSIONS = (".txt", ".json")          # Loại file được pipeline ingestion offline đọc
+FAQ_FILENAME = "faq.json"                      # Câu hỏi thường gặp nằm cạnh dữ liệu, không đánh chỉ mục
+
+# Embedding dùng chung cho mọi corpus: gom các lời gọi đồng thời thành micro-batch
+embedding_batcher = create_embedding_batcher(openai_embed.func)
+
+# LLM client dùng chung: connection pool, giới hạn đồng thời và token bucket cho mọi corpus
+llm_client = create_llm_client(gpt_4o_mini_complete)
+
+
 # Hàm khởi tạo LightRAG
-async def initialize_rag(working_dir: str = "./rag_storage") -> LightRAG:
+async def initialize_rag(working_dir: str = "./rag_storage", workspace: str = "",
+                         graph_storage: str = "Neo4JStorage") -> LightRAG:
     # Bước 1: Khởi tạo LightRAG với cấu hình cơ bản
+    # workspace tách biệt dữ liệu của từng corpus trong cùng Neo4j/shared storage
+    # graph_storage="NetworkXStorage" dùng đồ thị tạm trong working_dir (build snapshot không ghi vào Neo4j)
+    # Hàm embedding/LLM được bọc span để trace thấy thời gian gọi API
     rag = LightRAG(
         working_dir=working_dir,
-        embedding_func=openai_embed,
-        llm_model_func=gpt_4o_mini_complete,
-        graph_storage="Neo4JStorage",
+        workspace=workspace,
+        embedding_func=dataclasses.replace(openai_embed, func=traced("embedding")(embedding_batcher)),
+        llm_model_func=traced("llm.complete")(llm_client.complete),
+        graph_storage=graph_storage,
         vector_storage="FaissVectorDBStorage",
-        chunk_token_size=1500,
-        chunk_overlap_token_size=300
+        chunk_token_size=CHUNK_TOKEN_SIZE,
+        chunk_overlap_token_size=CHUNK_OVERLAP_TOKEN_SIZE
     )
 
+    # Đo thời gian Neo4j và vector store bằng span riêng (đặt dưới cache: chỉ lời gọi thật tới backend)
+    rag.chunk_entity_relation_graph = TracedStorage(rag.chunk_entity_relation_graph, "neo4j")
+    for name in ("entities_vdb", "relationships_vdb", "chunks_vdb"):
+        setattr(rag, name, TracedStorage(getattr(rag, name), f"vector.{name.removesuffix('_vdb')}"))
+    # Cache node/láng giềng hay dùng trong bộ nhớ, tránh round-trip Neo4j lặp lại mỗi truy vấn
+    rag.chunk_entity_relation_graph = wrap_graph_storage(rag.chunk_entity_relation_graph)
+    # Chỉ mục metadata (file nguồn, mục JSON, ngày tháng -> chunk id) cập nhật khi ingestion, dùng để lọc truy vấn
+    attach_metadata_index(rag, working_dir)
+
     await rag.initialize_storages()
 
     # ensure shared dicts exist
@@ -36,15 +96,10 @@ async def initialize_rag(working_dir: str = "./rag_storage") -> LightRAG:
 
 #  Hàm đánh chỉ mục dữ liệu
 async def index_data(rag: LightRAG, file_path: str) -> None:
-    # Bước 1: Kiểm tra file có tồn tại không
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Data file not found: {file_path}")
-
-    # Bước 2: Đọc nội dung file
-    with open(file_path, 'r', encoding='utf-8') as f:
-        text = f.read()
+    # Bước 1: Đọc file ngoài event loop (JSON được làm phẳng như RAGService.initialize)
+    text = await run_blocking(read_data_file, file_path)
 
-    # Bước 3: Truyền các đoạn văn bản vào kho vector và đồ thị của LightRAG
+    # Bước 2: Truyền các đoạn văn bản vào kho vector và đồ thị của LightRAG
     await rag.ainsert(input=text, file_paths=[file_path])
 
 
@@ -55,3 +110,614 @@ async def index_file(rag: LightRAG, path: str) -> None:
     """
     await index_data(rag, path)
 
+
+
+# Hàm chuyển JSON thành văn bản dễ đọc
+def convert_json_to_text(data) -> str:
+    """
+    Chuyển dữ liệu JSON lồng nhau thành văn bản "đường_dẫn: giá trị".
+    Mỗi khóa cấp cao (hoặc mỗi phần tử của danh sách object) thành một đoạn văn riêng.
+    """
+    def lines(value, path: str):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                yield from lines(child, f"{path}.{key}" if path else key)
+        elif isinstance(value, list) and all(not isinstance(item, (dict, list)) for item in value):
+            yield f"{path}: {'; '.join(str(item) for item in value)}"
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                yield from lines(item, f"{path}[{i}]")
+        else:
+            yield f"{path}: {value}"
+
+    if not isinstance(data, dict):
+        return "\n".join(lines(data, ""))
+
+    blocks = []
+    for key, value in data.items():
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            blocks.extend("\n".join(lines(item, f"{key}[{i}]")) for i, item in enumerate(value))
+        else:
+            blocks.append("\n".join(lines(value, key)))
+    return "\n\n".join(block for block in blocks if block)
+
+
+# Hàm đọc file dữ liệu thành văn bản
+def read_data_file(file_path: str) -> str:
+    """
+    Đọc file .txt nguyên văn, file .json được chuyển thành văn bản dễ đọc
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if file_path.endswith('.json'):
+            return convert_json_to_text(json.load(f))
+        return f.read()
+
+
+# Hàm tạo văn bản dự phòng
+def _read_fallback_part(file_path: str) -> Optional[str]:
+    try:
+        content = read_data_file(file_path)
+        return f"{SOURCE_HEADER.format(os.path.basename(file_path))}\n{content}\n"
+    except Exception as e:
+        print(f"Failed to load {file_path} for fallback: {e}")
+        return None
+
+
+def build_fallback_text(data_files: List[str]) -> Optional[str]:
+    """
+    Ghép nội dung tất cả files (bỏ qua file lỗi) để tìm kiếm cục bộ
+    """
+    all_text = [part for part in map(_read_fallback_part, data_files) if part is not None]
+    return "\n\n".join(all_text) if all_text else None
+
+
+async def build_fallback_text_async(data_files: List[str]) -> Optional[str]:
+    """
+    Như build_fallback_text nhưng đọc và parse các file song song trong thread pool I/O
+    """
+    parts = await map_blocking(_read_fallback_part, data_files)
+    all_text = [part for part in parts if part is not None]
+    return "\n\n".join(all_text) if all_text else None
+
+
+# Các hàm tính checksum
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compute_corpus_hash(data_files: List[str]) -> str:
+    """
+    Hash của corpus = hash của (tên file, hash nội dung) theo tên file, không phụ thuộc thứ tự truyền vào
+    (snapshot dựng từ discover_data_files và RAGService liệt kê cùng các file theo thứ tự khác nhau).
+    Dùng để phát hiện snapshot đã cũ so với dữ liệu hiện tại.
+    """
+    digest = hashlib.sha256()
+    for file_path in sorted(data_files, key=os.path.basename):
+        digest.update(os.path.basename(file_path).encode('utf-8'))
+        digest.update(file_sha256(file_path).encode('ascii'))
+    return digest.hexdigest()
+
+
+# Các hàm đọc/ghi phiên bản chỉ mục
+def read_index_version(working_dir: str) -> dict:
+    """
+    Đọc phiên bản chỉ mục đã lưu trong working_dir
+
+    Returns:
+        dict {"version": int, "corpus_hash": str | None}; version 0 nếu chưa có hoặc file hỏng
+    """
+    try:
+        with open(os.path.join(working_dir, INDEX_VERSION_FILE), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return {"version": int(state.get("version", 0)), "corpus_hash": state.get("corpus_hash")}
+    except (OSError, ValueError, TypeError, AttributeError):
+        return {"version": 0, "corpus_hash": None}
+
+
+def write_index_version(working_dir: str, state: dict) -> None:
+    """
+    Ghi phiên bản chỉ mục (ghi file tạm rồi đổi tên để không để lại file dở dang)
+    """
+    os.makedirs(working_dir, exist_ok=True)
+    path = os.path.join(working_dir, INDEX_VERSION_FILE)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+# Các hàm xuất/nhập đồ thị tri thức của snapshot
+async def export_graph(graph, directory: str) -> dict:
+    """
+    Ghi toàn bộ node/cạnh của graph storage (Neo4j, NetworkX, ...) ra SNAPSHOT_GRAPH_FILE trong directory.
+    Cạnh vô hướng: (a, b) và (b, a) chỉ ghi một lần.
+
+    Returns:
+        dict {"nodes": số node, "edges": số cạnh}
+    """
+    nodes = await graph.get_all_nodes()
+    edges = {}
+    for edge in await graph.get_all_edges():
+        edges.setdefault(tuple(sorted((edge["source"], edge["target"]))), edge)
+    data = {"nodes": nodes, "edges": list(edges.values())}
+    await run_blocking(_write_json, os.path.join(directory, SNAPSHOT_GRAPH_FILE), data)
+    return {"nodes": len(nodes), "edges": len(edges)}
+
+
+async def import_graph(graph, directory: str) -> dict:
+    """
+    Nạp SNAPSHOT_GRAPH_FILE vào graph storage (upsert theo lô)
+
+    Returns:
+        dict {"nodes": số node, "edges": số cạnh} đã nạp
+    """
+    data = await run_blocking(_read_json, os.path.join(directory, SNAPSHOT_GRAPH_FILE))
+    await graph.upsert_nodes_batch([
+        (node["id"], {key: value for key, value in node.items() if key != "id"}) for node in data["nodes"]
+    ])
+    await graph.upsert_edges_batch([
+        (edge["source"], edge["target"], {key: value for key, value in edge.items() if key not in ("source", "target")})
+        for edge in data["edges"]
+    ])
+    await graph.index_done_callback()
+    return {"nodes": len(data["nodes"]), "edges": len(data["edges"])}
+
+
+def graph_counts(directory: str) -> Optional[dict]:
+    """
+    Số node/cạnh trong SNAPSHOT_GRAPH_FILE của directory (None nếu thiếu hoặc hỏng)
+    """
+    try:
+        data = _read_json(os.path.join(directory, SNAPSHOT_GRAPH_FILE))
+        return {"nodes": len(data["nodes"]), "edges": len(data["edges"])}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data) -> None:
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def _write_local_manifest(directory: str, manifest: dict, archive_sha256: str) -> None:
+    """
+    Ghi manifest kèm checksum archive vào thư mục index: restore_snapshot thấy khớp thì bỏ qua giải nén
+    """
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({**manifest, "archive_sha256": archive_sha256}, f, ensure_ascii=False, indent=2)
+
+
+# Hàm đóng gói snapshot
+def write_snapshot(working_dir: str, data_files: List[str], output_path: str) -> dict:
+    """
+    Đóng gói working_dir đã đánh chỉ mục thành archive snapshot có phiên bản và checksum
+
+    Args:
+        working_dir: Thư mục storage của LightRAG đã đánh chỉ mục xong, có SNAPSHOT_GRAPH_FILE (export_graph)
+        data_files: Các file dữ liệu tạo nên chỉ mục (để tính corpus hash)
+        output_path: Đường dẫn archive .tar.gz; checksum ghi vào <output_path>.sha256
+
+    Returns:
+        dict: Manifest của snapshot
+
+    Raises:
+        FileNotFoundError: Nếu working_dir chưa có đồ thị đã xuất
+    """
+    # Đồ thị nằm ngoài working_dir (Neo4j): snapshot không có đồ thị sẽ khôi phục thành chỉ mục thiếu entity
+    counts = graph_counts(working_dir)
+    if counts is None:
+        raise FileNotFoundError(f"{SNAPSHOT_GRAPH_FILE} not found in {working_dir}, export the graph first")
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "corpus_hash": compute_corpus_hash(data_files),
+        "files": [
+            {"name": os.path.basename(p), "sha256": file_sha256(p), "size": os.path.getsize(p)}
+            for p in data_files
+        ],
+        "config": {
+            "chunk_token_size": CHUNK_TOKEN_SIZE,
+            "chunk_overlap_token_size": CHUNK_OVERLAP_TOKEN_SIZE,
+            "vector_storage": "FaissVectorDBStorage",
+            "graph_storage": "Neo4JStorage",
+        },
+        "graph": {"file": SNAPSHOT_GRAPH_FILE, **counts},
+    }
+
+    # Bước 1: Ghi archive ra file tạm rồi đổi tên để không để lại archive dở dang
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with tarfile.open(tmp_path, "w:gz") as tar:
+        manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        info = tarfile.TarInfo(SNAPSHOT_MANIFEST)
+        info.size = len(manifest_bytes)
+        tar.addfile(info, io.BytesIO(manifest_bytes))
+        for name in sorted(os.listdir(working_dir)):
+            if name != SNAPSHOT_MANIFEST and not name.startswith(SNAPSHOT_STAGING_PREFIX):
+                tar.add(os.path.join(working_dir, name), arcname=name)
+    os.replace(tmp_path, output_path)
+
+    # Bước 2: Ghi checksum của archive; working_dir chính là nội dung archive nên lần khởi động sau
+    # restore_snapshot không cần giải nén lại
+    checksum = file_sha256(output_path)
+    with open(f"{output_path}.sha256", 'w', encoding='utf-8') as f:
+        f.write(f"{checksum}  {os.path.basename(output_path)}\n")
+    _write_local_manifest(working_dir, manifest, checksum)
+
+    print(f"Snapshot written to {output_path} (corpus {manifest['corpus_hash'][:12]})")
+    return manifest
+
+
+# Hàm build snapshot offline
+async def build_snapshot(data_dir: str, output_path: str, fold_accents: bool = True) -> dict:
+    """
+    Đánh chỉ mục dữ liệu trong data_dir vào working_dir tạm và đóng gói thành snapshot.
+    Chạy offline (CI hoặc máy dev), không phải lúc container khởi động.
+    Mỗi file được đọc và chèn giống hệt RAGService.initialize (JSON đã làm phẳng, kèm file_paths)
+    để snapshot cho đúng chỉ mục mà service tự dựng với cùng corpus hash.
+    Đồ thị dựng trên NetworkX tạm (không đụng tới Neo4j đang chạy) rồi được xuất vào archive;
+    service nạp nó vào Neo4j khi khôi phục snapshot.
+    """
+    data_files = discover_data_files(data_dir)
+    working_dir = tempfile.mkdtemp(prefix="rag_snapshot_")
+    try:
+        # Bước 1: Đánh chỉ mục vào LightRAG với đồ thị tạm trong working_dir
+        rag = await initialize_rag(working_dir, graph_storage="NetworkXStorage")
+        documents = await map_blocking(read_data_file, data_files)
+        for file_path, document in zip(data_files, documents):
+            print(f"Indexing {file_path}...")
+            await rag.ainsert(input=document, file_paths=[file_path])
+        counts = await export_graph(rag.chunk_entity_relation_graph, working_dir)
+        print(f"Exported graph: {counts['nodes']} nodes, {counts['edges']} edges")
+        await rag.finalize_storages()
+        # File graphml của NetworkX không cần trong archive (đồ thị đã nằm trong SNAPSHOT_GRAPH_FILE)
+        for name in os.listdir(working_dir):
+            if name.endswith(".graphml"):
+                os.remove(os.path.join(working_dir, name))
+
+        # Bước 2: Lưu sẵn chỉ mục dự phòng để nạp bằng memory-map
+        fallback_text = build_fallback_text(data_files)
+        if fallback_text:
+            index = FallbackIndex.from_text(fallback_text, VietnameseTokenizer(fold_accents=fold_accents))
+            index.save(os.path.join(working_dir, FALLBACK_INDEX_DIR))
+            index.close()
+
+        # Bước 3: Đóng gói
+        return write_snapshot(working_dir, data_files, output_path)
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+def clear_directory(directory: str, keep: Optional[str] = None) -> None:
+    """
+    Xóa nội dung của directory (trừ đường dẫn `keep`); bản thân directory được giữ (có thể là mount point)
+    """
+    if not os.path.isdir(directory):
+        return
+    for entry in os.scandir(directory):
+        if entry.path == keep:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+
+
+# Hàm khôi phục snapshot
+def restore_snapshot(archive_path: str, working_dir: str, data_files: List[str]) -> Optional[dict]:
+    """
+    Khôi phục snapshot vào working_dir nếu hợp lệ và khớp với dữ liệu hiện tại
+
+    Returns:
+        dict manifest nếu đã khôi phục (hoặc working_dir đã khớp sẵn), None nếu snapshot
+        không tồn tại, hỏng, khác phiên bản hoặc đã cũ (cần đánh chỉ mục lại)
+    """
+    if not archive_path or not os.path.exists(archive_path):
+        return None
+
+    # Bước 1: Kiểm tra checksum archive
+    checksum_path = f"{archive_path}.sha256"
+    if not os.path.exists(checksum_path):
+        print(f"Snapshot {archive_path} has no checksum file, ignoring it")
+        return None
+    with open(checksum_path, 'r', encoding='utf-8') as f:
+        expected_checksum = f.read().split()[0]
+    if file_sha256(archive_path) != expected_checksum:
+        print(f"Snapshot {archive_path} checksum mismatch, ignoring it")
+        return None
+
+    # Bước 2: Đọc manifest, kiểm tra phiên bản và corpus hash
+    with tarfile.open(archive_path, "r:gz") as tar:
+        manifest = json.load(tar.extractfile(SNAPSHOT_MANIFEST))
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        print(f"Snapshot format {manifest.get('format_version')} is not supported, ignoring it")
+        return None
+    if manifest.get("corpus_hash") != compute_corpus_hash(data_files):
+        print("Snapshot is stale (data files changed since it was built)")
+        return None
+    expected_graph = manifest.get("graph") or {}
+    expected_counts = {"nodes": expected_graph.get("nodes"), "edges": expected_graph.get("edges")}
+
+    # Bước 3: Bỏ qua giải nén nếu working_dir đã chứa đúng snapshot này (kể cả đồ thị)
+    local_manifest_path = os.path.join(working_dir, SNAPSHOT_MANIFEST)
+    if os.path.exists(local_manifest_path) and graph_counts(working_dir) == expected_counts:
+        with open(local_manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get("archive_sha256") == expected_checksum:
+                return manifest
+
+    # Bước 4: Giải nén vào thư mục tạm bên trong working_dir (cùng filesystem kể cả khi working_dir là
+    # mount point) rồi thay nội dung của working_dir; bản thân working_dir không bị xóa hay đổi tên
+    os.makedirs(working_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=SNAPSHOT_STAGING_PREFIX, dir=working_dir)
+    try:
+        with tarfile.open(archive_path, "r:gz") as tar:
+            tar.extractall(staging_dir, filter="data")
+        # Thiếu đồ thị thì không dùng snapshot: doc_status đánh dấu mọi tài liệu đã xử lý nên
+        # ingestion sẽ bị bỏ qua và đồ thị trống mãi
+        if graph_counts(staging_dir) != expected_counts:
+            print(f"Snapshot {archive_path} graph is missing or does not match its manifest, ignoring it")
+            return None
+        _write_local_manifest(staging_dir, manifest, expected_checksum)
+
+        # Bỏ index cũ (kể cả thư mục tạm còn sót từ lần khôi phục bị ngắt) rồi chuyển nội dung mới vào
+        clear_directory(working_dir, keep=staging_dir)
+        for name in os.listdir(staging_dir):
+            os.replace(os.path.join(staging_dir, name), os.path.join(working_dir, name))
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    print(f"Restored snapshot {archive_path} into {working_dir}")
+    return manifest
+
+
+# Hàm liệt kê files dữ liệu
+def discover_data_files(data_dir: str) -> List[str]:
+    """
+    Liệt kê các file .txt/.json ở cấp đầu của data_dir (không gồm thư mục corpora/ con và faq.json)
+    """
+    return sorted(
+        entry.path for entry in os.scandir(data_dir)
+        if entry.is_file() and entry.name.endswith(INGEST_EXTENSIONS) and entry.name != FAQ_FILENAME
+    )
+
+
+# Bộ mã hóa token dùng khi chunk (mỗi process con tạo một lần)
+_token_encoder = None
+
+
+def _get_token_encoder():
+    """
+    Dùng tiktoken giống LightRAG; nếu không tải được bảng mã (máy offline)
+    thì xấp xỉ mỗi token là một từ kèm khoảng trắng phía trước
+    """
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.encoding_for_model("gpt-4o-mini")
+        except Exception:
+            _token_encoder = False
+    return _token_encoder
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_TOKEN_SIZE,
+               overlap: int = CHUNK_OVERLAP_TOKEN_SIZE) -> Tuple[List[str], int]:
+    """
+    Chia văn bản thành các chunk theo số token, các chunk liền kề chồng lên nhau `overlap` token
+
+    Returns:
+        (danh sách chunk, tổng số token của văn bản)
+    """
+    encoder = _get_token_encoder()
+    tokens = encoder.encode(text) if encoder else re.findall(r"\s*\S+", text)
+    step = max(chunk_size - overlap, 1)
+
+    chunks = []
+    for start in range(0, len(tokens), step):
+        window = tokens[start:start + chunk_size]
+        chunk = (encoder.decode(window) if encoder else "".join(window)).strip()
+        if chunk:
+            chunks.append(chunk)
+        if start + chunk_size >= len(tokens):
+            break
+    return chunks, len(tokens)
+
+
+def prepare_document(file_path: str, chunk_size: int = CHUNK_TOKEN_SIZE,
+                     overlap: int = CHUNK_OVERLAP_TOKEN_SIZE) -> dict:
+    """
+    Đọc, chuẩn hóa và chunk một file. Chạy trong process con của pipeline ingestion
+    (phần tốn CPU, không chạy trong event loop)
+
+    Returns:
+        dict: file_path, doc_id, text, chunks, tokens, bytes
+    """
+    text = unicodedata.normalize("NFC", read_data_file(file_path)).strip()
+    chunks, num_tokens = chunk_text(text, chunk_size, overlap)
+    return {
+        "file_path": file_path,
+        "doc_id": compute_mdhash_id(text, prefix="doc-"),
+        "text": text,
+        "chunks": chunks,
+        "tokens": num_tokens,
+        "bytes": len(text.encode('utf-8')),
+    }
+
+
+async def insert_document(rag: LightRAG, document: dict) -> None:
+    """
+    Đưa document đã chunk sẵn vào LightRAG (embedding + trích xuất đồ thị)
+    """
+    # Nối các chunk bằng ký tự phân tách và bảo LightRAG chỉ tách ở đó: giữ nguyên ranh giới chunk đã tính
+    # trong process con, đồng thời lưu file nguồn (bộ lọc source_file, trạng thái document) như ainsert thường
+    chunks = [chunk.replace(CHUNK_SEPARATOR, " ") for chunk in document["chunks"]]
+    await rag.ainsert(input=CHUNK_SEPARATOR.join(chunks), split_by_character=CHUNK_SEPARATOR,
+                      split_by_character_only=True, ids=[document["doc_id"]], file_paths=[document["file_path"]])
+
+
+# Hàm chạy pipeline ingestion song song
+async def run_ingestion_pipeline(data_files: List[str], rag: Optional[LightRAG] = None,
+                                 workers: Optional[int] = None, concurrency: int = 4,
+                                 max_pending: int = 8, chunk_size: int = CHUNK_TOKEN_SIZE,
+                                 overlap: int = CHUNK_OVERLAP_TOKEN_SIZE) -> dict:
+    """
+    Pipeline hai tầng:
+    1. Process pool đọc/chuẩn hóa/chunk các file song song
+    2. `concurrency` coroutine đưa document vào LightRAG (embedding, insert)
+
+    Số document đang nằm trong pipeline (đang parse, chờ insert, đang insert) không vượt
+    quá `max_pending`, nên tầng parse tự chờ khi tầng insert chậm hơn.
+
+    Args:
+        data_files: Các file cần ingest
+        rag: LightRAG đích; None = chỉ parse/chunk (đo throughput tầng CPU)
+        workers: Số process con (mặc định = số CPU)
+
+    Returns:
+        dict: Báo cáo throughput (documents, chunks, tokens, giây và tốc độ /s)
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_pending)
+    report = {"documents": 0, "chunks": 0, "tokens": 0, "bytes": 0,
+              "parse_seconds": 0.0, "insert_seconds": 0.0, "failed": []}
+    started = time.perf_counter()
+
+    async def parse(executor, file_path: str):
+        parse_started = time.perf_counter()
+        try:
+            document = await loop.run_in_executor(executor, prepare_document, file_path, chunk_size, overlap)
+        except Exception as e:
+            print(f"  ❌ Failed to prepare {file_path}: {e}")
+            report["failed"].append(file_path)
+            slots.release()
+            return
+        report["parse_seconds"] += time.perf_counter() - parse_started
+        await queue.put(document)
+
+    async def produce(executor):
+        tasks = []
+        for file_path in data_files:
+            await slots.acquire()
+            tasks.append(asyncio.create_task(parse(executor, file_path)))
+        await asyncio.gather(*tasks)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def consume():
+        while True:
+            document = await queue.get()
+            if document is None:
+                return
+            insert_started = time.perf_counter()
+            try:
+                if rag is not None:
+                    await insert_document(rag, document)
+                report["documents"] += 1
+                report["chunks"] += len(document["chunks"])
+                report["tokens"] += document["tokens"]
+                report["bytes"] += document["bytes"]
+                print(f"  ✅ {os.path.basename(document['file_path'])}: {len(document['chunks'])} chunks")
+            except Exception as e:
+                print(f"  ❌ Failed to insert {document['file_path']}: {e}")
+                report["failed"].append(document["file_path"])
+            finally:
+                report["insert_seconds"] += time.perf_counter() - insert_started
+                slots.release()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        await asyncio.gather(produce(executor), *(consume() for _ in range(concurrency)))
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = elapsed
+    report["docs_per_second"] = report["documents"] / elapsed if elapsed else 0.0
+    report["chunks_per_second"] = report["chunks"] / elapsed if elapsed else 0.0
+    report["tokens_per_second"] = report["tokens"] / elapsed if elapsed else 0.0
+    return report
+
+
+def format_ingestion_report(report: dict) -> str:
+    """
+    Định dạng báo cáo throughput để in ra console
+    """
+    lines = [
+        "📊 Ingestion report",
+        f"  documents: {report['documents']:>10,}   ({report['docs_per_second']:,.2f} docs/s)",
+        f"  chunks:    {report['chunks']:>10,}   ({report['chunks_per_second']:,.2f} chunks/s)",
+        f"  tokens:    {report['tokens']:>10,}   ({report['tokens_per_second']:,.0f} tokens/s)",
+        f"  elapsed:   {report['elapsed_seconds']:>10.2f} s "
+        f"(cumulative parse {report['parse_seconds']:.2f} s, insert {report['insert_seconds']:.2f} s)",
+    ]
+    if report["failed"]:
+        lines.append(f"  failed:    {len(report['failed'])} files: {', '.join(report['failed'])}")
+    return "\n".join(lines)
+
+
+async def ingest_directory(data_dir: str, working_dir: str, dry_run: bool = False, **pipeline_options) -> dict:
+    """
+    Ingest toàn bộ data_dir vào working_dir bên ngoài web process
+    """
+    data_files = discover_data_files(data_dir)
+    print(f"Ingesting {len(data_files)} files from {data_dir}...")
+    rag = None if dry_run else await initialize_rag(working_dir)
+    try:
+        return await run_ingestion_pipeline(data_files, rag, **pipeline_options)
+    finally:
+        if rag is not None:
+            await rag.finalize_storages()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Công cụ dòng lệnh cho ingestion offline
+
+    Ví dụ:
+        python -m ingestion index --data-dir ../data --workers 4 --concurrency 4
+        python -m ingestion snapshot --data-dir ../data --output ../snapshots/index.tar.gz
+    """
+    parser = argparse.ArgumentParser(description="Offline ingestion tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Build a versioned index snapshot archive")
+    snapshot_parser.add_argument("--data-dir", required=True, help="Thư mục chứa các file .txt/.json (như lệnh index)")
+    snapshot_parser.add_argument("--output", required=True, help="Đường dẫn archive .tar.gz")
+    snapshot_parser.add_argument("--no-fold-accents", action="store_true",
+                                 help="Không đánh chỉ mục dạng bỏ dấu cho tìm kiếm dự phòng")
+
+    index_parser = subparsers.add_parser("index", help="Ingest a data directory with a parallel pipeline")
+    index_parser.add_argument("--data-dir", required=True, help="Thư mục chứa các file .txt/.json")
+    # Mặc định: thư mục index của corpus mặc định (<RAG_STORAGE_PATH>/default)
+    index_parser.add_argument("--working-dir",
+                              default=os.path.join(os.getenv("RAG_STORAGE_PATH", "./rag_storage"), "default"))
+    index_parser.add_argument("--workers", type=int, default=None, help="Số process parse/chunk (mặc định: số CPU)")
+    index_parser.add_argument("--concurrency", type=int, default=4, help="Số document insert đồng thời")
+    index_parser.add_argument("--max-pending", type=int, default=8, help="Số document tối đa nằm trong pipeline")
+    index_parser.add_argument("--chunk-size", type=int, default=CHUNK_TOKEN_SIZE)
+    index_parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKEN_SIZE)
+    index_parser.add_argument("--dry-run", action="store_true", help="Chỉ parse/chunk, không gọi embedding/LLM")
+
+    args = parser.parse_args(argv)
+    if args.command == "index":
+        report = asyncio.run(ingest_directory(
+            args.data_dir, args.working_dir, dry_run=args.dry_run,
+            workers=args.workers, concurrency=args.concurrency, max_pending=args.max_pending,
+            chunk_size=args.chunk_size, overlap=args.overlap,
+        ))
+        print(format_ingestion_report(report))
+        return 1 if report["failed"] else 0
+    if args.command == "snapshot":
+        manifest = asyncio.run(build_snapshot(args.data_dir, args.output, not args.no_fold_accents))
+        print(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
 # Import các thư viện cần thiết
-from fastapi import FastAPI        # Tạo web API
+import os
+from typing import Optional
+from fastapi import FastAPI, Header, Request, Response   # Tạo web API
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 import uvicorn                     # Máy chủ web để chạy API
 from controller.rag_controller import RAGController
 from dto.QueryRequest import QueryRequest
@@ -12,6 +16,9 @@ app = FastAPI(
     version="1.0.0"                              # Phiên bản
 )
 
+# Nén gzip phản hồi lớn (câu trả lời dài, /health, /metrics) khi client gửi Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", "500")))
+
 # Khởi tạo controller
 rag_controller = RAGController()
 
@@ -22,6 +29,13 @@ async def startup_event():
     """
     await rag_controller.initialize_system()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Lưu trạng thái (thống kê câu hỏi) khi ứng dụng dừng
+    """
+    await rag_controller.shutdown_system()
+
 @app.get("/")
 async def root():
     """
@@ -30,18 +44,46 @@ async def root():
     return rag_controller.get_basic_info()
 
 @app.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest):
+async def query_rag(request: QueryRequest, response: Response,
+                    x_profile: Optional[str] = Header(None)):
     """
     Endpoint chính để hỏi đáp với hệ thống RAG
     Đây là nơi người dùng gửi câu hỏi và nhận câu trả lời
     
     Args:
         request: QueryRequest chứa câu hỏi và các tham số
+        x_profile: Header "X-Profile: 1" để chạy request dưới profiler lấy mẫu
         
     Returns:
         QueryResponse với câu trả lời
     """
-    return await rag_controller.process_query(request)
+    profile = (x_profile or "").lower() in ("1", "true", "yes")
+    result = await rag_controller.process_query(request, profile=profile)
+    response.headers["X-Trace-Id"] = result.trace_id or ""
+    return result
+
+@app.get("/query", response_model=QueryResponse)
+async def query_rag_get(request: Request, question: str, mode: str = "mix", top_k: int = 5,
+                        corpus_id: Optional[str] = None, source_file: Optional[str] = None,
+                        section: Optional[str] = None, date_from: Optional[str] = None,
+                        date_to: Optional[str] = None, v: Optional[int] = None,
+                        if_none_match: Optional[str] = Header(None)):
+    """
+    Hỏi đáp qua GET để trình duyệt/proxy/CDN cache được câu trả lời
+    URL không ở dạng chuẩn được chuyển hướng (308) về URL chuẩn; phản hồi có ETag theo phiên bản
+    chỉ mục, gửi lại If-None-Match để nhận 304 khi chỉ mục chưa đổi
+
+    Args:
+        question, mode, top_k, corpus_id, source_file, section, date_from, date_to: Như POST /query
+        v: Phiên bản chỉ mục (X-Index-Version) để ghim URL; đúng phiên bản hiện tại thì cache bất biến
+        if_none_match: ETag đã nhận trước đó
+
+    Returns:
+        QueryResponse (hoặc 304/308)
+    """
+    query = QueryRequest(question=question, mode=mode, top_k=top_k, corpus_id=corpus_id,
+                         source_file=source_file, section=section, date_from=date_from, date_to=date_to)
+    return await rag_controller.process_get_query(query, request.url.query, if_none_match, v)
 
 @app.get("/health")
 async def health_check():
@@ -50,13 +92,51 @@ async def health_check():
     """
     return await rag_controller.get_health_status()
 
+@app.get("/health/live")
+async def health_live():
+    """
+    Liveness rẻ (O(1)) cho Docker HEALTHCHECK / liveness probe
+    """
+    return rag_controller.get_liveness()
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """
+    Readiness từ kết quả probe nền đã cache; trả 503 khi chưa sẵn sàng
+    """
+    result = rag_controller.get_readiness()
+    if not result["ready"]:
+        response.status_code = 503
+    return result
+
+@app.get("/health/deep")
+async def health_deep():
+    """
+    Kết quả probe sâu đã cache (graph, vector, embedding, LLM) kèm độ trễ và thời điểm kiểm tra
+    """
+    return rag_controller.get_deep_health()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Endpoint xem metrics vận hành (hàng đợi, từ chối, độ trễ)
+    """
+    return rag_controller.get_metrics()
+
+@app.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """
+    Lấy profile đã lưu của một request (collapsed stack, dùng với flamegraph/speedscope)
+    """
+    return rag_controller.get_profile(profile_id)
+
 @app.post("/reindex")
-async def reindex_data():
+async def reindex_data(corpus_id: Optional[str] = None):
     """
     Buộc đánh chỉ mục lại dữ liệu
     Dùng khi muốn cập nhật dữ liệu mới
     """
-    return await rag_controller.reindex_data()
+    return await rag_controller.reindex_data(corpus_id)
 
 if __name__ == "__main__":
     # Chạy máy chủ web
@@ -3,6 +3,7 @@ Temporary mock implementation of LightRAG for testing purposes
 This provides the same API but with basic functionality until lightrag is fixed
 """
 import os
+import json
 from typing import Optional, Dict, Any
 
 class MockQueryParam:
@@ -33,12 +34,19 @@ class MockLightRAG:
         print(f"Mock LightRAG initialized in {self.working_dir}")
     
     async def ainsert(self, input: str, file_paths: list = None):
-        """Mock data insertion - just stores the text"""
-        self.data_store = input
+        """Mock data insertion - appends the text (JSON input is serialized)"""
+        if not isinstance(input, str):
+            input = json.dumps(input, ensure_ascii=False)
+        self.data_store = f"{self.data_store}\n\n{input}" if self.data_store else input
         data_file = os.path.join(self.working_dir, "data.txt")
         with open(data_file, 'w', encoding='utf-8') as f:
-            f.write(input)
+            f.write(self.data_store)
         print(f"Mock: Inserted {len(input)} characters of data")
+
+    async def finalize_storages(self):
+        """Mock storage finalization - drops in-memory data"""
+        self.data_store = None
+        self.initialized = False
     
     async def aquery(self, question: str, param: MockQueryParam = None) -> str:
         """Mock query processing with basic text search"""
@@ -0,0 +1,215 @@
+"""
+Service Layer - Quản lý nhiều knowledge base (corpus) trong cùng một tiến trình
+Mỗi corpus có RAGService và thư mục lưu trữ riêng, được tải khi cần
+và loại khỏi bộ nhớ theo LRU khi vượt giới hạn
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from ingestion import initialize_rag, FAQ_FILENAME, FALLBACK_INDEX_DIR, INDEX_VERSION_FILE, SNAPSHOT_MANIFEST
+from service.rag_service import RAGService
+from service.faq_service import create_faq_service
+from util.lru_cache_util import SizedLRUCache
+from util.metrics_util import MetricsUtil
+
+
+DEFAULT_CORPUS_ID = "default"
+SNAPSHOT_FILENAME = "index_snapshot.tar.gz"   # Snapshot dựng sẵn nằm cạnh dữ liệu của corpus
+# File index của corpus mặc định khi còn nằm thẳng trong storage_root (trước khi có thư mục riêng)
+LEGACY_INDEX_PREFIXES = ("kv_store_", "vdb_", "faiss_index_", "graph_")
+LEGACY_INDEX_NAMES = (FALLBACK_INDEX_DIR, SNAPSHOT_MANIFEST, INDEX_VERSION_FILE)
+
+
+class CorpusNotFoundError(Exception):
+    """
+    Lỗi khi corpus được yêu cầu không có dữ liệu
+    """
+
+
+def _migrate_legacy_storage(storage_root: str, working_dir: str):
+    """
+    Chuyển index của corpus mặc định từ storage_root (bố cục cũ) vào thư mục riêng của nó
+    để khỏi đánh chỉ mục lại sau khi nâng cấp. Chỉ chạy khi thư mục mới chưa có.
+    """
+    if os.path.exists(working_dir) or not os.path.isdir(storage_root):
+        return
+    legacy = [name for name in os.listdir(storage_root)
+              if name.startswith(LEGACY_INDEX_PREFIXES) or name in LEGACY_INDEX_NAMES]
+    if not legacy:
+        return
+    os.makedirs(working_dir)
+    for name in legacy:
+        os.replace(os.path.join(storage_root, name), os.path.join(working_dir, name))
+    print(f"Moved {len(legacy)} legacy index files of the default corpus into {working_dir}")
+
+
+class CorpusService:
+    """
+    Quản lý các RAGService theo corpus id.
+
+    Bố cục dữ liệu cho corpus `<id>` (khác corpus mặc định):
+        <data_root>/<id>/data.txt, <data_root>/<id>/data.json
+        <storage_root>/corpora/<id>/   (thư mục index riêng)
+        <data_root>/<id>/index_snapshot.tar.gz   (snapshot dựng sẵn, tùy chọn)
+        <data_root>/<id>/faq.json                (câu hỏi thường gặp, tùy chọn)
+    Corpus mặc định dùng đường dẫn dữ liệu cũ và thư mục index <storage_root>/default/
+    (tách khỏi các corpus khác để ước lượng bộ nhớ và khôi phục snapshot chỉ chạm index của nó),
+    không bao giờ bị loại.
+    """
+
+    def __init__(self, data_path: str, data_path_json: str,
+                 data_root: Optional[str] = None, storage_root: str = "./rag_storage",
+                 max_loaded: int = 4, max_memory_mb: float = 1024,
+                 snapshot_path: Optional[str] = None, faq_path: Optional[str] = None,
+                 service_factory: Optional[Callable[..., RAGService]] = None):
+        self.data_root = data_root or os.path.join(os.path.dirname(data_path) or ".", "corpora")
+        self.storage_root = storage_root
+        self.snapshot_path = snapshot_path   # Snapshot của corpus mặc định
+        self.faq_path = faq_path or os.path.join(os.path.dirname(data_path) or ".", FAQ_FILENAME)
+        self.service_factory = service_factory or self._create_service
+
+        # Corpus mặc định giữ đường dẫn dữ liệu cũ, index nằm trong thư mục riêng
+        default_working_dir = os.path.join(storage_root, DEFAULT_CORPUS_ID)
+        _migrate_legacy_storage(storage_root, default_working_dir)
+        self.default_service = self.service_factory(
+            DEFAULT_CORPUS_ID, data_path, data_path_json, default_working_dir
+        )
+
+        self._active: Dict[str, int] = {}             # Số truy vấn đang dùng mỗi corpus
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._cache = SizedLRUCache(
+            max_bytes=int(max_memory_mb * 1024 * 1024),
+            max_items=max_loaded,
+            can_evict=lambda corpus_id, _: corpus_id != DEFAULT_CORPUS_ID and self._active.get(corpus_id, 0) == 0,
+        )
+        self._cache.put(DEFAULT_CORPUS_ID, self.default_service)
+
+    def _create_service(self, corpus_id: str, data_path: str, data_path_json: str, working_dir: str) -> RAGService:
+        """
+        Tạo RAGService cho một corpus với workspace riêng trong storage dùng chung
+        """
+        if corpus_id == DEFAULT_CORPUS_ID:
+            workspace, snapshot_path, faq_path = "", self.snapshot_path, self.faq_path
+        else:
+            workspace = corpus_id
+            snapshot_path = os.path.join(os.path.dirname(data_path), SNAPSHOT_FILENAME)
+            faq_path = os.path.join(os.path.dirname(data_path), FAQ_FILENAME)
+        return RAGService(
+            data_path, data_path_json,
+            working_dir=working_dir,
+            rag_factory=partial(initialize_rag, workspace=workspace),
+            snapshot_path=snapshot_path,
+            faq_service=create_faq_service(faq_path),
+        )
+
+    def resolve_paths(self, corpus_id: str) -> tuple:
+        """
+        Xác định đường dẫn dữ liệu và thư mục lưu trữ của một corpus
+
+        Returns:
+            Tuple (data_path, data_path_json, working_dir)
+        """
+        corpus_dir = os.path.join(self.data_root, corpus_id)
+        return (
+            os.path.join(corpus_dir, "data.txt"),
+            os.path.join(corpus_dir, "data.json"),
+            os.path.join(self.storage_root, "corpora", corpus_id),
+        )
+
+    @asynccontextmanager
+    async def use(self, corpus_id: Optional[str] = None):
+        """
+        Lấy RAGService của corpus và giữ nó không bị loại trong khi đang dùng
+
+        Raises:
+            CorpusNotFoundError: Nếu corpus không có thư mục dữ liệu
+        """
+        corpus_id = corpus_id or DEFAULT_CORPUS_ID
+        self._active[corpus_id] = self._active.get(corpus_id, 0) + 1
+        try:
+            service = await self.get_service(corpus_id)
+            yield service
+        finally:
+            self._active[corpus_id] -= 1
+            if self._active[corpus_id] == 0:
+                del self._active[corpus_id]
+
+    async def get_service(self, corpus_id: str) -> RAGService:
+        """
+        Lấy RAGService của corpus, tải lười (lazy) nếu chưa có trong bộ nhớ
+        """
+        service = self._cache.get(corpus_id)
+        if service is not None:
+            MetricsUtil.increment("corpus_cache_hits_total")
+            return service
+
+        # Chỉ tạo lock cho corpus có thật: corpus_id ngẫu nhiên không được làm phình _load_locks
+        data_path, data_path_json, working_dir = self.resolve_paths(corpus_id)
+        if not os.path.isdir(os.path.dirname(data_path)):
+            raise CorpusNotFoundError(f"Corpus not found: {corpus_id}")
+
+        lock = self._load_locks.setdefault(corpus_id, asyncio.Lock())
+        async with lock:
+            # Kiểm tra lại: truy vấn khác có thể đã tải xong trong lúc chờ lock
+            service = self._cache.get(corpus_id)
+            if service is not None:
+                return service
+
+            MetricsUtil.increment("corpus_loads_total")
+            os.makedirs(working_dir, exist_ok=True)
+            service = self.service_factory(corpus_id, data_path, data_path_json, working_dir)
+            await service.initialize()
+
+            evicted = self._cache.put(corpus_id, service, size=service.estimate_memory_bytes())
+            await self._unload(evicted)
+            return service
+
+    def index_version(self, corpus_id: str) -> int:
+        """
+        Phiên bản chỉ mục của corpus đang nằm trong bộ nhớ (0 nếu chưa tải; không tải corpus).
+        Chỉ đọc trạng thái: không đổi thứ tự LRU và không tính vào thống kê hit/miss
+        """
+        service = self._cache.peek(corpus_id)
+        return service.index_version if service is not None else 0
+
+    def faq_revision(self, corpus_id: str) -> Optional[str]:
+        """
+        Phiên bản FAQ của corpus đang nằm trong bộ nhớ (None nếu chưa tải hoặc không có FAQ)
+        """
+        service = self._cache.peek(corpus_id)
+        if service is None or service.faq_service is None:
+            return None
+        return service.faq_service.revision()
+
+    async def refresh_size(self, corpus_id: str):
+        """
+        Cập nhật kích thước ước lượng của corpus (ví dụ sau khi reindex)
+        """
+        service = self._cache.peek(corpus_id)
+        if service is not None:
+            await self._unload(self._cache.resize(corpus_id, service.estimate_memory_bytes()))
+
+    async def _unload(self, evicted: list):
+        """
+        Giải phóng tài nguyên của các corpus bị loại khỏi LRU
+        """
+        for corpus_id, service in evicted:
+            print(f"Evicting corpus '{corpus_id}' from memory")
+            MetricsUtil.increment("corpus_evictions_total")
+            await service.close()
+        MetricsUtil.set_gauge("corpus_loaded", len(self._cache))
+        MetricsUtil.set_gauge("corpus_memory_bytes", self._cache.total_bytes)
+
+    def get_status(self) -> dict:
+        """
+        Trạng thái các corpus đang được tải
+        """
+        return {
+            "loaded": self._cache.keys(),
+            "active": dict(self._active),
+            **self._cache.get_stats(),
+        }
@@ -0,0 +1,230 @@
+"""
+Service Layer - Trả lời nhanh câu hỏi thường gặp (FAQ) trước pipeline RAG
+Câu hỏi khớp một mục FAQ đã biên soạn được trả lời ngay, không gọi Neo4j/embedding/LLM
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import List, Optional
+
+from util.aho_corasick_util import AhoCorasick
+from util.metrics_util import MetricsUtil
+from util.vietnamese_tokenizer_util import VietnameseTokenizer
+
+
+class FAQEntry:
+    """
+    Một mục FAQ: nhiều cách hỏi cho cùng một câu trả lời
+    """
+
+    __slots__ = ("id", "questions", "answer", "min_confidence")
+
+    def __init__(self, entry_id: str, questions: List[str], answer: str, min_confidence: Optional[float] = None):
+        self.id = entry_id
+        self.questions = questions
+        self.answer = answer
+        self.min_confidence = min_confidence
+
+
+class FAQService:
+    """
+    Lớp FAQ đọc từ file JSON ({"entries": [{"id", "questions", "answer", "min_confidence"?}]}).
+
+    Khớp câu hỏi:
+    1. Chuẩn hóa: NFC, chữ thường, bỏ dấu, bỏ dấu câu (gõ không dấu vẫn khớp)
+    2. Automaton Aho-Corasick trên các cách hỏi đã chuẩn hóa, chỉ nhận khớp trọn từ
+    3. Độ tin cậy của một mục = tỉ lệ từ của câu hỏi (trừ từ đệm như "cho tôi hỏi") được các cụm của mục che phủ
+    4. Trả lời khi độ tin cậy >= ngưỡng và không có mục khác gần bằng (chênh < `ambiguity_margin`)
+
+    Ngưỡng mặc định 1.0: mọi từ không phải từ đệm đều phải được che phủ. Một từ thừa có thể đổi hẳn
+    nghĩa câu hỏi ("Who was Napoleon III", "When was the Battle of Waterloo lost") nên khớp một phần
+    luôn để RAG trả lời; mục nào chấp nhận khớp lỏng hơn thì đặt `min_confidence` riêng.
+
+    File được tự nạp lại khi thay đổi (kiểm tra mtime tối đa mỗi `reload_interval` giây);
+    file lỗi thì giữ nguyên bộ FAQ đang dùng.
+    """
+
+    # Từ đệm không tính vào độ dài câu hỏi (dạng bỏ dấu)
+    FILLER_WORDS = frozenset({
+        "cho", "toi", "hoi", "xin", "ban", "oi", "vui", "long", "giup", "a", "nhe", "va", "vay",
+        "please", "tell", "me", "can", "you",
+    })
+    MAX_QUESTION_CHARS = 300   # Câu hỏi dài hơn không phải FAQ, bỏ qua cho nhanh
+
+    def __init__(self, path: Optional[str] = None, min_confidence: float = 1.0,
+                 ambiguity_margin: float = 0.1, reload_interval: float = 2.0):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.ambiguity_margin = ambiguity_margin
+        self.reload_interval = reload_interval
+        self.entries: List[FAQEntry] = []
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.lookups = 0
+        self.hits = 0
+        self._automaton = AhoCorasick([])
+        self._file_signature = None
+        self._revision: Optional[str] = None
+        self._checked_at = 0.0
+        self.reload()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        "Napoleon là AI?" -> "napoleon la ai"
+        """
+        folded = VietnameseTokenizer.fold(VietnameseTokenizer.normalize(text))
+        return " ".join(re.findall(r"\w+", folded))
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> bool:
+        """
+        Nạp lại file FAQ và dựng lại automaton
+
+        Returns:
+            True nếu nạp thành công
+        """
+        self._checked_at = time.monotonic()
+        if not self.path:
+            return False
+        signature = self._signature()
+        if signature is None:
+            # File bị xóa: tắt FAQ
+            self.entries, self._automaton, self._file_signature, self._revision = [], AhoCorasick([]), None, None
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            data = json.loads(raw.decode("utf-8"))
+            entries = [
+                FAQEntry(str(item["id"]), list(item["questions"]), str(item["answer"]), item.get("min_confidence"))
+                for item in data.get("entries", [])
+            ]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            self._file_signature = signature   # không thử lại đến khi file đổi tiếp
+            print(f"Failed to load FAQ file {self.path}: {self.last_error}")
+            return False
+
+        patterns = []
+        for index, entry in enumerate(entries):
+            for question in entry.questions:
+                normalized = self.normalize(question)
+                if normalized:
+                    patterns.append((f" {normalized} ", index))
+        self.entries = entries
+        self._automaton = AhoCorasick(patterns)
+        self._file_signature = signature
+        self._revision = hashlib.sha256(raw).hexdigest()[:12]
+        self.loaded_at = time.time()
+        self.last_error = None
+        MetricsUtil.set_gauge("faq_entries", len(entries))
+        print(f"FAQ loaded: {len(entries)} entries, {len(patterns)} phrasings from {self.path}")
+        return True
+
+    def _maybe_reload(self):
+        if not self.path or time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = time.monotonic()
+        if self._signature() != self._file_signature:
+            self.reload()
+
+    def revision(self) -> Optional[str]:
+        """
+        Phiên bản nội dung của bộ FAQ đang dùng (hash của file, None nếu không có FAQ).
+        Đổi khi FAQ được nạp lại với nội dung khác; giữ nguyên qua các lần khởi động lại.
+        """
+        self._maybe_reload()
+        return self._revision if self.entries else None
+
+    def match(self, question: str) -> Optional[dict]:
+        """
+        Tìm câu trả lời FAQ cho câu hỏi
+
+        Returns:
+            {"id", "answer", "confidence"} hoặc None nếu không đủ tin cậy
+        """
+        started = time.perf_counter()
+        self._maybe_reload()
+        self.lookups += 1
+        MetricsUtil.increment("faq_lookups_total")
+        result = None
+        if self.entries and len(question) <= self.MAX_QUESTION_CHARS:
+            result = self._match(question)
+        if result is not None:
+            self.hits += 1
+            MetricsUtil.increment("faq_hits_total")
+        MetricsUtil.observe("faq_lookup_seconds", time.perf_counter() - started)
+        return result
+
+    def _match(self, question: str) -> Optional[dict]:
+        normalized = self.normalize(question)
+        if not normalized:
+            return None
+        text = f" {normalized} "
+        words = normalized.split(" ")
+        # Vị trí ký tự -> chỉ số từ (-1 cho khoảng trắng)
+        word_at, index = [], -1
+        for position, char in enumerate(text):
+            if char == " ":
+                word_at.append(-1)
+                continue
+            if text[position - 1] == " ":
+                index += 1
+            word_at.append(index)
+
+        covered = {}   # mục FAQ -> tập chỉ số từ được che phủ
+        for start, end, entry_index in self._automaton.iter_matches(text):
+            positions = {word_at[i] for i in range(start, end) if word_at[i] >= 0}
+            covered.setdefault(entry_index, set()).update(positions)
+        if not covered:
+            return None
+
+        content_words = {i for i, word in enumerate(words) if word not in self.FILLER_WORDS} or set(range(len(words)))
+        scored = sorted(
+            ((len(positions & content_words) / len(content_words), entry_index)
+             for entry_index, positions in covered.items()),
+            reverse=True,
+        )
+        confidence, entry_index = scored[0]
+        entry = self.entries[entry_index]
+        threshold = entry.min_confidence if entry.min_confidence is not None else self.min_confidence
+        if confidence < threshold:
+            return None
+        if len(scored) > 1 and confidence - scored[1][0] < self.ambiguity_margin:
+            return None   # Hai mục FAQ cùng khớp: để RAG trả lời
+        return {"id": entry.id, "answer": entry.answer, "confidence": round(confidence, 3)}
+
+    def get_status(self) -> dict:
+        return {
+            "path": self.path,
+            "entries": len(self.entries),
+            "loaded_at": self.loaded_at,
+            "revision": self._revision,
+            "last_error": self.last_error,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+        }
+
+
+def create_faq_service(path: Optional[str]) -> FAQService:
+    """
+    Tạo FAQService với ngưỡng tin cậy từ biến môi trường (FAQ_ENABLED=false để tắt)
+    """
+    if os.getenv("FAQ_ENABLED", "true").lower() != "true":
+        path = None
+    return FAQService(
+        path,
+        min_confidence=float(os.getenv("FAQ_MIN_CONFIDENCE", "1.0")),
+        reload_interval=float(os.getenv("FAQ_RELOAD_INTERVAL", "2")),
+    )
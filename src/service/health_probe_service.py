@@ -0,0 +1,235 @@
+"""
+Service Layer - Kiểm tra sức khỏe sâu chạy nền
+Định kỳ đo độ trễ và tình trạng của graph storage, vector storage, embedding và LLM;
+/health/ready và /health/deep chỉ đọc kết quả đã cache nên Docker HEALTHCHECK không tốn thêm gì
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from util.graph_cache_util import CachedGraphStorage
+from util.metadata_index_util import MetadataIndexedVectorStorage
+from util.metrics_util import MetricsUtil
+
+PROBE_NODE_ID = "__health_probe__"   # Id không tồn tại: kiểm tra round-trip mà không đọc dữ liệu thật
+
+
+async def probe_graph(rag: Any):
+    """
+    Round-trip tới graph storage (Neo4j), bỏ qua cache trong bộ nhớ
+    """
+    storage = rag.chunk_entity_relation_graph
+    if isinstance(storage, CachedGraphStorage):
+        storage = storage.storage
+    await storage.has_node(PROBE_NODE_ID)
+
+
+async def probe_vector(rag: Any):
+    """
+    Đọc theo id từ vector storage của chunk
+    """
+    storage = rag.chunks_vdb
+    if isinstance(storage, MetadataIndexedVectorStorage):
+        storage = storage.storage
+    await storage.get_by_ids([PROBE_NODE_ID])
+
+
+async def probe_embedding(rag: Any):
+    """
+    Embedding một chuỗi ngắn
+    """
+    vectors = await rag.embedding_func(["health probe"])
+    if len(vectors) != 1:
+        raise RuntimeError(f"embedding returned {len(vectors)} vectors for 1 input")
+
+
+async def probe_llm(rag: Any):
+    """
+    Lời gọi LLM tối thiểu (1 token output)
+    """
+    await rag.llm_model_func("ping", max_tokens=1)
+
+
+DEFAULT_PROBES: Dict[str, Callable[[Any], Awaitable[Any]]] = {
+    "graph": probe_graph,
+    "vector": probe_vector,
+    "embedding": probe_embedding,
+    "llm": probe_llm,
+}
+
+
+class HealthProbeService:
+    """
+    Tác vụ nền chạy các probe song song mỗi `interval` giây (mỗi probe có `timeout` riêng)
+    và giữ kết quả mới nhất: ok, độ trễ, thời điểm kiểm tra, lỗi, số lần lỗi liên tiếp.
+
+    - liveness(): O(1), không chạm tới service hay storage
+    - readiness(): sẵn sàng khi hệ thống đã khởi tạo xong, các probe quan trọng (`critical`) đều ok
+      và kết quả chưa quá cũ (cũ hơn `stale_after` giây thì coi như không biết).
+      Khi RAG chưa khởi tạo được và đang phục vụ bằng tìm kiếm dự phòng: "degraded", vẫn ready
+      nếu `ready_on_fallback` (không thì instance bị loại khỏi load balancer tới khi RAG lên lại)
+    - deep(): toàn bộ kết quả đã cache
+    """
+
+    def __init__(self, rag_getter: Callable[[], Any], interval: float = 30.0, timeout: float = 5.0,
+                 probes: Optional[Dict[str, Callable[[Any], Awaitable[Any]]]] = None,
+                 critical: Iterable[str] = ("graph", "vector"), stale_after: Optional[float] = None,
+                 ready_on_fallback: bool = True):
+        self.rag_getter = rag_getter
+        self.interval = interval
+        self.timeout = timeout
+        self.probes = dict(probes if probes is not None else DEFAULT_PROBES)
+        self.critical = [name for name in critical if name in self.probes]
+        self.stale_after = stale_after if stale_after is not None else 3 * interval
+        self.ready_on_fallback = ready_on_fallback
+        self.fallback = False         # Lần probe gần nhất không có RAG (đang dùng tìm kiếm dự phòng)
+        self.results: Dict[str, dict] = {}
+        self.last_run_at: Optional[float] = None
+        self.runs = 0
+        self.system_ready = False     # Đặt True khi khởi động xong (RAGController.initialize_system)
+        self.started_at = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and bool(self.probes)
+
+    def start(self) -> Optional[asyncio.Task]:
+        """
+        Bắt đầu probe nền (không chờ); bỏ qua nếu bị tắt hoặc đang chạy
+        """
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return self._task
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def run(self):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                print(f"Health probe round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _probe(self, name: str, probe: Callable[[Any], Awaitable[Any]], rag: Any) -> dict:
+        started = time.perf_counter()
+        error = None
+        try:
+            if rag is None:
+                raise RuntimeError("RAG is not initialized (serving local fallback search)")
+            await asyncio.wait_for(probe(rag), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            error = f"timeout after {self.timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - started
+
+        previous = self.results.get(name) or {}
+        ok = error is None
+        MetricsUtil.set_gauge(f"health_probe_up{{probe={name}}}", 1.0 if ok else 0.0)
+        if rag is not None:
+            MetricsUtil.observe(f"health_probe_seconds{{probe={name}}}", latency)
+        return {
+            "ok": ok,
+            "latency_ms": round(latency * 1000, 3),
+            "checked_at": time.time(),
+            "error": error,
+            "consecutive_failures": 0 if ok else previous.get("consecutive_failures", 0) + 1,
+            "last_ok_at": time.time() if ok else previous.get("last_ok_at"),
+        }
+
+    async def probe_once(self) -> Dict[str, dict]:
+        """
+        Chạy mọi probe song song một lần và cập nhật kết quả đã cache
+        """
+        rag = self.rag_getter()
+        names = list(self.probes)
+        results = await asyncio.gather(*(self._probe(name, self.probes[name], rag) for name in names))
+        self.results = dict(zip(names, results))
+        self.fallback = rag is None
+        self.last_run_at = time.time()
+        self.runs += 1
+        return self.results
+
+    def liveness(self) -> dict:
+        return {"status": "alive", "uptime_seconds": round(time.time() - self.started_at, 3)}
+
+    def _is_stale(self) -> bool:
+        return self.last_run_at is None or time.time() - self.last_run_at > self.stale_after
+
+    def readiness(self) -> dict:
+        """
+        Returns:
+            dict có "ready" (bool), "status" và kết quả các probe quan trọng
+        """
+        if not self.system_ready:
+            status = "starting"
+        elif not self.enabled:
+            status = "ready"          # Không có probe: chỉ dựa vào việc đã khởi động xong
+        elif self._is_stale():
+            status = "stale"
+        elif self.fallback:
+            status = "degraded" if self.ready_on_fallback else "unavailable"
+        elif all(self.results.get(name, {}).get("ok") for name in self.critical):
+            status = "ready"
+        else:
+            status = "unavailable"
+        return {
+            "ready": status in ("ready", "degraded"),
+            "status": status,
+            "checked_at": self.last_run_at,
+            "probes": {name: self.results[name] for name in self.critical if name in self.results},
+        }
+
+    def deep(self) -> dict:
+        """
+        Toàn bộ kết quả probe gần nhất (không chạy probe mới)
+        """
+        failing = [name for name, result in self.results.items() if not result["ok"]]
+        if not self.results:
+            status = "unknown"
+        elif not failing:
+            status = "healthy"
+        else:
+            status = "unhealthy" if any(name in self.critical for name in failing) else "degraded"
+        return {
+            "status": status,
+            "stale": self._is_stale(),
+            "fallback": self.fallback,
+            "checked_at": self.last_run_at,
+            "age_seconds": round(time.time() - self.last_run_at, 3) if self.last_run_at else None,
+            "interval_seconds": self.interval,
+            "timeout_seconds": self.timeout,
+            "runs": self.runs,
+            "critical": self.critical,
+            "probes": self.results,
+        }
+
+
+def create_health_probe_service(rag_getter: Callable[[], Any]) -> HealthProbeService:
+    """
+    Tạo HealthProbeService từ biến môi trường (HEALTH_PROBE_INTERVAL=0 để tắt probe nền,
+    HEALTH_PROBE_LLM=true để thêm probe LLM tốn token, HEALTH_READY_ON_FALLBACK=false để
+    /health/ready trả 503 khi chỉ còn tìm kiếm dự phòng)
+    """
+    probes = dict(DEFAULT_PROBES)
+    # Mặc định tắt: mỗi vòng probe là một lời gọi LLM trả phí
+    if os.getenv("HEALTH_PROBE_LLM", "false").lower() != "true":
+        probes.pop("llm")
+    return HealthProbeService(
+        rag_getter,
+        interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "30")),
+        timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "5")),
+        probes=probes,
+        ready_on_fallback=os.getenv("HEALTH_READY_ON_FALLBACK", "true").lower() == "true",
+    )
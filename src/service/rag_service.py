@@ -3,12 +3,34 @@ Service Layer - Xử lý logic nghiệp vụ chính của hệ thống RAG
 Chứa tất cả logic xử lý RAG, khởi tạo và tìm kiếm
 """
 
+import asyncio
 import os
-import json
-from typing import Optional, List
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Callable, Awaitable, Tuple
 from lightrag import LightRAG, QueryParam
-from ingestion import initialize_rag, index_file
-from util.text_search_util import TextSearchUtil
+from lightrag.operate import get_keywords_from_query
+from lightrag.prompt import PROMPTS
+from lightrag.utils import CacheData, compute_args_hash, handle_cache, save_to_cache
+from ingestion import (
+    initialize_rag, read_data_file, build_fallback_text_async, restore_snapshot, write_snapshot,
+    compute_corpus_hash, read_index_version, write_index_version, export_graph, import_graph, clear_directory,
+    FALLBACK_INDEX_DIR,
+)
+from util.fallback_index_util import FallbackIndex
+from util.vietnamese_tokenizer_util import VietnameseTokenizer
+from util.tracing_util import TracingUtil
+from util.io_util import map_blocking, run_blocking
+from util.graph_cache_util import CachedGraphStorage
+from util.metadata_index_util import MetadataIndex, find_metadata_index, restrict_chunks
+from util.fanout_util import FANOUT_MODE, format_context, load_fanout_config, merge_retrievals
+from util.metrics_util import MetricsUtil
+from util.context_assembly_util import approx_tokens, create_context_assembler
+from service.faq_service import FAQService
+from service.session_service import Session
+
+# Đổi khi prompt/cách lắp ráp ngữ cảnh đổi để bỏ các câu trả lời đã cache theo cách cũ
+GENERATION_CACHE_VERSION = "assembled-v1"
 
 
 class RAGService:
@@ -17,44 +39,61 @@ class RAGService:
     Đây là "bộ não" chính xử lý tất cả logic nghiệp vụ
     """
     
-    def __init__(self, data_path: str = "../../data/data.txt", data_path_json: str = "../../data/data.json"):
+    def __init__(self, data_path: str = "../../data/data.txt", data_path_json: str = "../../data/data.json",
+                 working_dir: str = "./rag_storage",
+                 rag_factory: Optional[Callable[[str], Awaitable[LightRAG]]] = None,
+                 snapshot_path: Optional[str] = None, faq_service: Optional[FAQService] = None):
         self.data_path = data_path           # Đường dẫn đến file dữ liệu text
         self.data_path_json = data_path_json # Đường dẫn đến file dữ liệu JSON
         self.data_files = [data_path, data_path_json]  # Danh sách tất cả files cần index
+        self.working_dir = working_dir       # Thư mục lưu trữ index riêng của corpus
+        self.rag_factory = rag_factory or initialize_rag  # Hàm tạo LightRAG (thay được khi test/benchmark)
         self.rag = None                      # Đối tượng RAG (ban đầu chưa có)
-        self.raw_text: Optional[str] = None  # Văn bản dự phòng nếu RAG lỗi
+        self.raw_text: Optional[str] = None  # Văn bản dự phòng nếu RAG lỗi (chỉ giữ tạm khi cần ainsert)
+        self.fallback_index: Optional[FallbackIndex] = None  # Chỉ mục nén cho tìm kiếm dự phòng
+        self._fallback_lock = asyncio.Lock()  # Mỗi lúc chỉ một lần dựng lại chỉ mục dự phòng
+        self._fallback_readers: int = 0       # Số truy vấn dự phòng đang dùng một chỉ mục (kể cả chỉ mục cũ)
+        self._retired_fallback: List[FallbackIndex] = []  # Chỉ mục đã bị thay, đóng khi không còn truy vấn dùng
+        self._fallback_metadata: Optional[Tuple[FallbackIndex, MetadataIndex]] = None  # Metadata đoạn văn dự phòng
         self.indexing_complete: bool = False # Trạng thái đánh chỉ mục
+        self.index_version: int = 0          # Phiên bản chỉ mục, tăng khi đánh chỉ mục lại/dữ liệu đổi (0 = chưa biết)
+        self.snapshot_path = snapshot_path   # Archive snapshot chỉ mục dựng sẵn (None = luôn đánh chỉ mục)
+        self.snapshot_manifest: Optional[dict] = None  # Manifest của snapshot đã nạp
+        self.faq_service = faq_service       # Trả lời ngay câu hỏi thường gặp (None = tắt)
+        # Chế độ "fanout": các chiến lược truy xuất chạy song song, mỗi chiến lược có thời hạn riêng
+        self.fanout_strategies, self.fanout_timeouts = load_fanout_config()
+        # Gộp chunk chồng lấn, bỏ đoạn gần trùng và giới hạn token của ngữ cảnh tự dựng (None = tắt)
+        self.context_assembler = create_context_assembler()
 
     async def initialize(self, force_reindex: bool = False):
         """
         Khởi tạo và đánh chỉ mục dữ liệu từ nhiều files không đồng bộ. 
-        Sử dụng hàm index_file với thử lại nhiều lần,
+        Đọc/parse files song song trong thread pool I/O, chèn vào RAG với thử lại nhiều lần,
         và dự phòng lưu văn bản thô nếu đánh chỉ mục thất bại.
         """
-        # Bước 1: Kiểm tra tất cả files dữ liệu có tồn tại không
-        missing_files = []
-        for file_path in self.data_files:
-            if not os.path.exists(file_path):
-                missing_files.append(file_path)
+        # Bước 1-2: Kiểm tra files tồn tại và không rỗng (stat chạy ngoài event loop)
+        missing_files, empty_files = await run_blocking(self._check_data_files)
         
         if missing_files:
             raise FileNotFoundError(f"Data files not found: {missing_files}")
-
-        # Bước 2: Kiểm tra files có rỗng không
-        empty_files = []
-        for file_path in self.data_files:
-            if os.path.getsize(file_path) == 0:
-                empty_files.append(file_path)
         
         if empty_files:
             raise ValueError(f"Data files are empty: {empty_files}")
 
         # Bước 3: Khởi tạo RAG nếu chưa có hoặc bắt buộc tạo lại
         if self.rag is None or force_reindex:
+            # Phiên bản trước đó phải đọc trước khi khôi phục snapshot (khôi phục thay cả working_dir)
+            previous_version = await run_blocking(read_index_version, self.working_dir)
+
+            # Ưu tiên nạp snapshot dựng sẵn thay vì đánh chỉ mục lại lúc khởi động
+            if not force_reindex and await self._load_snapshot():
+                await self._update_index_version(previous_version, force_reindex)
+                return self.rag
+
             print("Initializing RAG system...")
             # Thử khởi tạo hệ thống RAG
             try:
-                self.rag = await initialize_rag()
+                self.rag = await self.rag_factory(self.working_dir)
             except Exception as e:
                 print(f"initialize_rag failed: {e}")
                 # Giữ self.rag = None và tiếp tục chuẩn bị dự phòng
@@ -65,8 +104,11 @@ class RAGService:
             if self.rag is not None:
                 indexed_files = []
                 failed_files = []
+
+                # Đọc và parse mọi file song song trong thread pool, sau đó chèn tuần tự
+                documents = await map_blocking(read_data_file, self.data_files, return_exceptions=True)
                 
-                for file_path in self.data_files:
+                for file_path, document in zip(self.data_files, documents):
                     print(f"Indexing {file_path}...")
                     last_exc = None
                     
@@ -75,11 +117,10 @@ class RAGService:
                         try:
                             print(f"  Attempt {attempt}/3 for {os.path.basename(file_path)}...")
                             
-                            # Xử lý file theo định dạng
-                            if file_path.endswith('.json'):
-                                await self._index_json_file(self.rag, file_path)
-                            else:
-                                await index_file(self.rag, file_path)
+                            # File đọc lỗi thì mọi lần thử đều thất bại với cùng lỗi đó
+                            if isinstance(document, Exception):
+                                raise document
+                            await self.rag.ainsert(input=document, file_paths=[file_path])
                             
                             print(f"  ✅ Successfully indexed {os.path.basename(file_path)}")
                             indexed_files.append(file_path)
@@ -110,7 +151,7 @@ class RAGService:
                         print(f"  - {os.path.basename(file_path)}")
                     
                     # Chuẩn bị văn bản dự phòng từ tất cả files có thể đọc được
-                    self._prepare_fallback_text()
+                    await self._prepare_fallback_text()
 
                     # Thử chèn trực tiếp văn bản dự phòng
                     try:
@@ -121,109 +162,578 @@ class RAGService:
                     except Exception as e2:
                         print(f"Fallback ainsert also failed: {e2}. Will use local text search fallback.")
                         self.indexing_complete = False
+                    # Văn bản thô đã nằm trong chỉ mục dự phòng, không cần giữ chuỗi lớn
+                    self.raw_text = None
                 else:
                     # Tất cả files đều indexed thành công
                     self.indexing_complete = True
                     print("🎉 All files indexed successfully!")
+                    # Snapshot thiếu hoặc đã cũ: dựng lại cho lần khởi động sau
+                    await self._rebuild_snapshot()
             else:
                 # Không thể khởi tạo RAG; tải văn bản thô để tìm kiếm cục bộ
-                self._prepare_fallback_text()
+                # (giữ chỉ mục đã xây nếu dữ liệu không cần đánh chỉ mục lại)
+                if self.fallback_index is None or force_reindex:
+                    await self._prepare_fallback_text(only_if_missing=not force_reindex)
+                    self.raw_text = None
                 print("Loaded raw text from all files for local fallback search.")
                 self.indexing_complete = False
 
+            await self._update_index_version(previous_version, force_reindex)
+
         # Đánh dấu hoàn thành đánh chỉ mục nếu rag tồn tại và không có lỗi
         if self.rag is not None and self.indexing_complete is False:
             # Nếu rag tồn tại và chưa đặt indexing_complete, đặt True
             self.indexing_complete = True
         return self.rag
 
-    async def _index_json_file(self, rag: LightRAG, file_path: str) -> None:
+    async def _update_index_version(self, previous: dict, force: bool):
         """
-        Đánh chỉ mục file JSON bằng cách chuyển đổi thành text readable
-        
+        Cập nhật phiên bản chỉ mục sau khi khởi tạo: tăng khi bắt buộc đánh chỉ mục lại, khi dữ liệu
+        đổi so với lần trước (corpus hash) hoặc khi chưa có phiên bản. Không bao giờ giảm, kể cả khi
+        snapshot khôi phục mang phiên bản cũ hơn; lưu vào working_dir để giữ qua các lần khởi động.
+
         Args:
-            rag: LightRAG instance
-            file_path: Đường dẫn đến file JSON
+            previous: Phiên bản đã lưu trước khi khởi tạo (read_index_version)
+            force: initialize(force_reindex=True)
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-        
-            # Sử dụng ainsert để index text đã convert
-            await rag.ainsert(input=json_data, file_paths=[file_path])
-            
+            current = await run_blocking(read_index_version, self.working_dir)
+            corpus_hash = await run_blocking(compute_corpus_hash, self.data_files)
+            version = max(previous["version"], current["version"], self.index_version)
+            if force or version == 0 or corpus_hash != previous["corpus_hash"]:
+                version += 1
+            state = {"version": version, "corpus_hash": corpus_hash}
+            if state != current:
+                await run_blocking(write_index_version, self.working_dir, state)
         except Exception as e:
-            print(f"Error indexing JSON file {file_path}: {e}")
-            raise e
+            # Không ghi được (thư mục chỉ đọc): vẫn tăng trong bộ nhớ để ETag cũ không còn khớp
+            print(f"Failed to persist index version: {e}")
+            version = self.index_version + 1 if force or self.index_version == 0 else self.index_version
+        self.index_version = version
 
-    def _prepare_fallback_text(self):
+    def _check_data_files(self) -> Tuple[List[str], List[str]]:
+        """
+        Danh sách files không tồn tại và files rỗng (hàm đồng bộ, chạy trong thread pool I/O)
+        """
+        missing_files = [file_path for file_path in self.data_files if not os.path.exists(file_path)]
+        empty_files = [file_path for file_path in self.data_files
+                       if file_path not in missing_files and os.path.getsize(file_path) == 0]
+        return missing_files, empty_files
+
+    async def _prepare_fallback_text(self, only_if_missing: bool = False):
         """
         Chuẩn bị văn bản dự phòng từ tất cả files để tìm kiếm cục bộ
+        và xây chỉ mục nén (FallbackIndex) từ văn bản đó.
+        Đọc file và tách từ đều chạy trong thread pool I/O, không chặn event loop.
+        Chỉ mục cũ vẫn phục vụ truy vấn trong lúc dựng, được thay bằng chỉ mục mới rồi mới đóng.
+
+        Args:
+            only_if_missing: Bỏ qua nếu đã có chỉ mục (truy vấn khác vừa dựng xong trong lúc chờ lock)
         """
-        all_text = []
-        
-        for file_path in self.data_files:
+        async with self._fallback_lock:
+            if only_if_missing and self.fallback_index is not None:
+                return
+            self.raw_text = await build_fallback_text_async(self.data_files)
+
+            # Tách từ tiếng Việt được tính sẵn vào chỉ mục ngay khi tải dữ liệu
+            tokenizer = VietnameseTokenizer(
+                fold_accents=os.getenv("FALLBACK_FOLD_ACCENTS", "true").lower() == "true"
+            )
+            index = await run_blocking(FallbackIndex.from_text, self.raw_text, tokenizer) if self.raw_text else None
+            self._replace_fallback_index(index)
+
+    def _replace_fallback_index(self, index: Optional[FallbackIndex]):
+        """
+        Thay chỉ mục dự phòng; chỉ mục cũ được đóng ngay nếu không còn truy vấn nào đang dùng,
+        nếu không thì khi truy vấn cuối cùng kết thúc
+        """
+        previous, self.fallback_index = self.fallback_index, index
+        if previous is not None and previous is not index:
+            self._retired_fallback.append(previous)
+        if self._fallback_readers == 0:
+            self._close_retired_fallback()
+
+    def _close_retired_fallback(self):
+        for index in self._retired_fallback:
+            index.close()
+        self._retired_fallback = []
+
+    @contextmanager
+    def _use_fallback_index(self):
+        """
+        Lấy chỉ mục dự phòng hiện tại một lần và giữ nó mở trong suốt truy vấn (kể cả qua các await)
+        """
+        self._fallback_readers += 1
+        try:
+            yield self.fallback_index
+        finally:
+            self._fallback_readers -= 1
+            if self._fallback_readers == 0:
+                self._close_retired_fallback()
+
+    async def _load_snapshot(self) -> bool:
+        """
+        Khôi phục snapshot (nếu hợp lệ và khớp dữ liệu hiện tại) vào working_dir,
+        mở LightRAG trên đó và memory-map chỉ mục dự phòng đã lưu sẵn
+
+        Returns:
+            bool: True nếu đã nạp từ snapshot, False nếu cần đánh chỉ mục bình thường
+        """
+        if not self.snapshot_path:
+            return False
+
+        # Snapshot đã khôi phục trước đó (RAG lỗi lúc mở): chỉ thử mở lại LightRAG
+        manifest = self.snapshot_manifest
+        if manifest is None:
             try:
-                if file_path.endswith('.json'):
-                    # Xử lý file JSON
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        json_data = json.load(f)
-                    readable_text = self._convert_json_to_readable_text(json_data)
-                    all_text.append(f"=== Data từ {os.path.basename(file_path)} ===\n{readable_text}\n")
-                else:
-                    # Xử lý file text thường
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    all_text.append(f"=== Data từ {os.path.basename(file_path)} ===\n{content}\n")
-                    
+                manifest = await run_blocking(restore_snapshot, self.snapshot_path, self.working_dir, self.data_files)
             except Exception as e:
-                print(f"Failed to load {file_path} for fallback: {e}")
-        
-        self.raw_text = "\n\n".join(all_text) if all_text else None
+                print(f"Failed to restore snapshot {self.snapshot_path}: {e}")
+                return False
+            if manifest is None:
+                return False
 
-    async def get_answer(self, question: str, mode: str = "mix", top_k: int = 5, force_reindex: bool = False) -> str:
+            # Chỉ mục dự phòng được memory-map trực tiếp từ file, không cần xây lại
+            fallback_dir = os.path.join(self.working_dir, FALLBACK_INDEX_DIR)
+            if os.path.isdir(fallback_dir):
+                self._replace_fallback_index(await run_blocking(FallbackIndex.load, fallback_dir))
+
+        try:
+            self.rag = await self.rag_factory(self.working_dir)
+        except Exception as e:
+            print(f"initialize_rag failed on snapshot: {e}")
+            self.rag = None
+
+        # Đồ thị của snapshot phải có trong Neo4j trước khi bỏ qua đánh chỉ mục
+        if self.rag is not None and not await self._ensure_snapshot_graph(manifest):
+            await self._discard_snapshot()
+            return False
+
+        self.snapshot_manifest = manifest
+        self.indexing_complete = self.rag is not None
+        print(f"Loaded index snapshot {self.snapshot_path} (built {manifest.get('created_at')})")
+        return True
+
+    async def _ensure_snapshot_graph(self, manifest: dict) -> bool:
         """
-        Xử lý câu hỏi và trả về câu trả lời
-        Đây là hàm chính để trả lời câu hỏi của người dùng
+        Đảm bảo graph storage (Neo4j) chứa đúng đồ thị của snapshot: số node khác manifest
+        (Neo4j mới, trống hoặc còn đồ thị cũ) thì xóa đồ thị của workspace và nạp lại từ snapshot
+
+        Returns:
+            bool: False nếu không nạp được (cần đánh chỉ mục lại)
         """
-        # Bước 1: Thử khởi tạo RAG (có thể đặt self.raw_text nếu dùng dự phòng)
+        graph = getattr(self.rag, "chunk_entity_relation_graph", None)
+        if graph is None:
+            return True
+        expected = manifest.get("graph") or {}
         try:
-            await self.initialize(force_reindex=force_reindex)
+            if len(await graph.get_all_labels()) == expected.get("nodes"):
+                return True
+            print(f"Loading snapshot graph into graph storage ({expected.get('nodes')} nodes)...")
+            await graph.drop()
+            await import_graph(graph, self.working_dir)
+            return len(await graph.get_all_labels()) == expected.get("nodes")
         except Exception as e:
-            print(f"RAG initialization failed in get_answer: {e}")
+            print(f"Failed to load snapshot graph: {e}")
+            return False
 
-        # Bước 2: Nếu RAG có sẵn, thử sử dụng nó
+    async def _discard_snapshot(self):
+        """
+        Bỏ snapshot đã khôi phục nhưng không dùng được: đóng LightRAG và xóa nội dung working_dir
+        (doc_status của snapshot đánh dấu mọi tài liệu đã xử lý, giữ lại thì ingestion bị bỏ qua)
+        """
+        try:
+            await self.rag.finalize_storages()
+        except Exception as e:
+            print(f"Failed to close RAG storages: {e}")
+        self.rag = None
+        self.snapshot_manifest = None
+        # Chỉ mục dự phòng đang memory-map từ working_dir
+        self._replace_fallback_index(None)
+        await run_blocking(clear_directory, self.working_dir)
+
+    async def _rebuild_snapshot(self):
+        """
+        Lưu chỉ mục hiện tại thành snapshot mới (khi snapshot thiếu hoặc đã cũ).
+        Ghi file và nén archive chạy trong thread pool I/O.
+        Lỗi chỉ được ghi log (ví dụ thư mục snapshot chỉ đọc)
+        """
+        if not self.snapshot_path:
+            return
+        try:
+            if self.fallback_index is None:
+                await self._prepare_fallback_text()
+                self.raw_text = None
+            with self._use_fallback_index() as fallback_index:
+                if fallback_index is not None:
+                    await run_blocking(fallback_index.save, os.path.join(self.working_dir, FALLBACK_INDEX_DIR))
+            # Đồ thị nằm trong Neo4j, ngoài working_dir: xuất ra file để đóng gói cùng snapshot
+            await export_graph(self.rag.chunk_entity_relation_graph, self.working_dir)
+            self.snapshot_manifest = await run_blocking(
+                write_snapshot, self.working_dir, self.data_files, self.snapshot_path
+            )
+        except Exception as e:
+            print(f"Failed to rebuild snapshot {self.snapshot_path}: {e}")
+
+    async def _fallback_candidates(self, index: FallbackIndex, filters: dict):
+        """
+        Id các đoạn văn của `index` khớp bộ lọc metadata (chỉ mục metadata dựng một lần cho mỗi FallbackIndex)
+        """
+        if self._fallback_metadata is None or self._fallback_metadata[0] is not index:
+            metadata = await run_blocking(MetadataIndex.from_paragraphs, index.paragraphs())
+            self._fallback_metadata = (index, metadata)
+        return self._fallback_metadata[1].candidates(**filters)
+
+    async def _extract_keywords(self, question: str, query_param: QueryParam) -> Tuple[List[str], List[str]]:
+        """
+        Trích từ khóa (high-level, low-level) một lần cho mọi chiến lược của fan-out
+        """
+        return await get_keywords_from_query(
+            question, query_param, self.rag._build_global_config(), self.rag.llm_response_cache
+        )
+
+    async def _retrieve(self, strategy: str, question: str, top_k: int, keywords_task: Optional[asyncio.Task]) -> dict:
+        """
+        Chạy truy xuất (không sinh câu trả lời) của một chiến lược
+        """
+        query_param = QueryParam(mode=strategy, top_k=top_k, enable_rerank=False)
+        if strategy != "naive" and keywords_task is not None:
+            # shield: chiến lược hết hạn không hủy task từ khóa dùng chung
+            query_param.hl_keywords, query_param.ll_keywords = await asyncio.shield(keywords_task)
+        with TracingUtil.span("fanout.retrieve", strategy=strategy):
+            result = await self.rag.aquery_data(question, param=query_param)
+        if result.get("status") == "failure":
+            raise RuntimeError(result.get("message"))
+        return result
+
+    async def _fanout_retrieve(self, question: str, top_k: int) -> List[dict]:
+        """
+        Chạy song song các chiến lược truy xuất (self.fanout_strategies); chiến lược quá thời hạn
+        riêng (self.fanout_timeouts) hoặc lỗi bị bỏ qua
+
+        Returns:
+            Kết quả aquery_data của các chiến lược hoàn thành, theo thứ tự chiến lược
+        """
+        strategies = self.fanout_strategies
+        # Bước 1: Trích từ khóa một lần (song song với chiến lược naive, vốn không cần từ khóa)
+        keywords_task = None
+        if any(strategy != "naive" for strategy in strategies):
+            keywords_task = asyncio.create_task(
+                self._extract_keywords(question, QueryParam(mode="mix", top_k=top_k))
+            )
+
+        # Bước 2: Truy xuất song song, mỗi chiến lược bị cắt ở thời hạn của nó
+        started = time.perf_counter()
+
+        async def run(strategy: str):
+            try:
+                return await asyncio.wait_for(self._retrieve(strategy, question, top_k, keywords_task),
+                                              timeout=self.fanout_timeouts.get(strategy))
+            except asyncio.TimeoutError:
+                MetricsUtil.increment(f"fanout_strategy_timeouts_total{{strategy={strategy}}}")
+                print(f"Fan-out strategy {strategy} missed its deadline, dropped")
+            except Exception as e:
+                MetricsUtil.increment(f"fanout_strategy_errors_total{{strategy={strategy}}}")
+                print(f"Fan-out strategy {strategy} failed: {e}")
+            return None
+
+        try:
+            results = await asyncio.gather(*(run(strategy) for strategy in strategies))
+        finally:
+            if keywords_task is not None and not keywords_task.done():
+                keywords_task.cancel()
+        MetricsUtil.observe("fanout_retrieval_seconds", time.perf_counter() - started)
+        completed = [result for result in results if result is not None]
+        MetricsUtil.observe("fanout_strategies_completed", len(completed))
+        return completed
+
+    async def _fanout_query(self, question: str, top_k: int, user_prompt: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Chế độ fan-out: truy xuất song song (xem _fanout_retrieve), gộp và khử trùng lặp ngữ cảnh
+        rồi gọi LLM đúng một lần. Độ trễ bị chặn bởi thời hạn lớn nhất thay vì tổng các chiến lược.
+
+        Returns:
+            (câu trả lời, nguồn): nguồn là "degraded" nếu có chiến lược hết hạn/lỗi (câu trả lời trên
+            ngữ cảnh thiếu, không được cache), "no-data" nếu không có ngữ cảnh, ngược lại "rag"
+        """
+        # Bước 1: Truy xuất song song
+        completed = await self._fanout_retrieve(question, top_k)
+        degraded = len(completed) < len(self.fanout_strategies)
+
+        # Bước 2: Gộp ngữ cảnh, khử trùng lặp, xếp vào ngân sách token
+        context = format_context(await self._assemble_context(merge_retrievals(completed)))
+        if not context:
+            return PROMPTS["fail_response"], "degraded" if degraded else "no-data"
+
+        # Bước 3: Một lần gọi LLM duy nhất trên ngữ cảnh đã gộp
+        answer = await self._generate_from_context(question, context, user_prompt,
+                                                   cache_mode=None if degraded else FANOUT_MODE)
+        return answer, "degraded" if degraded else "rag"
+
+    def _count_tokens(self, text: str) -> int:
+        tokenizer = getattr(self.rag, "tokenizer", None)
+        return len(tokenizer.encode(text)) if tokenizer is not None else approx_tokens(text)
+
+    async def _assemble_context(self, merged: dict) -> dict:
+        """
+        Lắp ráp phần chunk của ngữ cảnh đã gộp (xem ContextAssembler, chạy ngoài event loop)
+        và ghi nhận số token tiết kiệm được
+        """
+        if self.context_assembler is None or not merged["chunks"]:
+            return merged
+        with TracingUtil.span("context.assemble") as span:
+            chunks, stats = await run_blocking(self.context_assembler.assemble, merged["chunks"], self._count_tokens)
+            for key, value in stats.items():
+                span.set_attribute(key, value)
+        MetricsUtil.observe("context_tokens", stats["tokens_after"])
+        MetricsUtil.increment("context_tokens_saved_total", stats["tokens_before"] - stats["tokens_after"])
+        return {**merged, "chunks": chunks}
+
+    async def _generate_from_context(self, question: str, context: str, user_prompt: Optional[str] = None,
+                                     response_type: str = "Multiple Paragraphs",
+                                     history_messages: Optional[List[dict]] = None,
+                                     cache_mode: Optional[str] = None) -> str:
+        """
+        Sinh câu trả lời từ ngữ cảnh đã dựng sẵn bằng prompt rag_response của LightRAG
+
+        Args:
+            cache_mode: Chế độ truy vấn; nếu có (và không có lịch sử hội thoại) câu trả lời được cache trong
+                        llm_response_cache của LightRAG theo câu hỏi và prompt chứa ngữ cảnh đã lắp ráp,
+                        nên ngữ cảnh đổi (dữ liệu mới, bộ lọc khác) thì không dùng lại câu trả lời cũ
+        """
+        system_prompt = PROMPTS["rag_response"].format(
+            response_type=response_type, user_prompt=user_prompt or "n/a", context_data=context
+        )
+        cache = getattr(self.rag, "llm_response_cache", None) if cache_mode and not history_messages else None
+        args_hash = compute_args_hash(GENERATION_CACHE_VERSION, cache_mode, question, system_prompt)
+        cached = await handle_cache(cache, args_hash, question, cache_mode, cache_type="query")
+        if cached is not None:
+            MetricsUtil.increment("generation_cache_hits_total")
+            return cached[0]
+
+        kwargs = {"history_messages": history_messages} if history_messages else {}
+        with TracingUtil.span("fanout.generate", context_chars=len(context)):
+            answer = await self.rag.llm_model_func(question, system_prompt=system_prompt, **kwargs)
+        if cache is not None and cache.global_config.get("enable_llm_cache") and isinstance(answer, str):
+            await save_to_cache(cache, CacheData(args_hash=args_hash, content=answer, prompt=question,
+                                                 mode=cache_mode, cache_type="query"))
+        return answer
+
+    async def _assembled_query(self, question: str, mode: str, top_k: int,
+                               user_prompt: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Các chế độ chuẩn của LightRAG (mix, local, global, hybrid, naive) khi bật ContextAssembler:
+        truy xuất bằng aquery_data, lắp ráp chunk (nối đoạn chồng lấn, bỏ trùng lặp, ngân sách token)
+        rồi sinh câu trả lời trên ngữ cảnh đã lắp ráp (có cache, xem _generate_from_context)
+
+        Returns:
+            (câu trả lời, nguồn): "no-data" nếu không có ngữ cảnh, ngược lại "rag"
+        """
+        # Bước 1: Truy xuất (LightRAG tự trích và cache từ khóa)
+        result = await self._retrieve(mode, question, top_k, None)
+
+        # Bước 2: Lắp ráp ngữ cảnh
+        context = format_context(await self._assemble_context(merge_retrievals([result])))
+        if not context:
+            return PROMPTS["fail_response"], "no-data"
+
+        # Bước 3: Sinh câu trả lời
+        return await self._generate_from_context(question, context, user_prompt, cache_mode=mode), "rag"
+
+    async def _session_query(self, question: str, mode: str, top_k: int, session: Session,
+                             user_prompt: Optional[str] = None) -> str:
+        """
+        Truy vấn trong một phiên hội thoại: nếu ngữ cảnh đã cache của phiên đã chứa đủ từ nội dung
+        của câu hỏi thì dùng lại (không truy xuất), ngược lại truy xuất rồi mở rộng ngữ cảnh của phiên.
+        Câu trả lời sinh từ ngữ cảnh của phiên kèm tóm tắt và các lượt gần nhất.
+        """
+        strategies = self.fanout_strategies if mode == FANOUT_MODE else [mode]
+
+        # Bước 1: Dùng lại hoặc mở rộng ngữ cảnh của phiên
+        with TracingUtil.span("session.context", session_id=session.session_id) as span:
+            if session.covers(question):
+                session.reuses += 1
+                MetricsUtil.increment("session_retrievals_saved_total", len(strategies))
+                span.set_attribute("reused", True)
+            else:
+                retrieval_query = session.retrieval_query(question)
+                if mode == FANOUT_MODE:
+                    results = await self._fanout_retrieve(retrieval_query, top_k)
+                else:
+                    results = [await self._retrieve(mode, retrieval_query, top_k, None)]
+                session.retrievals += 1
+                MetricsUtil.increment("session_retrievals_total", len(strategies))
+                session.remember(merge_retrievals(results))
+                span.set_attribute("reused", False)
+
+        # Bước 2: Sinh câu trả lời trên ngữ cảnh của phiên (mới nhất đứng đầu)
+        context = format_context(await self._assemble_context(session.context))
+        if not context:
+            return PROMPTS["fail_response"]
+        return await self._generate_from_context(question, context, user_prompt,
+                                                 history_messages=session.history_messages())
+
+    @staticmethod
+    def _rag_source(answer: str) -> str:
+        """
+        Nguồn của câu trả lời RAG: LightRAG trả fail_response khi không tìm được ngữ cảnh
+        """
+        return "no-data" if answer == PROMPTS["fail_response"] else "rag"
+
+    async def get_answer(self, question: str, mode: str = "mix", top_k: int = 5, force_reindex: bool = False,
+                         filters: Optional[dict] = None, session: Optional[Session] = None) -> str:
+        """
+        Xử lý câu hỏi và trả về câu trả lời
+        Đây là hàm chính để trả lời câu hỏi của người dùng
+        """
+        answer, _ = await self.get_answer_with_source(question, mode, top_k, force_reindex, filters, session)
+        return answer
+
+    async def get_answer_with_source(self, question: str, mode: str = "mix", top_k: int = 5,
+                                     force_reindex: bool = False,
+                                     filters: Optional[dict] = None,
+                                     session: Optional[Session] = None) -> Tuple[str, str]:
+        """
+        Giống get_answer nhưng cho biết câu trả lời đến từ đâu
+
+        Args:
+            filters: Bộ lọc metadata (source_file, section, date_from, date_to); chỉ các chunk khớp
+                     được chấm điểm và đưa vào ngữ cảnh
+            session: Phiên hội thoại (tùy chọn); câu hỏi nối tiếp dùng lại ngữ cảnh đã truy xuất của phiên
+
+        Returns:
+            (câu trả lời, nguồn): nguồn là "faq", "rag", "degraded" (fan-out thiếu chiến lược),
+            "fallback" hoặc "no-data" (không có dữ liệu/ngữ cảnh cho câu hỏi)
+
+        mode = "fanout" chạy song song các chiến lược truy xuất rồi gọi LLM một lần (xem _fanout_query)
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value is not None}
+
+        # Bước 1: Câu hỏi thường gặp được trả lời ngay, không cần RAG/LLM (trừ khi câu hỏi có bộ lọc)
+        if self.faq_service is not None and not force_reindex and not filters:
+            with TracingUtil.span("faq.match") as span:
+                match = self.faq_service.match(question)
+                if match is not None:
+                    span.set_attribute("faq_id", match["id"])
+                    return match["answer"], "faq"
+
+        # Bước 2: Thử khởi tạo RAG (có thể đặt self.raw_text nếu dùng dự phòng)
+        with TracingUtil.span("rag.initialize", force_reindex=force_reindex):
+            try:
+                await self.initialize(force_reindex=force_reindex)
+            except Exception as e:
+                print(f"RAG initialization failed in get_answer: {e}")
+
+        # Bước 3: Nếu RAG có sẵn, thử sử dụng nó
         if self.rag is not None:
             query_param = QueryParam(
-                mode=mode,              # Chế độ tìm kiếm
+                mode=mode if mode != FANOUT_MODE else "mix",  # Chế độ tìm kiếm
                 top_k=top_k,           # Số kết quả tối đa
                 enable_rerank=False    # Không sắp xếp lại kết quả
             )
-            try:
-                return await self.rag.aquery(question, param=query_param)
-            except Exception as e:
-                print(f"RAG query failed: {e}")
+            candidates = None
+            metadata_index = find_metadata_index(self.rag)
+            if filters and metadata_index is not None and len(metadata_index):
+                candidates = metadata_index.candidates(**filters)
+                if not candidates:
+                    return "Sorry, I'm not able to provide an answer to that question.[no-context]", "no-data"
+                # Bộ lọc nằm trong prompt nên cache câu trả lời của LightRAG không trộn truy vấn lọc/không lọc
+                query_param.user_prompt = "Chỉ dựa trên dữ liệu thuộc bộ lọc " + ", ".join(
+                    f"{key}={value}" for key, value in sorted(filters.items()))
+            elif filters:
+                print("Metadata index is empty (index built before metadata indexing?), ignoring filters for RAG")
+            with TracingUtil.span("rag.query", mode=mode, top_k=top_k) as span:
+                if candidates is not None:
+                    span.set_attribute("candidates", len(candidates))
+                try:
+                    with restrict_chunks(candidates):
+                        if session is not None:
+                            # Ngữ cảnh đã cache gắn với phiên bản chỉ mục: đánh chỉ mục lại thì truy xuất lại
+                            session.use_context((self.working_dir, self.index_version,
+                                                 tuple(sorted(filters.items()))))
+                            answer = await self._session_query(question, mode, top_k, session,
+                                                               query_param.user_prompt)
+                            return answer, self._rag_source(answer)
+                        if mode == FANOUT_MODE:
+                            return await self._fanout_query(question, top_k, query_param.user_prompt)
+                        if self.context_assembler is not None:
+                            return await self._assembled_query(question, mode, top_k, query_param.user_prompt)
+                        answer = await self.rag.aquery(question, param=query_param)
+                        return answer, self._rag_source(answer)
+                except Exception as e:
+                    print(f"RAG query failed: {e}")
+                    span.status = "ERROR"
+                    span.set_attribute("error", str(e))
 
-        # Bước 3: Dự phòng: tìm kiếm cục bộ trên văn bản thô
+        # Bước 4: Dự phòng: tìm kiếm cục bộ trên chỉ mục nén
         print("Using local fallback search...")
-        if not self.raw_text:
-            self._prepare_fallback_text()
-            if not self.raw_text:
-                return "Sorry, I'm not able to provide an answer to that question.[no-data]"
+        with TracingUtil.span("fallback.search", top_k=top_k):
+            if self.fallback_index is None:
+                await self._prepare_fallback_text(only_if_missing=True)
+                self.raw_text = None
+            # Chỉ mục có thể được dựng lại trong lúc chờ: dùng đúng một chỉ mục cho cả lọc và tìm kiếm
+            with self._use_fallback_index() as fallback_index:
+                if fallback_index is None:
+                    return "Sorry, I'm not able to provide an answer to that question.[no-data]", "no-data"
+                candidates = await self._fallback_candidates(fallback_index, filters) if filters else None
+                return fallback_index.local_search(question, top_k, candidates), "fallback"
 
-        # Sử dụng utility class để tìm kiếm
-        text_search = TextSearchUtil()
-        return text_search.local_search(self.raw_text, question, top_k)
+    async def close(self):
+        """
+        Giải phóng tài nguyên của RAG (kết nối storage, dữ liệu trong bộ nhớ)
+        Dùng khi corpus bị loại khỏi bộ nhớ; lần truy vấn sau sẽ tải lại
+        """
+        if self.rag is not None and hasattr(self.rag, "finalize_storages"):
+            try:
+                await self.rag.finalize_storages()
+            except Exception as e:
+                print(f"Failed to finalize storages for {self.working_dir}: {e}")
+        self.rag = None
+        self.raw_text = None
+        self._replace_fallback_index(None)
+        self._fallback_metadata = None
+        self.snapshot_manifest = None
+        self.indexing_complete = False
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Ước lượng bộ nhớ corpus đang chiếm: kích thước các file index trong working_dir
+        (được nạp vào bộ nhớ khi khởi tạo storage) cộng với chỉ mục dự phòng
+        """
+        total = 0
+        if self.rag is not None and os.path.isdir(self.working_dir):
+            for root, _, files in os.walk(self.working_dir):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+        if self.raw_text:
+            total += len(self.raw_text.encode('utf-8'))
+        if self.fallback_index is not None:
+            total += self.fallback_index.memory_bytes()
+        return total
 
     def get_status(self) -> dict:
         """
         Lấy trạng thái hiện tại của hệ thống RAG
         """
+        graph = getattr(self.rag, "chunk_entity_relation_graph", None)
+        metadata_index = find_metadata_index(self.rag)
         return {
             "rag_initialized": self.rag is not None,
             "indexing_complete": self.indexing_complete,
+            "index_version": self.index_version,
             "data_files": self.data_files,
             "data_files_count": len(self.data_files),
             "data_path": self.data_path,  # Backward compatibility
-            "has_fallback_text": self.raw_text is not None
+            "working_dir": self.working_dir,
+            "has_fallback_text": self.fallback_index is not None,
+            "fallback_paragraphs": self.fallback_index.num_paragraphs if self.fallback_index else 0,
+            "snapshot_path": self.snapshot_path,
+            "snapshot_created_at": self.snapshot_manifest.get("created_at") if self.snapshot_manifest else None,
+            "graph_cache": graph.get_status() if isinstance(graph, CachedGraphStorage) else None,
+            "faq": self.faq_service.get_status() if self.faq_service is not None else None,
+            "metadata_index": metadata_index.summary() if metadata_index is not None else None
         }
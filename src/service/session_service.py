@@ -0,0 +1,229 @@
+"""
+Service Layer - Phiên hội thoại nhiều lượt phía server
+Mỗi phiên giữ tóm tắt hội thoại đã nén, vài lượt gần nhất và ngữ cảnh vừa truy xuất;
+câu hỏi nối tiếp dùng lại hoặc mở rộng ngữ cảnh đó thay vì truy xuất lại từ đầu
+"""
+
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from util.fanout_util import MERGE_KEYS
+from util.metrics_util import MetricsUtil
+from util.vietnamese_tokenizer_util import VietnameseTokenizer
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    """
+    Câu đầu của câu trả lời (bỏ xuống dòng), cắt ở `max_chars` ký tự
+    """
+    text = " ".join(text.split())
+    match = re.match(r".+?[.!?](\s|$)", text)
+    sentence = match.group(0).strip() if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1] + "…"
+
+
+class Session:
+    """
+    Trạng thái một phiên: tóm tắt các lượt cũ, `max_turns` lượt gần nhất nguyên văn và ngữ cảnh
+    truy xuất gần nhất (entity, quan hệ, chunk; mới nhất đứng đầu, mỗi loại tối đa `max_items`)
+    """
+
+    # Từ hỏi/đại từ của câu nối tiếp ("ông ấy ... năm nào?") không cần có trong ngữ cảnh
+    FOLLOW_UP_WORDS = frozenset({
+        "ai", "gì", "nào", "đâu", "bao", "nhiêu", "mấy", "ấy", "ông", "bà", "anh", "chị", "họ", "nó",
+        "sau", "trước", "thêm", "nữa", "kể", "nói", "tiếp",
+    })
+    MAX_TURN_CHARS = 2000      # Câu trả lời dài hơn được cắt khi giữ nguyên văn
+    SUMMARY_LINE_CHARS = 200   # Mỗi lượt cũ nén thành một dòng tóm tắt tối đa chừng này ký tự
+
+    _tokenizer = VietnameseTokenizer(fold_accents=False, bigrams=False)
+
+    def __init__(self, session_id: str, corpus_id: str, max_turns: int = 4, max_summary_chars: int = 1500,
+                 max_items: int = 20, reuse_min_coverage: float = 0.6):
+        self.session_id = session_id
+        self.corpus_id = corpus_id
+        self.max_turns = max_turns
+        self.max_summary_chars = max_summary_chars
+        self.max_items = max_items
+        self.reuse_min_coverage = reuse_min_coverage
+        self.summary: List[str] = []          # Các lượt cũ đã nén, mỗi lượt một dòng
+        self.turns: List[Dict[str, str]] = [] # Các lượt gần nhất nguyên văn
+        self.context = {field: [] for field in MERGE_KEYS}
+        self.context_key: Optional[tuple] = None
+        self._context_terms: Optional[set] = None
+        self.retrievals = 0
+        self.reuses = 0
+        self.created_at = self.last_used = time.time()
+
+    def has_context(self) -> bool:
+        return any(self.context.values())
+
+    def use_context(self, key: tuple):
+        """
+        Ngữ cảnh đã cache chỉ dùng được cho cùng corpus/phiên bản chỉ mục/bộ lọc; đổi thì bỏ ngữ cảnh cũ
+        """
+        if key != self.context_key:
+            self.context = {field: [] for field in MERGE_KEYS}
+            self._context_terms = None
+            self.context_key = key
+
+    def _terms(self) -> set:
+        if self._context_terms is None:
+            texts = [entity.get("entity_name") or "" for entity in self.context["entities"]]
+            texts += [chunk.get("content") or "" for chunk in self.context["chunks"]]
+            texts += [relation.get("description") or "" for relation in self.context["relationships"]]
+            self._context_terms = set(self._tokenizer.terms("\n".join(texts)))
+        return self._context_terms
+
+    def coverage(self, question: str) -> float:
+        """
+        Tỉ lệ từ nội dung của câu hỏi đã có trong ngữ cảnh đã cache (0 nếu chưa có ngữ cảnh)
+        """
+        if not self.has_context():
+            return 0.0
+        terms = {term for term in self._tokenizer.terms(question) if term not in self.FOLLOW_UP_WORDS}
+        if not terms:
+            return 1.0
+        return len(terms & self._terms()) / len(terms)
+
+    def covers(self, question: str) -> bool:
+        return self.coverage(question) >= self.reuse_min_coverage
+
+    def retrieval_query(self, question: str) -> str:
+        """
+        Câu truy xuất cho câu hỏi nối tiếp: ghép câu hỏi trước để giữ chủ thể ("ông ấy", "trận đó")
+        """
+        if not self.turns:
+            return question
+        return f"{self.turns[-1]['question']}\n{question}"
+
+    def remember(self, data: dict):
+        """
+        Mở rộng ngữ cảnh bằng dữ liệu vừa truy xuất (đứng trước ngữ cảnh cũ), khử trùng lặp và cắt theo giới hạn
+        """
+        for field, key in MERGE_KEYS.items():
+            merged, seen = [], set()
+            for item in (data.get(field) or []) + self.context[field]:
+                item_key = key(item)
+                if item_key not in seen:
+                    seen.add(item_key)
+                    merged.append(item)
+            self.context[field] = merged[:self.max_items]
+        self._context_terms = None
+
+    def add_turn(self, question: str, answer: str):
+        """
+        Thêm một lượt; lượt cũ vượt `max_turns` được nén thành một dòng tóm tắt,
+        tóm tắt vượt `max_summary_chars` thì bỏ dòng cũ nhất
+        """
+        self.turns.append({"question": question, "answer": answer[:self.MAX_TURN_CHARS]})
+        while len(self.turns) > self.max_turns:
+            turn = self.turns.pop(0)
+            self.summary.append(f"- Hỏi: {_first_sentence(turn['question'], self.SUMMARY_LINE_CHARS)} "
+                                f"→ Đáp: {_first_sentence(turn['answer'], self.SUMMARY_LINE_CHARS)}")
+        while self.summary and sum(len(line) + 1 for line in self.summary) > self.max_summary_chars:
+            self.summary.pop(0)
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """
+        Lịch sử hội thoại gửi kèm lời gọi LLM: tóm tắt (nếu có) rồi các lượt gần nhất
+        """
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": "Tóm tắt hội thoại trước:\n" + "\n".join(self.summary)})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+    def get_status(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "corpus_id": self.corpus_id,
+            "turns": len(self.turns) + len(self.summary),
+            "context_items": {field: len(items) for field, items in self.context.items()},
+            "retrievals": self.retrievals,
+            "reuses": self.reuses,
+        }
+
+
+class SessionService:
+    """
+    Kho phiên trong bộ nhớ: tối đa `max_sessions` phiên (LRU), phiên không dùng quá `ttl` giây bị loại.
+    Phiên xếp theo lần dùng cuối nên phiên hết hạn luôn nằm đầu OrderedDict: loại bỏ O(số phiên hết hạn).
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 1800.0, max_turns: int = 4,
+                 max_summary_chars: int = 1500, max_items: int = 20, reuse_min_coverage: float = 0.6):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.session_options = {
+            "max_turns": max_turns,
+            "max_summary_chars": max_summary_chars,
+            "max_items": max_items,
+            "reuse_min_coverage": reuse_min_coverage,
+        }
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evictions = {"ttl": 0, "capacity": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, reason: str):
+        self._sessions.popitem(last=False)
+        self.evictions[reason] += 1
+        MetricsUtil.increment(f"session_evictions_total{{reason={reason}}}")
+
+    def evict_expired(self, now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        while self._sessions and now - next(iter(self._sessions.values())).last_used > self.ttl:
+            self._evict("ttl")
+        MetricsUtil.set_gauge("sessions_active", len(self._sessions))
+
+    def get(self, session_id: str, corpus_id: str) -> Session:
+        """
+        Lấy phiên (tạo mới nếu chưa có hoặc đã hết hạn) và đánh dấu vừa dùng
+
+        Args:
+            session_id: Mã phiên do client gửi
+            corpus_id: Corpus của truy vấn; phiên đổi corpus thì bắt đầu lại
+        """
+        now = time.time()
+        self.evict_expired(now)
+        session = self._sessions.get(session_id)
+        if session is None or session.corpus_id != corpus_id:
+            session = Session(session_id, corpus_id, **self.session_options)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._evict("capacity")
+            MetricsUtil.set_gauge("sessions_active", len(self._sessions))
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get_status(self) -> dict:
+        return {
+            "active": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "evictions": dict(self.evictions),
+            "retrievals": MetricsUtil.get_counter("session_retrievals_total"),
+            "retrievals_saved": MetricsUtil.get_counter("session_retrievals_saved_total"),
+        }
+
+
+def create_session_service() -> SessionService:
+    """
+    Tạo SessionService từ biến môi trường
+    """
+    return SessionService(
+        max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+        ttl=float(os.getenv("SESSION_TTL", "1800")),
+        max_turns=int(os.getenv("SESSION_MAX_TURNS", "4")),
+        max_summary_chars=int(os.getenv("SESSION_SUMMARY_CHARS", "1500")),
+        max_items=int(os.getenv("SESSION_MAX_CONTEXT_ITEMS", "20")),
+        reuse_min_coverage=float(os.getenv("SESSION_REUSE_MIN_COVERAGE", "0.6")),
+    )
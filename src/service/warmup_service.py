@@ -0,0 +1,95 @@
+"""
+Service Layer - Làm nóng cache sau khi khởi động
+Chạy lại các câu hỏi phổ biến nhất trong lịch sử qua RAGService.get_answer (chạy nền, giới hạn tốc độ)
+để cache câu trả lời LLM và cache truy xuất đã có dữ liệu trước khi lưu lượng thật tăng lên
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from service.corpus_service import CorpusService
+from util.metrics_util import MetricsUtil
+from util.query_log_util import QueryFrequencyLog
+
+
+class WarmupService:
+    """
+    Tác vụ nền làm nóng cache từ QueryFrequencyLog.
+    Lời gọi LLM của warm-up giữ mức ưu tiên background nên không chặn truy vấn thật.
+    """
+
+    def __init__(self, corpus_service: CorpusService, query_log: QueryFrequencyLog,
+                 top_n: int = 20, rate_per_second: float = 1.0):
+        self.corpus_service = corpus_service
+        self.query_log = query_log
+        self.top_n = top_n
+        self.rate_per_second = rate_per_second
+        self.state = "disabled" if top_n <= 0 else "idle"
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> Optional[asyncio.Task]:
+        """
+        Bắt đầu warm-up nền (không chờ); bỏ qua nếu bị tắt hoặc đang chạy
+        """
+        if self.top_n <= 0 or (self._task is not None and not self._task.done()):
+            return self._task
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def run(self):
+        """
+        Chạy lại top-N câu hỏi, cách nhau 1/rate_per_second giây
+        """
+        entries = self.query_log.top(self.top_n)
+        self.state = "running"
+        self.total, self.completed, self.failed = len(entries), 0, 0
+        self.started_at, self.finished_at = time.time(), None
+        print(f"Cache warm-up: replaying {len(entries)} frequent questions")
+
+        interval = 1.0 / self.rate_per_second if self.rate_per_second > 0 else 0.0
+        try:
+            for entry in entries:
+                started = time.perf_counter()
+                try:
+                    async with self.corpus_service.use(entry["corpus_id"]) as rag_service:
+                        await rag_service.get_answer(entry["question"], mode=entry["mode"], top_k=entry["top_k"])
+                    self.completed += 1
+                    MetricsUtil.increment("warmup_queries_total")
+                except Exception as e:
+                    self.failed += 1
+                    MetricsUtil.increment("warmup_failures_total")
+                    print(f"Cache warm-up failed for '{entry['question'][:50]}': {e}")
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        finally:
+            self.finished_at = time.time()
+            print(f"Cache warm-up {self.state}: {self.completed}/{self.total} questions "
+                  f"({self.failed} failed)")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def get_status(self) -> dict:
+        return {
+            "state": self.state,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "progress": round(self.completed / self.total, 3) if self.total else None,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
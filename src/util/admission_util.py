@@ -0,0 +1,161 @@
+"""
+Utility Layer - Kiểm soát lưu lượng (admission control) cho các truy vấn
+Giới hạn số truy vấn chạy đồng thời và hàng đợi có giới hạn kèm timeout
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque
+
+from util.metrics_util import MetricsUtil
+
+
+class AdmissionRejectedError(Exception):
+    """
+    Lỗi khi một yêu cầu bị từ chối vì hệ thống đang quá tải
+    """
+
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason                # queue_full | queue_timeout
+        self.status_code = status_code      # 429 hoặc 503
+        self.retry_after = retry_after      # Số giây client nên chờ trước khi thử lại
+
+
+class AdmissionLimiter:
+    """
+    Bộ giới hạn truy vấn: tối đa `max_in_flight` truy vấn chạy cùng lúc,
+    tối đa `max_queue` truy vấn chờ (FIFO), mỗi truy vấn chờ không quá `queue_timeout` giây.
+    Yêu cầu vượt quá sẽ bị từ chối ngay để giữ độ trễ đuôi ổn định.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 32, queue_timeout: float = 10.0,
+                 name: str = "query"):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must be >= 0")
+
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.name = name
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Trung bình trượt thời gian xử lý để ước lượng Retry-After
+        self._avg_service_time = 1.0
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Context manager giữ một slot xử lý trong suốt thời gian truy vấn
+
+        Raises:
+            AdmissionRejectedError: Khi hàng đợi đầy (429) hoặc chờ quá lâu (503)
+        """
+        await self._acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self):
+        """
+        Lấy một slot xử lý, xếp hàng nếu cần
+        """
+        # Đường nhanh: còn slot trống và không ai đang chờ
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._publish()
+            MetricsUtil.increment(f"{self.name}_admitted_total")
+            MetricsUtil.observe(f"{self.name}_queue_wait_seconds", 0.0)
+            return
+
+        # Hàng đợi đầy: từ chối ngay
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", 429)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        enqueued = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove_waiter(waiter)
+            self._reject("queue_timeout", 503)
+        except asyncio.CancelledError:
+            # Client hủy yêu cầu: trả lại slot nếu đã được cấp
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+        MetricsUtil.increment(f"{self.name}_admitted_total")
+        MetricsUtil.observe(f"{self.name}_queue_wait_seconds", time.perf_counter() - enqueued)
+
+    def _release(self):
+        """
+        Trả slot: chuyển thẳng cho người chờ kế tiếp hoặc giảm số truy vấn đang chạy
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Slot được chuyển giao, _in_flight giữ nguyên
+                waiter.set_result(None)
+                self._publish()
+                return
+        self._in_flight -= 1
+        self._publish()
+
+    def _remove_waiter(self, waiter: asyncio.Future):
+        """
+        Xóa một người chờ khỏi hàng đợi (nếu còn)
+        """
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._publish()
+
+    def _reject(self, reason: str, status_code: int):
+        """
+        Ghi nhận metrics và ném lỗi từ chối
+        """
+        MetricsUtil.increment(f"{self.name}_rejected_total{{reason={reason}}}")
+        raise AdmissionRejectedError(reason, status_code, self.estimate_retry_after())
+
+    def estimate_retry_after(self) -> int:
+        """
+        Ước lượng số giây cần chờ để hàng đợi hiện tại được xử lý hết
+        """
+        backlog = len(self._waiters) + 1
+        seconds = self._avg_service_time * backlog / self.max_in_flight
+        return max(1, math.ceil(seconds))
+
+    def _publish(self):
+        """
+        Cập nhật gauges độ sâu hàng đợi và số truy vấn đang chạy
+        """
+        MetricsUtil.set_gauge(f"{self.name}_in_flight", self._in_flight)
+        MetricsUtil.set_gauge(f"{self.name}_queue_depth", len(self._waiters))
+
+    def get_status(self) -> dict:
+        """
+        Lấy trạng thái hiện tại của bộ giới hạn
+        """
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+        }
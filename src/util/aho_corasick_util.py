@@ -0,0 +1,77 @@
+"""
+Utility Layer - Automaton Aho-Corasick: tìm đồng thời nhiều cụm từ trong một lượt quét văn bản
+Thời gian tìm kiếm O(độ dài văn bản + số kết quả), không phụ thuộc số cụm từ
+"""
+
+from collections import deque
+from typing import Any, Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Automaton dựng một lần từ danh sách (cụm từ, giá trị); mỗi kết quả trả về
+    (vị trí bắt đầu, vị trí kết thúc, giá trị), kể cả các kết quả chồng lên nhau.
+
+    Ví dụ:
+        automaton = AhoCorasick([(" napoleon ", "a"), (" waterloo ", "b")])
+        list(automaton.iter_matches(" napoleon o waterloo "))
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[dict] = [{}]                  # trạng thái -> {ký tự: trạng thái kế}
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, Any]]] = [[]]   # (độ dài cụm từ, giá trị)
+        self.num_patterns = 0
+
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                state = next_state
+            self._outputs[state].append((len(pattern), value))
+            self.num_patterns += 1
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        """
+        BFS từ gốc: fail của một trạng thái là hậu tố dài nhất cũng là tiền tố của một cụm từ.
+        Kết quả của trạng thái fail được gộp vào để không phải đi theo chuỗi fail khi tìm kiếm.
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """
+        Duyệt các vị trí khớp trong `text`
+
+        Returns:
+            Iterator (start, end, value) với text[start:end] là cụm từ khớp
+        """
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in outputs[state]:
+                yield index + 1 - length, index + 1, value
+
+    def __len__(self) -> int:
+        return self.num_patterns
@@ -0,0 +1,242 @@
+"""
+Utility Layer - Lắp ráp ngữ cảnh trước khi sinh câu trả lời
+Gộp các chunk chồng lấn/liền kề (chunk_overlap_token_size làm chunk kề nhau lặp tới 20% nội dung),
+bỏ đoạn gần trùng (shingle + MinHash) và xếp nội dung điểm cao nhất vào ngân sách token
+"""
+
+import os
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from util.vietnamese_tokenizer_util import VietnameseTokenizer
+
+ANCHOR_CHARS = 64           # Đoạn đầu của chunk sau dùng để tìm chỗ nối trong chunk trước
+MIN_OVERLAP_CHARS = 32      # Phần chồng lấn ngắn hơn coi là trùng hợp, không gộp
+SHINGLE_BYTES = 32          # ~5 âm tiết tiếng Việt
+MINHASH_BINS = 128          # Số ngăn của chữ ký MinHash
+_MINHASH_PRIME = np.uint64((1 << 32) + 15)
+# Hoán vị (a*x + b) mod p; a < 2^31 và băm shingle < 2^32 nên a*x + b không tràn uint64
+_MINHASH_A = np.uint64(1103515245)
+_MINHASH_B = np.uint64(12345)
+_EMPTY_BIN = np.uint64(1 << 63)
+# Cơ số băm shingle và nghịch đảo của nó mod 2^64 (phép nhân/cộng uint64 của numpy tự tràn vòng mod 2^64)
+_HASH_BASE = 1099511628211
+_HASH_BASE_INVERSE = pow(_HASH_BASE, -1, 1 << 64)
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Xấp xỉ số token khi không có tokenizer của mô hình: mỗi từ một token
+    """
+    return len(text.split())
+
+
+def _join_point(first: str, second: str) -> Optional[int]:
+    """
+    Vị trí trong `first` nơi `second` bắt đầu nếu `second` nối tiếp `first` (đuôi của first
+    là đầu của second) hoặc nằm trọn trong first; None nếu không chồng lấn
+    """
+    anchor = second[:ANCHOR_CHARS]
+    if len(anchor) < MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(anchor)
+    while start != -1:
+        tail = first[start:]
+        if len(tail) >= MIN_OVERLAP_CHARS and (second.startswith(tail) or tail.startswith(second)):
+            return start
+        start = first.find(anchor, start + 1)
+    return None
+
+
+def _merge_pair(first: dict, second: dict, count_tokens: Callable[[str], int]) -> Optional[dict]:
+    """
+    Gộp hai chunk cùng nguồn nếu chồng lấn, chứa nhau hoặc liền kề theo chunk_order_index.
+    Số token của đoạn gộp = tổng hai bên trừ phần chồng lấn (chỉ đếm lại phần chồng lấn).
+
+    Returns:
+        chunk đã gộp (điểm = điểm cao hơn) hoặc None
+    """
+    if (first.get("file_path") or "") != (second.get("file_path") or ""):
+        return None
+    a, b = first["content"], second["content"]
+    if b in a:
+        content, tokens = a, first["tokens"]
+    elif a in b:
+        content, tokens = b, second["tokens"]
+    else:
+        order_a, order_b = first.get("chunk_order_index"), second.get("chunk_order_index")
+        start = _join_point(a, b)
+        if start is not None:
+            content = a + b[len(a) - start:]
+            tokens = first["tokens"] + second["tokens"] - count_tokens(a[start:])
+        elif order_a is not None and order_b is not None and order_b == order_a + 1:
+            content, tokens = a + "\n" + b, first["tokens"] + second["tokens"]
+        else:
+            return None
+    merged = {**first, "content": content, "tokens": tokens, "score": max(first["score"], second["score"]),
+              "merged_ids": first["merged_ids"] + second["merged_ids"]}
+    if second.get("chunk_order_index") is not None:
+        merged["chunk_order_index"] = second["chunk_order_index"]
+    return merged
+
+
+def _absorb(pieces: List[dict], chunk: dict, count_tokens: Callable[[str], int]) -> Tuple[dict, List[int]]:
+    """
+    Gộp `chunk` với mọi đoạn trong `pieces` nối được với nó (trước hoặc sau), thử lại sau mỗi lần gộp
+    vì đoạn đã gộp dài hơn có thể nối thêm
+
+    Returns:
+        (đoạn sau khi gộp, chỉ số các đoạn trong pieces đã bị gộp vào)
+    """
+    current, absorbed = chunk, []
+    changed = True
+    while changed:
+        changed = False
+        for index, piece in enumerate(pieces):
+            if index in absorbed:
+                continue
+            merged = _merge_pair(piece, current, count_tokens) or _merge_pair(current, piece, count_tokens)
+            if merged is not None:
+                current = merged
+                absorbed.append(index)
+                changed = True
+    return current, absorbed
+
+
+def _powers(base: int, count: int) -> np.ndarray:
+    """
+    [1, base, base^2, ...] mod 2^64
+    """
+    factors = np.full(count, base, dtype=np.uint64)
+    factors[:1] = 1
+    return np.cumprod(factors)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Chữ ký MinHash một hoán vị (one-permutation hashing): băm mọi shingle SHINGLE_BYTES byte liên tiếp
+    của văn bản đã chuẩn hóa (NFC, chữ thường, gộp khoảng trắng), chia giá trị băm vào MINHASH_BINS
+    ngăn và giữ giá trị nhỏ nhất của mỗi ngăn. Vector hóa hoàn toàn, rẻ hơn k hoán vị trên mọi shingle.
+    """
+    data = np.frombuffer(" ".join(VietnameseTokenizer.normalize(text).split()).encode("utf-8"), dtype=np.uint8)
+    width = min(SHINGLE_BYTES, len(data))
+    # Băm đa thức mod 2^64 của mọi cửa sổ từ tổng tiền tố: (S[i+w] - S[i]) * B^-i, lấy 32 bit cao
+    count = len(data) - width + 1
+    powers = _powers(_HASH_BASE, len(data))
+    prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+    np.cumsum(data.astype(np.uint64) * powers, out=prefix[1:])
+    shingles = ((prefix[width:width + count] - prefix[:count]) * _powers(_HASH_BASE_INVERSE, count)) >> np.uint64(32)
+    hashed = (shingles * _MINHASH_A + _MINHASH_B) % _MINHASH_PRIME
+    signature = np.full(MINHASH_BINS, _EMPTY_BIN, dtype=np.uint64)
+    np.minimum.at(signature, hashed % np.uint64(MINHASH_BINS), hashed // np.uint64(MINHASH_BINS))
+    return signature
+
+
+def estimate_jaccard(first: np.ndarray, second: np.ndarray):
+    """
+    Ước lượng Jaccard: tỉ lệ ngăn có cùng giá trị nhỏ nhất trong số ngăn không rỗng ở ít nhất một bên.
+    `first` có thể là ma trận chữ ký (mỗi hàng một chữ ký) để so với nhiều chunk một lần.
+    """
+    filled = (first != _EMPTY_BIN) | (second != _EMPTY_BIN)
+    same = (first == second) & filled
+    return same.sum(axis=-1) / np.maximum(filled.sum(axis=-1), 1)
+
+
+def drop_near_duplicates(chunks: List[dict], threshold: float = 0.8) -> Tuple[List[dict], int]:
+    """
+    Giữ chunk theo thứ tự điểm, bỏ chunk có độ tương đồng Jaccard ước lượng (MinHash) với một chunk
+    đã giữ >= threshold
+
+    Returns:
+        (các chunk giữ lại, số chunk bị bỏ)
+    """
+    kept, dropped = [], 0
+    signatures = np.empty((0, MINHASH_BINS), dtype=np.uint64)
+    for chunk in sorted(chunks, key=lambda item: -item["score"]):
+        signature = minhash_signature(chunk["content"])
+        if len(signatures) and estimate_jaccard(signatures, signature).max() >= threshold:
+            dropped += 1
+            continue
+        kept.append(chunk)
+        signatures = np.vstack([signatures, signature])
+    return kept, dropped
+
+
+class ContextAssembler:
+    """
+    Lắp ráp phần chunk của ngữ cảnh:
+    1. Điểm của chunk theo thứ hạng truy xuất (hoặc trường "score" nếu có)
+    2. Bỏ đoạn gần trùng (Jaccard MinHash >= dedup_threshold)
+    3. Theo thứ tự điểm, gộp chunk với các đoạn đã chọn cùng file nếu chồng lấn/liền kề,
+       nhận chunk khi tổng token vẫn trong `token_budget` (0 = không giới hạn)
+    """
+
+    def __init__(self, token_budget: int = 8000, dedup_threshold: float = 0.8):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+
+    def assemble(self, chunks: List[dict],
+                 count_tokens: Callable[[str], int] = approx_tokens) -> Tuple[List[dict], dict]:
+        """
+        Args:
+            chunks: Chunk theo thứ hạng (dict có "content", "file_path", ...)
+            count_tokens: Hàm đếm token của mô hình
+
+        Returns:
+            (chunk đã lắp ráp theo thứ tự điểm, thống kê token trước/sau)
+        """
+        # Chunk giải mã từ cửa sổ token có thể bắt đầu/kết thúc bằng ký tự UTF-8 bị cắt dở
+        scored = [{**chunk, "content": (chunk.get("content") or "").strip(" \t\r\n\ufffd"),
+                   "score": float(chunk.get("score", 1.0 / (rank + 1))),
+                   "merged_ids": [chunk.get("chunk_id")]}
+                  for rank, chunk in enumerate(chunks) if (chunk.get("content") or "").strip()]
+        for chunk in scored:
+            chunk["tokens"] = count_tokens(chunk["content"])
+        tokens_before = sum(chunk["tokens"] for chunk in scored)
+        deduplicated, duplicates = drop_near_duplicates(scored, self.dedup_threshold)
+
+        # Chọn chunk theo điểm; chi phí của một chunk là phần token mới sau khi gộp với các đoạn đã chọn
+        # (chunk kề nhau chỉ tốn phần không chồng lấn). Gộp trước rồi mới xếp thì đoạn gộp quá dài sẽ bị loại cả.
+        pieces, used, skipped = [], 0, 0
+        for chunk in deduplicated:
+            merged, absorbed = _absorb(pieces, chunk, count_tokens)
+            new_used = used - sum(pieces[index]["tokens"] for index in absorbed) + merged["tokens"]
+            if self.token_budget > 0 and new_used > self.token_budget:
+                skipped += 1
+                continue
+            pieces = [piece for index, piece in enumerate(pieces) if index not in absorbed] + [merged]
+            used = new_used
+
+        # Chunk điểm cao nhất đã vượt ngân sách: cắt bớt thay vì trả ngữ cảnh rỗng
+        if not pieces and deduplicated:
+            best = deduplicated[0]
+            keep_chars = len(best["content"]) * self.token_budget // max(count_tokens(best["content"]), 1)
+            content = best["content"][:keep_chars]
+            used = count_tokens(content)
+            pieces = [{**best, "content": content, "tokens": used}]
+            skipped -= 1
+        pieces.sort(key=lambda piece: -piece["score"])
+
+        stats = {
+            "chunks_in": len(scored),
+            "chunks_merged": len(deduplicated) - skipped - len(pieces),
+            "duplicates_dropped": duplicates,
+            "over_budget_dropped": skipped,
+            "chunks_out": len(pieces),
+            "tokens_before": tokens_before,
+            "tokens_after": used,
+        }
+        return pieces, stats
+
+
+def create_context_assembler() -> Optional[ContextAssembler]:
+    """
+    Tạo ContextAssembler từ biến môi trường (CONTEXT_ASSEMBLY_ENABLED=false để tắt)
+    """
+    if os.getenv("CONTEXT_ASSEMBLY_ENABLED", "true").lower() != "true":
+        return None
+    return ContextAssembler(
+        token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000")),
+        dedup_threshold=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8")),
+    )
@@ -0,0 +1,149 @@
+"""
+Utility Layer - Gom các lời gọi embedding đồng thời thành micro-batch
+Nhiều truy vấn/tác vụ ingestion cùng lúc chỉ tạo ra một lời gọi API cho mỗi batch
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from util.metrics_util import MetricsUtil
+
+
+class _PendingRequest:
+    """
+    Một phần yêu cầu embedding đang chờ trong batch
+    """
+
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    Bọc một hàm embedding async (list[str] -> ndarray):
+    - Yêu cầu đến cùng lúc được gom vào batch chung (cùng tham số kwargs)
+    - Batch được gửi khi đủ `max_batch_size` văn bản hoặc khi yêu cầu đầu tiên đã chờ `max_wait` giây
+    - Mỗi batch gọi hàm gốc đúng một lần, kết quả được chia lại cho từng caller theo thứ tự
+    - Yêu cầu lớn hơn `max_batch_size` được chia thành nhiều phần
+
+    Metrics: `<name>_batch_size` (số văn bản/batch), `<name>_batch_requests` (số caller/batch),
+    `<name>_queue_delay_seconds` (thời gian chờ thêm do gom batch), `<name>_batches_total`.
+    """
+
+    def __init__(self, embed_func: Callable[..., Awaitable[np.ndarray]], max_batch_size: int = 64,
+                 max_wait: float = 0.005, name: str = "embedding"):
+        self.embed_func = embed_func
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.name = name
+        self._pending: Dict[tuple, List[_PendingRequest]] = {}   # kwargs -> yêu cầu đang chờ
+        self._pending_sizes: Dict[tuple, int] = {}
+        self._timers: Dict[tuple, asyncio.TimerHandle] = {}
+        self._kwargs: Dict[tuple, dict] = {}
+        self._dispatching = set()   # Giữ tham chiếu tới các task đang gọi API
+
+    async def __call__(self, texts: List[str], **kwargs) -> np.ndarray:
+        """
+        Embedding cho `texts`, cùng kết quả như gọi trực tiếp hàm gốc
+        """
+        if not texts:
+            return await self.embed_func(texts, **kwargs)
+        try:
+            key = tuple(sorted(kwargs.items()))
+            hash(key)
+        except TypeError:
+            # Tham số không băm được (ví dụ client object): gọi thẳng, không gom
+            return await self.embed_func(texts, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(texts), self.max_batch_size):
+            part = list(texts[start:start + self.max_batch_size])
+            future = loop.create_future()
+            self._enqueue(key, kwargs, _PendingRequest(part, future))
+            futures.append(future)
+
+        results = await asyncio.gather(*futures)
+        return results[0] if len(results) == 1 else np.concatenate(results)
+
+    def _enqueue(self, key: tuple, kwargs: dict, request: _PendingRequest):
+        # Batch hiện tại không đủ chỗ -> gửi trước rồi mở batch mới
+        if self._pending_sizes.get(key, 0) + len(request.texts) > self.max_batch_size:
+            self._flush(key)
+
+        self._pending.setdefault(key, []).append(request)
+        self._pending_sizes[key] = self._pending_sizes.get(key, 0) + len(request.texts)
+        self._kwargs[key] = kwargs
+
+        if self._pending_sizes[key] >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+    def _flush(self, key: tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        requests = self._pending.pop(key, None)
+        self._pending_sizes.pop(key, None)
+        kwargs = self._kwargs.pop(key, {})
+        if requests:
+            task = asyncio.get_running_loop().create_task(self._dispatch(requests, kwargs))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, requests: List[_PendingRequest], kwargs: dict):
+        """
+        Gọi hàm embedding một lần cho cả batch và trả kết quả về từng caller
+        """
+        dispatched_at = time.perf_counter()
+        texts = [text for request in requests for text in request.texts]
+        MetricsUtil.increment(f"{self.name}_batches_total")
+        MetricsUtil.observe(f"{self.name}_batch_size", len(texts))
+        MetricsUtil.observe(f"{self.name}_batch_requests", len(requests))
+        for request in requests:
+            MetricsUtil.observe(f"{self.name}_queue_delay_seconds", dispatched_at - request.enqueued_at)
+
+        try:
+            embeddings = await self.embed_func(texts, **kwargs)
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in requests:
+            end = offset + len(request.texts)
+            if not request.future.done():   # caller có thể đã bị hủy
+                request.future.set_result(embeddings[offset:end])
+            offset = end
+
+    def get_status(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending_texts": sum(self._pending_sizes.values()),
+        }
+
+
+def create_embedding_batcher(embed_func: Callable[..., Awaitable[np.ndarray]],
+                             max_batch_size: Optional[int] = None,
+                             max_wait_ms: Optional[float] = None) -> EmbeddingBatcher:
+    """
+    Tạo EmbeddingBatcher với cấu hình từ biến môi trường EMBEDDING_MAX_BATCH / EMBEDDING_MAX_WAIT_MS
+    """
+    if max_batch_size is None:
+        max_batch_size = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+    if max_wait_ms is None:
+        max_wait_ms = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+    return EmbeddingBatcher(embed_func, max_batch_size=max_batch_size, max_wait=max_wait_ms / 1000)
@@ -0,0 +1,277 @@
+"""
+Utility Layer - Chỉ mục nén cho tìm kiếm dự phòng
+Lưu corpus dưới dạng mảng NumPy thay vì chuỗi lớn và các tập token Python
+"""
+
+import json
+import mmap
+import os
+import re
+import tempfile
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from util.vietnamese_tokenizer_util import DEFAULT_TOKENIZER, VietnameseTokenizer
+
+
+class FallbackIndex:
+    """
+    Chỉ mục tìm kiếm dự phòng dạng mảng:
+    - Từ vựng: token -> token id (mỗi token chỉ lưu một lần)
+    - Văn bản: các đoạn văn nằm liên tiếp trong một buffer UTF-8 được memory-map,
+      truy cập bằng mảng offsets (đoạn i = buffer[offsets[i]:offsets[i+1]])
+    - Ma trận term x đoạn văn dạng CSR (indptr, indices): hàng t là danh sách
+      đoạn văn chứa token t, giá trị ngầm định bằng 1
+
+    Token là các term của VietnameseTokenizer, được tính sẵn khi xây chỉ mục.
+    Điểm của đoạn văn = số term trùng với câu hỏi (giống TextSearchUtil),
+    tính bằng tích ma trận thưa - vector truy vấn nhị phân.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], indptr: np.ndarray, indices: np.ndarray,
+                 offsets: np.ndarray, buffer, tokenizer: VietnameseTokenizer = DEFAULT_TOKENIZER):
+        self.tokenizer = tokenizer      # Phải giống nhau khi xây chỉ mục và khi truy vấn
+        self.vocabulary = vocabulary    # token -> id
+        self.indptr = indptr            # int64[len(vocabulary) + 1]
+        self.indices = indices          # int32[nnz], id đoạn văn
+        self.offsets = offsets          # int64[num_paragraphs + 1], byte offsets trong buffer
+        self._buffer = buffer           # mmap (hoặc bytes khi corpus rỗng)
+
+    @property
+    def num_paragraphs(self) -> int:
+        return len(self.offsets) - 1
+
+    @staticmethod
+    def iter_paragraphs(text: str) -> Iterator[str]:
+        """
+        Chia văn bản thành các đoạn văn (theo dòng trống) mà không tạo danh sách trung gian
+        """
+        start = 0
+        for match in re.finditer(r"\n\s*\n", text):
+            paragraph = text[start:match.start()].strip()
+            if paragraph:
+                yield paragraph
+            start = match.end()
+        paragraph = text[start:].strip()
+        if paragraph:
+            yield paragraph
+
+    @classmethod
+    def from_text(cls, text: str, tokenizer: VietnameseTokenizer = DEFAULT_TOKENIZER) -> "FallbackIndex":
+        """
+        Xây chỉ mục từ văn bản thô (chia đoạn giống TextSearchUtil)
+        """
+        return cls.build(cls.iter_paragraphs(text), tokenizer)
+
+    @classmethod
+    def build(cls, paragraphs: Iterable[str],
+              tokenizer: VietnameseTokenizer = DEFAULT_TOKENIZER) -> "FallbackIndex":
+        """
+        Xây chỉ mục từ danh sách đoạn văn
+
+        Args:
+            paragraphs: Các đoạn văn (mỗi phần tử là một đơn vị trả về)
+            tokenizer: Pipeline tách từ dùng cho cả đoạn văn và câu hỏi
+
+        Returns:
+            FallbackIndex đã sẵn sàng tìm kiếm
+        """
+        vocabulary: Dict[str, int] = {}
+        term_ids = array("i")     # token id của tất cả đoạn văn, nối liên tiếp
+        term_counts = array("q")  # số token phân biệt của từng đoạn
+        offsets = array("q", [0])
+        text_file = tempfile.TemporaryFile()
+
+        # Bước 1: Ghi văn bản ra buffer và thu thập token id của từng đoạn
+        for paragraph in paragraphs:
+            encoded = paragraph.encode("utf-8")
+            text_file.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+            tokens = set(tokenizer.terms(paragraph))
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            term_counts.append(len(tokens))
+
+        # Bước 2: Chuyển cặp (token, đoạn văn) thành ma trận CSR theo token
+        num_paragraphs = len(term_counts)
+        rows = np.frombuffer(term_ids, dtype=np.int32) if term_ids else np.empty(0, dtype=np.int32)
+        counts = np.frombuffer(term_counts, dtype=np.int64) if term_counts else np.empty(0, dtype=np.int64)
+        cols = np.repeat(np.arange(num_paragraphs, dtype=np.int32), counts)
+        order = np.argsort(rows, kind="stable")   # giữ thứ tự đoạn văn tăng dần trong mỗi hàng
+        indices = cols[order]
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(vocabulary)), out=indptr[1:])
+
+        # Bước 3: Memory-map buffer văn bản (file tạm tự xóa khi đóng)
+        text_file.flush()
+        if offsets[-1] > 0:
+            buffer = mmap.mmap(text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = b""
+        text_file.close()
+
+        return cls(vocabulary, indptr, indices, np.array(offsets, dtype=np.int64), buffer, tokenizer)
+
+    def paragraph(self, paragraph_id: int) -> str:
+        """
+        Đọc nội dung một đoạn văn từ buffer
+        """
+        start, end = int(self.offsets[paragraph_id]), int(self.offsets[paragraph_id + 1])
+        return self._buffer[start:end].decode("utf-8")
+
+    def paragraphs(self) -> Iterator[str]:
+        """
+        Duyệt nội dung mọi đoạn văn theo id
+        """
+        for paragraph_id in range(self.num_paragraphs):
+            yield self.paragraph(paragraph_id)
+
+    def score(self, question: str) -> np.ndarray:
+        """
+        Tính điểm trùng term của mọi đoạn văn với câu hỏi
+
+        Returns:
+            Mảng int32[num_paragraphs] số token trùng
+        """
+        terms = set(self.tokenizer.terms(question))
+        term_ids = [self.vocabulary[t] for t in terms if t in self.vocabulary]
+        if not term_ids:
+            return np.zeros(self.num_paragraphs, dtype=np.int32)
+
+        # Tích ma trận thưa với vector truy vấn nhị phân: gom danh sách đoạn văn của các token
+        postings = np.concatenate([self.indices[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        return np.bincount(postings, minlength=self.num_paragraphs).astype(np.int32)
+
+    def score_candidates(self, question: str, candidates: np.ndarray) -> np.ndarray:
+        """
+        Tính điểm chỉ cho các đoạn văn ứng viên (ví dụ kết quả lọc metadata).
+        Mỗi hàng CSR đã sắp tăng dần nên chỉ cần tìm nhị phân vị trí ứng viên trong hàng,
+        không phải duyệt toàn bộ danh sách đoạn văn của token.
+
+        Args:
+            candidates: Mảng id đoạn văn đã sắp tăng dần
+
+        Returns:
+            Mảng int32[len(candidates)] số token trùng
+        """
+        scores = np.zeros(len(candidates), dtype=np.int32)
+        if len(candidates) == 0:
+            return scores
+        for term in set(self.tokenizer.terms(question)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            row = self.indices[self.indptr[term_id]:self.indptr[term_id + 1]]
+            positions = np.searchsorted(row, candidates)
+            found = positions < len(row)
+            found[found] = row[positions[found]] == candidates[found]
+            scores += found
+        return scores
+
+    def search(self, question: str, top_k: int = 5,
+               candidates: Optional[Iterable[int]] = None) -> List[Tuple[int, str]]:
+        """
+        Tìm các đoạn văn có điểm cao nhất (bỏ đoạn có điểm 0)
+
+        Args:
+            candidates: Chỉ xét các đoạn văn này (None = toàn corpus)
+
+        Returns:
+            Danh sách (điểm, đoạn_văn), điểm bằng nhau giữ thứ tự xuất hiện
+        """
+        if candidates is None:
+            scores = self.score(question)
+            matched = np.flatnonzero(scores)
+            matched_scores = scores[matched]
+        else:
+            paragraph_ids = np.unique(np.fromiter(candidates, dtype=np.int64))
+            candidate_scores = self.score_candidates(question, paragraph_ids)
+            nonzero = np.flatnonzero(candidate_scores)
+            matched, matched_scores = paragraph_ids[nonzero], candidate_scores[nonzero]
+        if len(matched) == 0:
+            return []
+        order = np.lexsort((matched, -matched_scores))[:top_k]
+        return [(int(matched_scores[i]), self.paragraph(int(matched[i]))) for i in order]
+
+    def local_search(self, question: str, top_k: int = 5, candidates: Optional[Iterable[int]] = None) -> str:
+        """
+        Tương đương TextSearchUtil.local_search nhưng dùng chỉ mục đã xây sẵn
+        """
+        if not question:
+            return "Sorry, I'm not able to provide an answer to that question.[no-input]"
+
+        top_paragraphs = [paragraph for _, paragraph in self.search(question, top_k, candidates)]
+        if not top_paragraphs:
+            return "Sorry, I'm not able to provide an answer to that question.[no-context]"
+
+        return "\n\n".join(top_paragraphs)
+
+    def memory_bytes(self) -> int:
+        """
+        Ước lượng bộ nhớ heap của chỉ mục (không tính buffer văn bản được memory-map)
+        """
+        vocabulary_bytes = sum(len(token) for token in self.vocabulary) + 100 * len(self.vocabulary)
+        return int(self.indptr.nbytes + self.indices.nbytes + self.offsets.nbytes + vocabulary_bytes)
+
+    def text_bytes(self) -> int:
+        """
+        Kích thước buffer văn bản (nằm trong page cache, không trong heap Python)
+        """
+        return int(self.offsets[-1])
+
+    def save(self, directory: str):
+        """
+        Lưu chỉ mục ra thư mục (mảng .npy, buffer văn bản, từ vựng và cấu hình tokenizer)
+        để có thể nạp lại bằng memory-map mà không cần xây lại
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, "indices.npy"), self.indices)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        with open(os.path.join(directory, "text.bin"), "wb") as f:
+            f.write(self._buffer)
+
+        # Từ vựng lưu theo thứ tự id
+        vocabulary = [None] * len(self.vocabulary)
+        for token, token_id in self.vocabulary.items():
+            vocabulary[token_id] = token
+        meta = {
+            "num_paragraphs": self.num_paragraphs,
+            "tokenizer": {
+                "fold_accents": self.tokenizer.fold_accents,
+                "remove_stopwords": self.tokenizer.remove_stopwords,
+                "bigrams": self.tokenizer.bigrams,
+            },
+            "vocabulary": vocabulary,
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> "FallbackIndex":
+        """
+        Nạp chỉ mục đã lưu; các mảng và buffer văn bản được memory-map (chỉ đọc)
+        """
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        indptr = np.load(os.path.join(directory, "indptr.npy"), mmap_mode="r")
+        indices = np.load(os.path.join(directory, "indices.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        buffer = b""
+        if int(offsets[-1]) > 0:
+            with open(os.path.join(directory, "text.bin"), "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        vocabulary = {token: token_id for token_id, token in enumerate(meta["vocabulary"])}
+        tokenizer = VietnameseTokenizer(**meta["tokenizer"])
+        return cls(vocabulary, indptr, indices, offsets, buffer, tokenizer)
+
+    def close(self):
+        """
+        Giải phóng buffer memory-map
+        """
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = b""
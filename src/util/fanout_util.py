@@ -0,0 +1,93 @@
+"""
+Utility Layer - Gộp kết quả truy xuất của nhiều chiến lược (naive/local/global/...) chạy song song
+Khử trùng lặp entity, quan hệ và chunk rồi dựng một ngữ cảnh duy nhất cho một lần gọi LLM
+"""
+
+import json
+import os
+from typing import Dict, List, Tuple
+
+from lightrag.prompt import PROMPTS
+
+FANOUT_MODE = "fanout"
+RETRIEVAL_MODES = ("naive", "local", "global", "hybrid", "mix")
+
+
+def load_fanout_config() -> Tuple[List[str], Dict[str, float]]:
+    """
+    Các chiến lược chạy song song (FANOUT_STRATEGIES, mặc định "naive,local,global") và thời hạn của từng
+    chiến lược tính bằng giây (FANOUT_TIMEOUT_<MODE>, mặc định FANOUT_TIMEOUT = 8)
+    """
+    strategies = [mode.strip() for mode in os.getenv("FANOUT_STRATEGIES", "naive,local,global").split(",")
+                  if mode.strip() in RETRIEVAL_MODES]
+    default_timeout = float(os.getenv("FANOUT_TIMEOUT", "8"))
+    timeouts = {mode: float(os.getenv(f"FANOUT_TIMEOUT_{mode.upper()}", default_timeout)) for mode in strategies}
+    return strategies, timeouts
+
+
+def _interleave(lists: List[List[dict]], key) -> List[dict]:
+    """
+    Lấy xen kẽ phần tử thứ i của mỗi danh sách (giữ thứ hạng của từng chiến lược), bỏ phần tử trùng khóa
+    """
+    merged, seen = [], set()
+    for rank in range(max((len(items) for items in lists), default=0)):
+        for items in lists:
+            if rank < len(items):
+                item_key = key(items[rank])
+                if item_key not in seen:
+                    seen.add(item_key)
+                    merged.append(items[rank])
+    return merged
+
+
+# Khóa khử trùng lặp của từng loại dữ liệu truy xuất (quan hệ vô hướng)
+MERGE_KEYS = {
+    "entities": lambda entity: entity.get("entity_name"),
+    "relationships": lambda relation: tuple(sorted((relation.get("src_id"), relation.get("tgt_id")))),
+    "chunks": lambda chunk: chunk.get("chunk_id") or chunk.get("content"),
+}
+
+
+def merge_retrievals(results: List[dict]) -> dict:
+    """
+    Gộp phần "data" của các kết quả aquery_data theo thứ tự chiến lược
+
+    Returns:
+        dict: entities, relationships, chunks đã khử trùng lặp
+    """
+    datasets = [result.get("data") or {} for result in results]
+    return {field: _interleave([data.get(field) or [] for data in datasets], key=key)
+            for field, key in MERGE_KEYS.items()}
+
+
+def format_context(merged: dict) -> str:
+    """
+    Dựng ngữ cảnh theo mẫu kg_query_context của LightRAG; reference_id được đánh lại theo file nguồn
+    vì mỗi chiến lược đánh số riêng
+
+    Returns:
+        Chuỗi ngữ cảnh, rỗng nếu không có dữ liệu nào
+    """
+    if not any(merged.values()):
+        return ""
+    references: Dict[str, str] = {}
+    chunks = []
+    for chunk in merged["chunks"]:
+        file_path = chunk.get("file_path") or "unknown_source"
+        reference_id = references.setdefault(file_path, str(len(references) + 1))
+        chunks.append({"reference_id": reference_id, "content": chunk.get("content", "")})
+
+    entities = [{"entity": entity.get("entity_name"), "type": entity.get("entity_type"),
+                 "description": entity.get("description")} for entity in merged["entities"]]
+    relations = [{"entity1": relation.get("src_id"), "entity2": relation.get("tgt_id"),
+                  "description": relation.get("description")} for relation in merged["relationships"]]
+
+    def json_lines(items: List[dict]) -> str:
+        return "\n".join(json.dumps(item, ensure_ascii=False) for item in items)
+
+    return PROMPTS["kg_query_context"].format(
+        entities_str=json_lines(entities),
+        relations_str=json_lines(relations),
+        text_chunks_str=json_lines(chunks),
+        reference_list_str="\n".join(f"[{reference_id}] {file_path}" for file_path, reference_id in references.items()),
+    )
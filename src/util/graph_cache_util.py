@@ -0,0 +1,177 @@
+"""
+Utility Layer - Cache đọc xuyên (read-through) đặt trước graph storage của LightRAG
+Giữ node, bậc (degree), cạnh và láng giềng 1 bước của các entity hay được hỏi trong bộ nhớ
+để truy vấn local/global/mix không phải round-trip tới Neo4j cho cùng dữ liệu mỗi lần
+"""
+
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from util.lru_cache_util import SizedLRUCache
+from util.metrics_util import MetricsUtil
+
+_ABSENT = object()   # Phân biệt "chưa có trong cache" với giá trị None (node không tồn tại)
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Ước lượng số byte bộ nhớ của một giá trị đọc từ graph (dict thuộc tính, list cạnh, số)
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class CachedGraphStorage:
+    """
+    Bọc một graph storage của LightRAG (Neo4JStorage, ...), cache các thao tác đọc trên đường truy vấn:
+    get_node(s_batch), node_degree(s_batch), get_nodes_edges_batch (láng giềng 1 bước),
+    get_edge(s_batch) và edge_degree(s_batch) (tính từ bậc node đã cache, giống Neo4JStorage).
+
+    - Batch chỉ gửi các khóa chưa có trong cache xuống storage, trong một lời gọi duy nhất
+    - Node/cạnh không tồn tại cũng được cache (negative cache)
+    - LRU giới hạn theo dung lượng ước lượng (`max_bytes`)
+    - Mọi thao tác ghi (upsert/delete/remove/drop/index_done_callback) xóa toàn bộ cache,
+      nên dữ liệu mới sau ingestion luôn được đọc lại. Kết quả đọc bắt đầu trước khi ghi không được lưu.
+    - Giá trị trả về là bản sao: LightRAG sửa trực tiếp dict cạnh (ví dụ gán weight mặc định)
+
+    Chỉ thấy thao tác ghi trong cùng tiến trình; ingestion từ tiến trình khác vào cùng Neo4j
+    cần khởi động lại server hoặc gọi /reindex.
+    Các thuộc tính/phương thức khác được chuyển thẳng tới storage gốc.
+    """
+
+    WRITE_METHODS = frozenset({
+        "upsert_node", "upsert_edge", "upsert_nodes_batch", "upsert_edges_batch",
+        "delete_node", "remove_nodes", "remove_edges", "drop", "drop_pending_index_ops",
+        "index_done_callback",
+    })
+
+    def __init__(self, storage: Any, max_bytes: int = 64 * 1024 * 1024, name: str = "graph_cache"):
+        self._storage = storage
+        self._cache = SizedLRUCache(max_bytes=max_bytes)
+        self._generation = 0
+        self.name = name
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._storage, name)
+        if name not in self.WRITE_METHODS:
+            return attr
+
+        async def write(*args, **kwargs):
+            self.invalidate()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                self.invalidate()
+        return write
+
+    @property
+    def storage(self) -> Any:
+        return self._storage
+
+    def invalidate(self):
+        """
+        Xóa toàn bộ cache (gọi tự động khi graph bị ghi)
+        """
+        self._generation += 1
+        if len(self._cache):
+            self._cache.clear()
+            MetricsUtil.increment(f"{self.name}_invalidations_total")
+
+    async def _read_through(self, kind: str, keys: List[Hashable],
+                            fetch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """
+        Lấy giá trị của các khóa từ cache, phần còn thiếu lấy bằng một lời gọi `fetch`
+
+        Returns:
+            dict khóa -> giá trị (None nếu storage không có)
+        """
+        found, missing = {}, []
+        for key in keys:
+            value = self._cache.get((kind, key), _ABSENT)
+            if value is _ABSENT:
+                if key not in found:
+                    found[key] = _ABSENT
+                    missing.append(key)
+            else:
+                found[key] = value
+        hits = len(keys) - len(missing)
+        if hits:
+            MetricsUtil.increment(f"{self.name}_hits_total", hits)
+        if not missing:
+            return found
+
+        MetricsUtil.increment(f"{self.name}_misses_total", len(missing))
+        MetricsUtil.increment(f"{self.name}_backend_calls_total")
+        generation = self._generation
+        fetched = await fetch(missing)
+        for key in missing:
+            value = fetched.get(key)
+            found[key] = value
+            if generation == self._generation:
+                self._cache.put((kind, key), value, estimate_size(value) + estimate_size(key))
+        return found
+
+    # ----- Node -----
+
+    async def get_nodes_batch(self, node_ids: List[str]) -> Dict[str, dict]:
+        values = await self._read_through("node", list(node_ids), self._storage.get_nodes_batch)
+        return {node_id: dict(node) for node_id, node in values.items() if node is not None}
+
+    async def get_node(self, node_id: str) -> Optional[dict]:
+        return (await self.get_nodes_batch([node_id])).get(node_id)
+
+    async def node_degrees_batch(self, node_ids: List[str]) -> Dict[str, int]:
+        values = await self._read_through("degree", list(node_ids), self._storage.node_degrees_batch)
+        return {node_id: degree or 0 for node_id, degree in values.items()}
+
+    async def node_degree(self, node_id: str) -> int:
+        return (await self.node_degrees_batch([node_id]))[node_id]
+
+    async def get_nodes_edges_batch(self, node_ids: List[str]) -> Dict[str, list]:
+        values = await self._read_through("neighbors", list(node_ids), self._storage.get_nodes_edges_batch)
+        return {node_id: list(edges or []) for node_id, edges in values.items()}
+
+    # ----- Cạnh (vô hướng: (a, b) và (b, a) dùng chung một mục cache) -----
+
+    async def get_edges_batch(self, pairs: List[dict]) -> Dict[tuple, dict]:
+        async def fetch(keys):
+            return await self._storage.get_edges_batch([{"src": src, "tgt": tgt} for src, tgt in keys])
+
+        requested = [(pair["src"], pair["tgt"]) for pair in pairs]
+        values = await self._read_through("edge", [tuple(sorted(pair)) for pair in requested], fetch)
+        result = {}
+        for pair in requested:
+            edge = values.get(tuple(sorted(pair)))
+            if edge is not None:
+                result[pair] = dict(edge)
+        return result
+
+    async def get_edge(self, source_node_id: str, target_node_id: str) -> Optional[dict]:
+        result = await self.get_edges_batch([{"src": source_node_id, "tgt": target_node_id}])
+        return result.get((source_node_id, target_node_id))
+
+    async def edge_degrees_batch(self, edge_pairs: List[tuple]) -> Dict[tuple, int]:
+        node_ids = list(dict.fromkeys(node_id for pair in edge_pairs for node_id in pair))
+        degrees = await self.node_degrees_batch(node_ids)
+        return {(src, tgt): degrees.get(src, 0) + degrees.get(tgt, 0) for src, tgt in edge_pairs}
+
+    async def edge_degree(self, src_id: str, tgt_id: str) -> int:
+        return (await self.edge_degrees_batch([(src_id, tgt_id)]))[(src_id, tgt_id)]
+
+    def get_status(self) -> dict:
+        return self._cache.get_stats()
+
+
+def wrap_graph_storage(storage: Any, max_mb: Optional[float] = None) -> Any:
+    """
+    Đặt CachedGraphStorage trước graph storage nếu GRAPH_CACHE_MB > 0 (mặc định 64MB, 0 = tắt)
+    """
+    if max_mb is None:
+        max_mb = float(os.getenv("GRAPH_CACHE_MB", "64"))
+    if max_mb <= 0 or isinstance(storage, CachedGraphStorage):
+        return storage
+    return CachedGraphStorage(storage, max_bytes=int(max_mb * 1024 * 1024))
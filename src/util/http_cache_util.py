@@ -0,0 +1,105 @@
+"""
+Utility Layer - Cache HTTP cho GET /query
+Chuẩn hóa tham số truy vấn (mỗi câu hỏi một URL duy nhất để CDN/proxy dùng chung bản cache),
+ETag gắn với phiên bản chỉ mục và Cache-Control tương ứng
+"""
+
+import hashlib
+import unicodedata
+from typing import List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+VERSION_PARAM = "v"                 # Tham số ghim phiên bản chỉ mục: URL có v đúng phiên bản hiện tại là bất biến
+IMMUTABLE_MAX_AGE = 31536000        # Một năm: nội dung của URL đã ghim phiên bản không bao giờ đổi
+CACHEABLE_SOURCES = ("rag", "faq")  # Câu trả lời dự phòng/thiếu ngữ cảnh (LLM/RAG lỗi, hết hạn) không được cache
+FAQ_ETAG_SUFFIX = "-faq"            # Đánh dấu ETag của câu trả lời FAQ (không bao giờ immutable)
+DEFAULT_MODE = "mix"
+DEFAULT_TOP_K = 5
+
+
+def normalize_question(question: str) -> str:
+    """
+    Chuẩn hóa câu hỏi cho URL: Unicode NFC (dấu tiếng Việt dựng sẵn/tổ hợp cho cùng một chuỗi)
+    và gộp khoảng trắng
+    """
+    return " ".join(unicodedata.normalize("NFC", question or "").split())
+
+
+def canonical_query_params(question: str, mode: Optional[str] = None, top_k: Optional[int] = None,
+                           corpus_id: Optional[str] = None, **filters) -> List[Tuple[str, str]]:
+    """
+    Tham số truy vấn dạng chuẩn: câu hỏi đã chuẩn hóa, mode/top_k luôn có (điền mặc định),
+    bỏ tham số rỗng, sắp xếp theo tên
+
+    Args:
+        question: Câu hỏi
+        mode: Chế độ tìm kiếm (mặc định "mix")
+        top_k: Số kết quả (mặc định 5)
+        corpus_id: Corpus (None = corpus mặc định, không ghi vào URL)
+        **filters: Bộ lọc metadata (source_file, section, date_from, date_to)
+
+    Returns:
+        Danh sách (tên, giá trị) đã sắp xếp
+    """
+    params = {
+        "question": normalize_question(question),
+        "mode": mode or DEFAULT_MODE,
+        "top_k": str(top_k if top_k is not None else DEFAULT_TOP_K),
+        "corpus_id": corpus_id,
+        **filters,
+    }
+    return sorted((name, str(value).strip()) for name, value in params.items()
+                  if value is not None and str(value).strip())
+
+
+def canonical_query_string(params: List[Tuple[str, str]], version: Optional[int] = None) -> str:
+    """
+    Query string chuẩn (percent-encoding UTF-8, khoảng trắng là %20), `v` đứng cuối nếu có
+    """
+    if version is not None:
+        params = params + [(VERSION_PARAM, str(version))]
+    return urlencode(params, quote_via=quote, safe="")
+
+
+def make_etag(canonical: str, version: int, faq_revision: Optional[str] = None, faq: bool = False) -> str:
+    """
+    ETag yếu (W/) gồm phiên bản chỉ mục và hash của truy vấn chuẩn: đánh chỉ mục lại thì mọi ETag cũ
+    hết khớp. Yếu vì trace_id trong thân phản hồi khác nhau giữa các lần trả lời tương đương.
+
+    Args:
+        faq_revision: Phiên bản FAQ của corpus; nạp lại FAQ có thể chuyển câu hỏi giữa FAQ và RAG
+                      nên mọi ETag đều phụ thuộc vào nó
+        faq: Phản hồi trả lời từ FAQ (thêm hậu tố FAQ_ETAG_SUFFIX)
+    """
+    key = canonical if faq_revision is None else f"{canonical}\nfaq={faq_revision}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return f'W/"v{version}-{digest}{FAQ_ETAG_SUFFIX if faq else ""}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    So khớp If-None-Match theo kiểu so sánh yếu (RFC 9110): bỏ tiền tố W/, hỗ trợ "*" và danh sách
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def cache_control(version: int, requested_version: Optional[int], max_age: int, faq: bool = False) -> str:
+    """
+    Cache-Control của phản hồi GET /query
+
+    Args:
+        version: Phiên bản chỉ mục hiện tại
+        requested_version: Tham số `v` của request (None nếu không ghim)
+        max_age: Thời gian (giây) dùng bản cache không cần hỏi lại với URL không ghim phiên bản
+        faq: Câu trả lời từ FAQ: `v` chỉ ghim phiên bản chỉ mục, không ghim FAQ (nạp lại không đổi `v`),
+             nên không bao giờ immutable
+    """
+    if requested_version == version and not faq:
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={max_age}, must-revalidate"
+
@@ -0,0 +1,65 @@
+"""
+Utility Layer - Chạy I/O file và parse dữ liệu chặn (blocking) ngoài event loop
+Dùng một thread pool giới hạn, dùng chung cho mọi corpus, để khởi động/reindex không làm đứng các request khác
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, List, Optional
+
+from util.metrics_util import MetricsUtil
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool cho I/O file (số luồng: IO_EXECUTOR_WORKERS, mặc định 4)
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, int(os.getenv("IO_EXECUTOR_WORKERS", "4"))),
+                thread_name_prefix="rag-io",
+            )
+        return _executor
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Chạy hàm đồng bộ (đọc file, json.load, dựng chỉ mục, nén snapshot, ...) trong thread pool I/O
+
+    Ví dụ:
+        text = await run_blocking(read_data_file, path)
+    """
+    MetricsUtil.increment("io_executor_tasks_total")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), partial(func, *args, **kwargs))
+
+
+async def map_blocking(func: Callable[[Any], Any], items: Iterable[Any],
+                       return_exceptions: bool = False) -> List[Any]:
+    """
+    Chạy `func` song song cho từng phần tử (giới hạn bởi số luồng của pool), giữ nguyên thứ tự
+
+    Args:
+        return_exceptions: True để trả exception của phần tử lỗi thay vì ném ra
+    """
+    return await asyncio.gather(*(run_blocking(func, item) for item in items),
+                                return_exceptions=return_exceptions)
+
+
+def shutdown_io_executor():
+    """
+    Dừng thread pool (khi tắt ứng dụng); lần gọi sau sẽ tạo pool mới
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,250 @@
+"""
+Utility Layer - LLM client dùng chung: connection pool, giới hạn đồng thời, token bucket
+Truy vấn của người dùng (interactive) được ưu tiên hơn trích xuất khi ingestion (background)
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from util.metrics_util import MetricsUtil
+
+# Mức ưu tiên (số nhỏ hơn được phục vụ trước)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Mức ưu tiên của lời gọi LLM trong context hiện tại (mặc định: background)
+_llm_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=PRIORITY_BACKGROUND)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """
+    Đặt mức ưu tiên cho mọi lời gọi LLM phát sinh trong khối lệnh (kể cả task con)
+
+    Ví dụ:
+        with llm_priority(PRIORITY_INTERACTIVE):
+            answer = await rag_service.get_answer(...)
+    """
+    token = _llm_priority.set(priority)
+    try:
+        yield
+    finally:
+        _llm_priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket: nạp `rate` đơn vị mỗi giây, chứa tối đa `capacity` đơn vị
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Số giây cần chờ để có đủ `amount` đơn vị (0 nếu đủ ngay)
+        """
+        self._refill()
+        amount = min(amount, self.capacity)   # yêu cầu lớn hơn dung lượng vẫn chạy được khi bucket đầy
+        return max(0.0, (amount - self.tokens) / self.rate) if self.rate > 0 else 0.0
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMRateLimiter:
+    """
+    Cấp quyền gọi LLM theo thứ tự ưu tiên (FIFO trong cùng mức) khi thỏa cả ba điều kiện:
+    số lời gọi đang chạy < max_concurrency, bucket request còn 1 lượt, bucket token đủ số token ước lượng.
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 500,
+                 tokens_per_minute: float = 200000):
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute / 60.0 * 5))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute / 60.0 * 5)
+        self.in_flight = 0
+        self._waiters = []                 # heap (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int, priority: int = PRIORITY_BACKGROUND):
+        """
+        Chờ tới lượt gọi LLM; giải phóng slot khi thoát khỏi khối lệnh
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), estimated_tokens, future))
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        MetricsUtil.set_gauge(f"llm_waiting{{priority={label}}}", self._count_waiting(priority))
+        started = time.perf_counter()
+        self._pump()
+        try:
+            await future
+        except BaseException:
+            # Bị hủy khi đang chờ: trả slot nếu đã được cấp đúng lúc hủy
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        finally:
+            MetricsUtil.set_gauge(f"llm_waiting{{priority={label}}}", self._count_waiting(priority))
+        MetricsUtil.observe(f"llm_wait_seconds{{priority={label}}}", time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _count_waiting(self, priority: int) -> int:
+        return sum(1 for p, _, _, f in self._waiters if p == priority and not f.done())
+
+    def _release(self):
+        self.in_flight -= 1
+        MetricsUtil.set_gauge("llm_in_flight", self.in_flight)
+        self._pump()
+
+    def _pump(self):
+        """
+        Cấp quyền cho các waiter ở đầu heap khi đủ điều kiện; nếu bucket hết thì hẹn giờ thử lại
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self.in_flight < self.max_concurrency:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():   # waiter đã bị hủy
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+            if wait > 0:
+                MetricsUtil.increment("llm_rate_limited_waits_total")
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            heapq.heappop(self._waiters)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self.in_flight += 1
+            MetricsUtil.set_gauge("llm_in_flight", self.in_flight)
+            future.set_result(None)
+
+    def get_status(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "waiting": sum(1 for *_, f in self._waiters if not f.done()),
+            "request_tokens": round(self.request_bucket.tokens, 2),
+            "llm_tokens": round(self.token_bucket.tokens, 1),
+        }
+
+
+class _SharedHttpClient(httpx.AsyncClient):
+    """
+    httpx client dùng chung cho mọi lời gọi LLM. LightRAG tạo AsyncOpenAI mới và đóng nó
+    sau mỗi lời gọi; aclose() bị vô hiệu để pool kết nối (keep-alive) được giữ lại.
+    """
+
+    async def aclose(self):
+        pass
+
+    async def shutdown(self):
+        await super().aclose()
+
+
+class PooledLLMClient:
+    """
+    Bọc hàm completion của LightRAG (ví dụ gpt_4o_mini_complete):
+    - Dùng chung một httpx connection pool qua `openai_client_configs`
+    - Giới hạn số lời gọi đồng thời và tốc độ request/token bằng LLMRateLimiter
+    - Mức ưu tiên lấy từ context (llm_priority), mặc định background
+    """
+
+    CHARS_PER_TOKEN = 4   # Ước lượng thô số ký tự mỗi token
+
+    def __init__(self, complete_func: Callable[..., Awaitable[str]], max_concurrency: int = 8,
+                 requests_per_minute: float = 500, tokens_per_minute: float = 200000,
+                 expected_output_tokens: int = 512, **default_kwargs):
+        self.complete_func = complete_func
+        self.limiter = LLMRateLimiter(max_concurrency, requests_per_minute, tokens_per_minute)
+        self.expected_output_tokens = expected_output_tokens
+        self.default_kwargs = default_kwargs   # ví dụ base_url, api_key
+        self._http_client: Optional[_SharedHttpClient] = None
+        self._http_loop = None
+
+    def _get_http_client(self) -> _SharedHttpClient:
+        # Pool gắn với event loop; tạo lại nếu loop thay đổi (ví dụ mỗi asyncio.run trong CLI/test)
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_loop is not loop:
+            limits = httpx.Limits(max_connections=self.limiter.max_concurrency,
+                                  max_keepalive_connections=self.limiter.max_concurrency)
+            self._http_client = _SharedHttpClient(limits=limits, timeout=httpx.Timeout(600.0, connect=5.0))
+            self._http_loop = loop
+        return self._http_client
+
+    def estimate_tokens(self, prompt: str, system_prompt: Optional[str], history_messages: Optional[list]) -> int:
+        chars = len(prompt or "") + len(system_prompt or "")
+        chars += sum(len(str(message.get("content", ""))) for message in history_messages or [])
+        return chars // self.CHARS_PER_TOKEN + self.expected_output_tokens
+
+    async def complete(self, prompt: str, system_prompt: Optional[str] = None,
+                       history_messages: Optional[list] = None, **kwargs) -> str:
+        """
+        Cùng chữ ký với gpt_4o_mini_complete để truyền vào LightRAG(llm_model_func=...)
+        """
+        priority = _llm_priority.get()
+        estimated = self.estimate_tokens(prompt, system_prompt, history_messages)
+        call_kwargs = {**self.default_kwargs, **kwargs}
+        client_configs = dict(call_kwargs.pop("openai_client_configs", None) or {})
+        client_configs.setdefault("http_client", self._get_http_client())
+
+        MetricsUtil.increment(f"llm_requests_total{{priority={PRIORITY_NAMES.get(priority, priority)}}}")
+        async with self.limiter.acquire(estimated, priority):
+            result = await self.complete_func(
+                prompt, system_prompt=system_prompt, history_messages=history_messages,
+                openai_client_configs=client_configs, **call_kwargs
+            )
+
+        # Hoàn lại phần token output ước lượng dư (kết quả stream không đo được)
+        if isinstance(result, str):
+            actual_output = len(result) // self.CHARS_PER_TOKEN
+            self.limiter.token_bucket.refund(max(0, self.expected_output_tokens - actual_output))
+        return result
+
+    async def close(self):
+        if self._http_client is not None:
+            await self._http_client.shutdown()
+            self._http_client = None
+
+
+def create_llm_client(complete_func: Callable[..., Awaitable[str]]) -> PooledLLMClient:
+    """
+    Tạo PooledLLMClient với cấu hình từ biến môi trường
+    """
+    return PooledLLMClient(
+        complete_func,
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+        tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+        expected_output_tokens=int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "512")),
+    )
@@ -0,0 +1,236 @@
+"""
+Utility Layer - Backend cục bộ, xác định (deterministic) cho benchmark và test
+Thay thế embedding/LLM/graph storage thật khi cần chạy không mạng, không API key
+"""
+
+import asyncio
+import hashlib
+import json
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from util.vietnamese_tokenizer_util import DEFAULT_TOKENIZER, VietnameseTokenizer
+
+LOCAL_EMBEDDING_DIM = 384
+
+
+@lru_cache(maxsize=262144)
+def _term_bucket(term: str, dim: int) -> tuple:
+    """
+    Băm ổn định (không phụ thuộc PYTHONHASHSEED) một term thành (vị trí, dấu)
+    """
+    digest = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+def hash_embed(texts: List[str], dim: int = LOCAL_EMBEDDING_DIM,
+               tokenizer: VietnameseTokenizer = DEFAULT_TOKENIZER) -> np.ndarray:
+    """
+    Embedding kiểu feature hashing: mỗi term của tokenizer cộng ±1 vào một chiều,
+    sau đó chuẩn hóa L2. Cùng văn bản luôn cho cùng vector.
+
+    Returns:
+        Mảng float32[len(texts), dim]
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for term in tokenizer.terms(text):
+            column, sign = _term_bucket(term, dim)
+            vectors[row, column] += sign
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+async def local_embed(texts: List[str]) -> np.ndarray:
+    """
+    Hàm embedding bất đồng bộ cùng dạng với openai_embed (list[str] -> ndarray)
+    """
+    return hash_embed(texts)
+
+
+class FakeCompletionServer:
+    """
+    Server HTTP tối giản giả lập endpoint /v1/chat/completions của OpenAI (hỗ trợ keep-alive).
+    Ghi lại số kết nối TCP, số request và số request chạy đồng thời tối đa để kiểm thử LLM client.
+
+    Ví dụ:
+        server = FakeCompletionServer(delay=0.05)
+        await server.start()
+        ... gọi LLM với base_url=server.base_url ...
+        await server.stop()
+    """
+
+    def __init__(self, delay: float = 0.0, reply: str = "ok"):
+        self.delay = delay
+        self.reply = reply
+        self.connections = 0
+        self.requests = []          # prompt của từng request theo thứ tự server nhận
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    messages = json.loads(body or b"{}").get("messages", [])
+                    self.requests.append(messages[-1]["content"] if messages else "")
+                    await asyncio.sleep(self.delay)
+                finally:
+                    self.in_flight -= 1
+
+                payload = json.dumps({
+                    "id": "chatcmpl-local", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": self.reply}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }).encode("utf-8")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             + f"Content-Length: {len(payload)}\r\n\r\n".encode("ascii") + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+class LocalGraphStorage:
+    """
+    Graph storage trong bộ nhớ thay cho Neo4JStorage khi benchmark/test (đồ thị vô hướng).
+    Cùng các phương thức đọc/ghi mà truy vấn LightRAG dùng; mỗi lời gọi tính là một round-trip
+    (batch = một truy vấn UNWIND như Neo4j) và có thể chờ `latency` giây để mô phỏng độ trễ mạng.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.nodes: Dict[str, dict] = {}
+        self.edges: Dict[tuple, dict] = {}       # khóa (a, b) đã sắp xếp
+        self.adjacency: Dict[str, set] = {}
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @staticmethod
+    def _edge_key(src: str, tgt: str) -> tuple:
+        return (src, tgt) if src <= tgt else (tgt, src)
+
+    async def initialize(self):
+        pass
+
+    async def finalize(self):
+        pass
+
+    async def index_done_callback(self):
+        pass
+
+    async def has_node(self, node_id: str) -> bool:
+        await self._round_trip()
+        return node_id in self.nodes
+
+    async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
+        await self._round_trip()
+        return self._edge_key(source_node_id, target_node_id) in self.edges
+
+    async def get_node(self, node_id: str) -> Optional[dict]:
+        await self._round_trip()
+        node = self.nodes.get(node_id)
+        return dict(node) if node is not None else None
+
+    async def get_nodes_batch(self, node_ids: List[str]) -> Dict[str, dict]:
+        await self._round_trip()
+        return {node_id: dict(self.nodes[node_id]) for node_id in node_ids if node_id in self.nodes}
+
+    async def node_degree(self, node_id: str) -> int:
+        await self._round_trip()
+        return len(self.adjacency.get(node_id, ()))
+
+    async def node_degrees_batch(self, node_ids: List[str]) -> Dict[str, int]:
+        await self._round_trip()
+        return {node_id: len(self.adjacency.get(node_id, ())) for node_id in node_ids}
+
+    async def edge_degree(self, src_id: str, tgt_id: str) -> int:
+        degrees = await self.node_degrees_batch([src_id, tgt_id])
+        return degrees[src_id] + degrees[tgt_id]
+
+    async def edge_degrees_batch(self, edge_pairs: List[tuple]) -> Dict[tuple, int]:
+        degrees = await self.node_degrees_batch(list({node_id for pair in edge_pairs for node_id in pair}))
+        return {(src, tgt): degrees[src] + degrees[tgt] for src, tgt in edge_pairs}
+
+    async def get_edge(self, source_node_id: str, target_node_id: str) -> Optional[dict]:
+        await self._round_trip()
+        edge = self.edges.get(self._edge_key(source_node_id, target_node_id))
+        return dict(edge) if edge is not None else None
+
+    async def get_edges_batch(self, pairs: List[dict]) -> Dict[tuple, dict]:
+        await self._round_trip()
+        result = {}
+        for pair in pairs:
+            edge = self.edges.get(self._edge_key(pair["src"], pair["tgt"]))
+            if edge is not None:
+                result[(pair["src"], pair["tgt"])] = dict(edge)
+        return result
+
+    async def get_node_edges(self, source_node_id: str) -> Optional[list]:
+        await self._round_trip()
+        if source_node_id not in self.nodes:
+            return None
+        return [(source_node_id, neighbor) for neighbor in sorted(self.adjacency.get(source_node_id, ()))]
+
+    async def get_nodes_edges_batch(self, node_ids: List[str]) -> Dict[str, list]:
+        await self._round_trip()
+        return {node_id: [(node_id, neighbor) for neighbor in sorted(self.adjacency.get(node_id, ()))]
+                for node_id in node_ids}
+
+    async def upsert_node(self, node_id: str, node_data: dict):
+        await self._round_trip()
+        self.nodes[node_id] = dict(node_data)
+        self.adjacency.setdefault(node_id, set())
+
+    async def upsert_edge(self, source_node_id: str, target_node_id: str, edge_data: dict):
+        await self._round_trip()
+        for node_id in (source_node_id, target_node_id):
+            self.nodes.setdefault(node_id, {"entity_id": node_id})
+            self.adjacency.setdefault(node_id, set())
+        self.edges[self._edge_key(source_node_id, target_node_id)] = dict(edge_data)
+        self.adjacency[source_node_id].add(target_node_id)
+        self.adjacency[target_node_id].add(source_node_id)
+
+    async def delete_node(self, node_id: str):
+        await self._round_trip()
+        self.nodes.pop(node_id, None)
+        for neighbor in self.adjacency.pop(node_id, set()):
+            self.adjacency[neighbor].discard(node_id)
+            self.edges.pop(self._edge_key(node_id, neighbor), None)
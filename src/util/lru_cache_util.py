@@ -0,0 +1,150 @@
+"""
+Utility Layer - Bộ nhớ đệm LRU giới hạn theo dung lượng
+Dùng chung cho các cache trong bộ nhớ (corpus đã tải, ...)
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+
+class SizedLRUCache:
+    """
+    Cache LRU giới hạn theo tổng kích thước (bytes) và/hoặc số phần tử.
+    Khi vượt giới hạn, phần tử ít được dùng gần đây nhất bị loại trước,
+    bỏ qua các phần tử mà `can_evict` trả về False (ví dụ: đang được sử dụng).
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, max_items: Optional[int] = None,
+                 can_evict: Optional[Callable[[Hashable, Any], bool]] = None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.can_evict = can_evict
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> List[Hashable]:
+        """
+        Danh sách khóa theo thứ tự từ ít dùng nhất đến mới dùng nhất
+        """
+        return list(self._entries.keys())
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Lấy giá trị và đánh dấu là vừa được sử dụng
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Lấy giá trị mà không đánh dấu là vừa được sử dụng và không tính vào thống kê hit/miss
+        (dùng cho đọc trạng thái, không phải truy cập thật)
+        """
+        entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> List[Tuple[Hashable, Any]]:
+        """
+        Thêm hoặc cập nhật một phần tử
+
+        Args:
+            key: Khóa
+            value: Giá trị
+            size: Kích thước ước lượng (bytes)
+
+        Returns:
+            Danh sách (khóa, giá trị) đã bị loại để caller dọn dẹp tài nguyên
+        """
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+        return self._evict(protect=key)
+
+    def resize(self, key: Hashable, size: int) -> List[Tuple[Hashable, Any]]:
+        """
+        Cập nhật kích thước của một phần tử đã có (ví dụ sau khi tải xong dữ liệu)
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return []
+        self.total_bytes += size - entry[1]
+        self._entries[key] = (entry[0], size)
+        return self._evict(protect=key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Xóa một phần tử khỏi cache
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.total_bytes -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        """
+        Xóa toàn bộ cache
+        """
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _over_limit(self) -> bool:
+        if self.max_items is not None and len(self._entries) > self.max_items:
+            return True
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            return True
+        return False
+
+    def _evict(self, protect: Hashable = None) -> List[Tuple[Hashable, Any]]:
+        """
+        Loại các phần tử LRU cho đến khi nằm trong giới hạn
+        """
+        evicted = []
+        if not self._over_limit():
+            return evicted
+
+        for key in list(self._entries.keys()):
+            if not self._over_limit():
+                break
+            if key == protect:
+                continue
+            value, size = self._entries[key]
+            if self.can_evict is not None and not self.can_evict(key, value):
+                continue
+            del self._entries[key]
+            self.total_bytes -= size
+            self.evictions += 1
+            evicted.append((key, value))
+        return evicted
+
+    def get_stats(self) -> dict:
+        """
+        Thống kê hoạt động của cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._entries),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,456 @@
+"""
+Utility Layer - Chỉ mục metadata của chunk: file nguồn, mục JSON (path) và ngày tháng -> chunk id
+Truy vấn có bộ lọc chỉ chấm điểm (vector/từ khóa) trên các chunk khớp bộ lọc thay vì toàn corpus
+"""
+
+import bisect
+import contextvars
+import functools
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from util.io_util import map_blocking
+from util.metrics_util import MetricsUtil
+
+METADATA_INDEX_FILE = "metadata_index.json"   # Nằm trong working_dir nên được đóng gói vào snapshot
+METADATA_INDEX_VERSION = 2                    # 2: path của dòng đầu chunk bị cắt giữa dòng không còn thành mục giả
+SOURCE_HEADER = "=== Data từ {} ==="           # Dòng đầu mỗi file trong văn bản dự phòng
+
+FILTER_FIELDS = ("source_file", "section", "date_from", "date_to")   # Tên tham số của MetadataIndex.candidates
+
+_SOURCE_HEADER_RE = re.compile(r"^=== Data từ (.+?) ===")
+_JSON_LINE_RE = re.compile(r"^([A-Za-z_]\w*(?:\[\d+\])*(?:\.\w+(?:\[\d+\])*)*): ", re.MULTILINE)
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_YEAR_RE = re.compile(r"(?<![\d-])(1\d{3}|20\d{2})(?![\d-])")
+_DATE_FILTER_RE = re.compile(r"\d{4}(-\d{2}(-\d{2})?)?")
+
+# Tập chunk id được phép trong context hiện tại (None = không lọc), đặt bởi restrict_chunks
+_allowed_chunks: contextvars.ContextVar = contextvars.ContextVar("allowed_chunks", default=None)
+
+
+def json_sections(path: str) -> Set[str]:
+    """
+    Các mục (tiền tố path) chứa một dòng "path: value" của convert_json_to_text
+
+    Ví dụ:
+        "than_can.cac_tuong_than_can[3].ten" -> {"than_can", "than_can.cac_tuong_than_can",
+        "than_can.cac_tuong_than_can[3]", "than_can.cac_tuong_than_can[3].ten", "than_can.cac_tuong_than_can.ten"}
+    """
+    sections = set()
+    exact, plain = [], []
+    for segment in path.split("."):
+        exact.append(segment)
+        plain.append(segment.split("[", 1)[0])
+        sections.add(".".join(exact))
+        sections.add(".".join(plain))
+        if "[" in segment:
+            sections.add(".".join(exact[:-1] + [plain[-1]]))
+    return sections
+
+
+def extract_dates(text: str) -> List[Tuple[str, str]]:
+    """
+    Các khoảng ngày (ISO) nhắc tới trong văn bản: "1805-12-02" -> (1805-12-02, 1805-12-02),
+    năm đứng riêng "năm 1805" -> (1805-01-01, 1805-12-31)
+    """
+    dates = {(match.group(0), match.group(0)) for match in _ISO_DATE_RE.finditer(text)}
+    dates.update((f"{year}-01-01", f"{year}-12-31") for year in _YEAR_RE.findall(text))
+    return sorted(dates)
+
+
+def json_roots(path: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Các khóa cấp cao của file JSON nguồn (None nếu không đọc được hoặc không phải object).
+    Kết quả được nhớ theo (đường dẫn, mtime, kích thước): mỗi file chỉ đọc lại khi thay đổi.
+    """
+    if not path or not path.endswith(".json"):
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return _json_roots(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=64)
+def _json_roots(path: str, mtime_ns: int, size: int) -> Optional[FrozenSet[str]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return frozenset(data) if isinstance(data, dict) else None
+
+
+def _anchor_path(path: str, roots: FrozenSet[str], first_line: bool) -> Optional[str]:
+    """
+    Giữ path nếu đoạn đầu là khóa cấp cao của file nguồn. Dòng đầu của chunk có thể bị cắt giữa
+    định danh ("can.cac_tuong..." cắt từ "than_can.cac_tuong..."): khôi phục nếu đúng một khóa cấp cao
+    kết thúc bằng phần còn lại, ngược lại bỏ dòng đó
+    """
+    root = path.split(".", 1)[0].split("[", 1)[0]
+    if root in roots:
+        return path
+    if first_line:
+        matches = [key for key in roots if key.endswith(root)]
+        if len(matches) == 1:
+            return matches[0] + path[len(root):]
+    return None
+
+
+def extract_metadata(text: str, source: Optional[str], roots: Optional[FrozenSet[str]] = None,
+                     starts_at_line: bool = True) -> dict:
+    """
+    Metadata của một chunk: tên file nguồn, các mục JSON (chỉ với file .json) và các khoảng ngày
+
+    Args:
+        roots: Khóa cấp cao của file JSON nguồn (xem json_roots); chỉ nhận path bắt đầu bằng một khóa này
+        starts_at_line: False nếu chunk có thể bắt đầu giữa dòng (chunk cắt theo token của LightRAG):
+                        khi không biết `roots`, dòng đầu bị bỏ qua vì path của nó có thể đã bị cắt
+    """
+    source = os.path.basename(source) if source else None
+    sections = set()
+    if source and source.endswith(".json"):
+        for match in _JSON_LINE_RE.finditer(text):
+            path, first_line = match.group(1), match.start() == 0
+            if roots is not None:
+                path = _anchor_path(path, roots, first_line)
+            elif first_line and not starts_at_line:
+                path = None
+            if path is not None:
+                sections.update(json_sections(path))
+    return {"source": source, "sections": sorted(sections), "dates": extract_dates(text)}
+
+
+def normalize_date_bound(value: Optional[str], upper: bool) -> Optional[str]:
+    """
+    "1805" -> "1805-01-01" (cận dưới) hoặc "1805-12-31" (cận trên); "1805-06" -> "1805-06-01"/"1805-06-31"
+
+    Raises:
+        ValueError: Nếu không phải dạng YYYY, YYYY-MM hoặc YYYY-MM-DD
+    """
+    if value is None:
+        return None
+    if not _DATE_FILTER_RE.fullmatch(value):
+        raise ValueError(f"Invalid date filter {value!r}: expected YYYY, YYYY-MM or YYYY-MM-DD")
+    suffix = "-12-31" if upper else "-01-01"
+    return value + suffix[len(value) - 4:]
+
+
+class MetadataIndex:
+    """
+    Chỉ mục ngược từ metadata tới chunk id:
+    - "source:<tên file>" và "section:<path JSON>" -> tập chunk id
+    - Khoảng ngày của từng chunk sắp theo ngày bắt đầu, tra bằng bisect
+
+    Chunk id là khóa bất kỳ: chunk id của LightRAG ("chunk-...") hoặc id đoạn văn của FallbackIndex.
+    """
+
+    def __init__(self):
+        self._chunks: Dict[Hashable, dict] = {}
+        self._postings: Dict[str, Set[Hashable]] = {}
+        self._date_starts: List[str] = []
+        self._date_entries: List[Tuple[str, str, Hashable]] = []   # (bắt đầu, kết thúc, chunk id)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __contains__(self, chunk_id: Hashable) -> bool:
+        return chunk_id in self._chunks
+
+    def add(self, chunk_id: Hashable, text: str, source: Optional[str], roots: Optional[FrozenSet[str]] = None,
+            starts_at_line: bool = True):
+        """
+        Thêm (hoặc thay thế) metadata của một chunk (xem extract_metadata)
+        """
+        self.add_metadata(chunk_id, extract_metadata(text, source, roots, starts_at_line))
+
+    def add_metadata(self, chunk_id: Hashable, metadata: dict):
+        if chunk_id in self._chunks:
+            self.remove([chunk_id])
+        self._chunks[chunk_id] = metadata
+        for key in self._keys(metadata):
+            self._postings.setdefault(key, set()).add(chunk_id)
+        for start, end in metadata["dates"]:
+            position = bisect.bisect_right(self._date_starts, start)
+            self._date_starts.insert(position, start)
+            self._date_entries.insert(position, (start, end, chunk_id))
+
+    def remove(self, chunk_ids: Iterable[Hashable]):
+        removed = set()
+        for chunk_id in chunk_ids:
+            metadata = self._chunks.pop(chunk_id, None)
+            if metadata is None:
+                continue
+            removed.add(chunk_id)
+            for key in self._keys(metadata):
+                posting = self._postings.get(key)
+                if posting is not None:
+                    posting.discard(chunk_id)
+                    if not posting:
+                        del self._postings[key]
+        if removed and self._date_entries:
+            self._date_entries = [entry for entry in self._date_entries if entry[2] not in removed]
+            self._date_starts = [entry[0] for entry in self._date_entries]
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def _keys(metadata: dict) -> List[str]:
+        keys = [f"section:{section}" for section in metadata["sections"]]
+        if metadata["source"]:
+            keys.append(f"source:{metadata['source']}")
+        return keys
+
+    def candidates(self, source_file: Optional[str] = None, section: Optional[str] = None,
+                   date_from: Optional[str] = None, date_to: Optional[str] = None) -> Optional[FrozenSet[Hashable]]:
+        """
+        Tập chunk id khớp mọi bộ lọc được truyền (giao của các điều kiện)
+
+        Args:
+            source_file: Tên file nguồn (ví dụ "data.json")
+            section: Path JSON, có hoặc không có chỉ số (ví dụ "tran_chien_lon", "tran_chien_lon[2]")
+            date_from, date_to: Chunk nhắc tới ít nhất một ngày giao với khoảng [date_from, date_to]
+
+        Returns:
+            frozenset chunk id, hoặc None nếu không có bộ lọc nào
+        """
+        lower = normalize_date_bound(date_from, upper=False)
+        upper = normalize_date_bound(date_to, upper=True)
+        result: Optional[Set[Hashable]] = None
+
+        for key in ([f"source:{os.path.basename(source_file)}"] if source_file else []) + \
+                   ([f"section:{section.strip('.')}"] if section else []):
+            posting = self._postings.get(key, set())
+            result = set(posting) if result is None else result & posting
+
+        if lower is not None or upper is not None:
+            # Chỉ duyệt các khoảng bắt đầu trước cận trên
+            stop = bisect.bisect_right(self._date_starts, upper) if upper is not None else len(self._date_starts)
+            matched = {chunk_id for _, end, chunk_id in self._date_entries[:stop]
+                       if lower is None or end >= lower}
+            result = matched if result is None else result & matched
+
+        return frozenset(result) if result is not None else None
+
+    def summary(self) -> dict:
+        """
+        Các giá trị lọc hiện có (để người dùng biết nên lọc theo gì)
+        """
+        sources = sorted(key[7:] for key in self._postings if key.startswith("source:"))
+        sections = sorted(key[8:] for key in self._postings
+                          if key.startswith("section:") and "." not in key and "[" not in key)
+        return {
+            "chunks": len(self._chunks),
+            "sources": sources,
+            "top_sections": sections,
+            "date_range": [self._date_starts[0], max(end for _, end, _ in self._date_entries)]
+            if self._date_entries else None,
+        }
+
+    def save(self, path: str):
+        """
+        Ghi chỉ mục ra file JSON (ghi file tạm rồi đổi tên)
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = {
+            "version": METADATA_INDEX_VERSION,
+            "chunks": [[chunk_id, metadata] for chunk_id, metadata in self._chunks.items()],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex":
+        """
+        Nạp chỉ mục đã lưu; file thiếu, hỏng hoặc khác phiên bản cho chỉ mục rỗng
+        """
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get("version") != METADATA_INDEX_VERSION:
+            return index
+        for chunk_id, metadata in data.get("chunks", []):
+            metadata["dates"] = [tuple(date) for date in metadata["dates"]]
+            index.add_metadata(chunk_id, metadata)
+        return index
+
+    @classmethod
+    def from_paragraphs(cls, paragraphs: Iterable[str]) -> "MetadataIndex":
+        """
+        Chỉ mục cho các đoạn văn của văn bản dự phòng (id = thứ tự đoạn văn).
+        File nguồn lấy từ dòng SOURCE_HEADER đứng đầu đoạn văn đầu tiên của mỗi file.
+        """
+        index = cls()
+        source = None
+        for paragraph_id, paragraph in enumerate(paragraphs):
+            header = _SOURCE_HEADER_RE.match(paragraph)
+            if header:
+                source = header.group(1)
+            index.add(paragraph_id, paragraph, source)
+        return index
+
+
+@contextmanager
+def restrict_chunks(chunk_ids: Optional[Iterable[Hashable]]):
+    """
+    Giới hạn mọi truy vấn chunk (vector và đọc text chunk) phát sinh trong khối lệnh vào `chunk_ids`
+
+    Ví dụ:
+        with restrict_chunks(index.candidates(section="tran_chien_lon")):
+            answer = await rag.aquery(question, param=query_param)
+    """
+    token = _allowed_chunks.set(frozenset(chunk_ids) if chunk_ids is not None else None)
+    try:
+        yield
+    finally:
+        _allowed_chunks.reset(token)
+
+
+def allowed_chunks() -> Optional[FrozenSet[Hashable]]:
+    return _allowed_chunks.get()
+
+
+class MetadataIndexedVectorStorage:
+    """
+    Bọc chunks_vdb của LightRAG:
+    - upsert/delete cập nhật MetadataIndex (chunk mới khi ingestion được đánh chỉ mục metadata ngay)
+    - index_done_callback lưu MetadataIndex cạnh các file chỉ mục khác trong working_dir
+    - query trong restrict_chunks chỉ lấy vector của các chunk được phép và chấm điểm cosine trên
+      tập đó, thay vì tìm trên toàn bộ chỉ mục rồi lọc
+    Các thuộc tính/phương thức khác được chuyển thẳng tới storage gốc.
+    """
+
+    def __init__(self, storage: Any, index: MetadataIndex, path: Optional[str] = None):
+        self._storage = storage
+        self.index = index
+        self.path = path
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._storage, name)
+
+    @property
+    def storage(self) -> Any:
+        return self._storage
+
+    async def upsert(self, data: Dict[str, dict]):
+        result = await self._storage.upsert(data)
+        # Chunk của LightRAG cắt theo token nên có thể bắt đầu giữa dòng: đối chiếu path với khóa cấp cao
+        # của file JSON nguồn (đọc một lần cho mỗi file, ngoài event loop)
+        sources = sorted({record.get("file_path") for record in data.values()
+                          if "content" in record and (record.get("file_path") or "").endswith(".json")})
+        roots = dict(zip(sources, await map_blocking(json_roots, sources)))
+        for chunk_id, record in data.items():
+            if "content" in record:
+                source = record.get("file_path")
+                self.index.add(chunk_id, record["content"], source, roots.get(source), starts_at_line=False)
+        return result
+
+    async def delete(self, ids: List[str]):
+        result = await self._storage.delete(ids)
+        self.index.remove(ids)
+        return result
+
+    async def drop(self, *args, **kwargs):
+        result = await self._storage.drop(*args, **kwargs)
+        self.index.clear()
+        return result
+
+    async def index_done_callback(self, *args, **kwargs):
+        result = await self._storage.index_done_callback(*args, **kwargs)
+        if self.path:
+            self.index.save(self.path)
+        return result
+
+    async def query(self, query: str, top_k: int, query_embedding: Optional[List[float]] = None) -> List[dict]:
+        allowed = allowed_chunks()
+        if allowed is None:
+            return await self._storage.query(query, top_k, query_embedding=query_embedding)
+
+        MetricsUtil.increment("metadata_filtered_queries_total")
+        MetricsUtil.observe("metadata_filter_candidates", len(allowed))
+        vectors = await self._storage.get_vectors_by_ids(sorted(allowed)) if allowed else {}
+        if not vectors:
+            return []
+
+        # Cosine giữa câu hỏi và các chunk ứng viên
+        if query_embedding is None:
+            query_embedding = (await self._storage.embedding_func([query]))[0]
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        chunk_ids = list(vectors)
+        matrix = np.asarray([vectors[chunk_id] for chunk_id in chunk_ids], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        similarities = matrix @ query_vector
+
+        threshold = getattr(self._storage, "cosine_better_than_threshold", 0.0)
+        order = [i for i in np.argsort(-similarities)[:top_k] if similarities[i] >= threshold]
+        records = await self._storage.get_by_ids([chunk_ids[i] for i in order])
+        return [
+            {**record, "distance": float(similarities[i])}
+            for i, record in zip(order, records) if record
+        ]
+
+
+class FilteredChunkStorage:
+    """
+    Bọc text_chunks (KV) của LightRAG: trong restrict_chunks, chunk không được phép được trả về None
+    (và không đọc từ storage), nên chunk lấy qua entity/quan hệ của đồ thị cũng bị lọc
+    """
+
+    def __init__(self, storage: Any):
+        self._storage = storage
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._storage, name)
+
+    @property
+    def storage(self) -> Any:
+        return self._storage
+
+    async def get_by_ids(self, ids: List[str]) -> List[Optional[dict]]:
+        allowed = allowed_chunks()
+        if allowed is None:
+            return await self._storage.get_by_ids(ids)
+        permitted = [chunk_id for chunk_id in ids if chunk_id in allowed]
+        records = dict(zip(permitted, await self._storage.get_by_ids(permitted))) if permitted else {}
+        return [records.get(chunk_id) for chunk_id in ids]
+
+    async def get_by_id(self, id: str) -> Optional[dict]:
+        allowed = allowed_chunks()
+        if allowed is not None and id not in allowed:
+            return None
+        return await self._storage.get_by_id(id)
+
+
+def attach_metadata_index(rag: Any, working_dir: str) -> MetadataIndex:
+    """
+    Gắn MetadataIndex vào LightRAG (trước initialize_storages): nạp chỉ mục đã lưu trong working_dir
+    và bọc chunks_vdb/text_chunks để cập nhật chỉ mục khi ingestion và lọc khi truy vấn
+    """
+    if isinstance(rag.chunks_vdb, MetadataIndexedVectorStorage):
+        return rag.chunks_vdb.index
+    path = os.path.join(working_dir, METADATA_INDEX_FILE)
+    index = MetadataIndex.load(path)
+    rag.chunks_vdb = MetadataIndexedVectorStorage(rag.chunks_vdb, index, path)
+    rag.text_chunks = FilteredChunkStorage(rag.text_chunks)
+    return index
+
+
+def find_metadata_index(rag: Any) -> Optional[MetadataIndex]:
+    """
+    MetadataIndex đã gắn vào LightRAG (None nếu chưa gắn, ví dụ RAG giả khi test)
+    """
+    storage = getattr(rag, "chunks_vdb", None)
+    return storage.index if isinstance(storage, MetadataIndexedVectorStorage) else None
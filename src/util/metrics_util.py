@@ -0,0 +1,115 @@
+"""
+Utility Layer - Thu thập số liệu vận hành (metrics) trong bộ nhớ
+Cung cấp counters, gauges và histograms đơn giản cho endpoint /metrics
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class MetricsUtil:
+    """
+    Lớp tiện ích lưu metrics của tiến trình hiện tại
+    Nhãn (label) được mã hóa trực tiếp vào tên, ví dụ: query_rejected_total{reason=queue_full}
+    """
+
+    _lock = threading.Lock()
+    _counters: Dict[str, float] = {}
+    _gauges: Dict[str, float] = {}
+    _histograms: Dict[str, dict] = {}
+
+    # Số mẫu gần nhất giữ lại cho mỗi histogram để tính percentile
+    MAX_SAMPLES = 1024
+
+    @staticmethod
+    def increment(name: str, value: float = 1.0):
+        """
+        Tăng giá trị của một counter
+        """
+        with MetricsUtil._lock:
+            MetricsUtil._counters[name] = MetricsUtil._counters.get(name, 0.0) + value
+
+    @staticmethod
+    def set_gauge(name: str, value: float):
+        """
+        Đặt giá trị hiện tại của một gauge
+        """
+        with MetricsUtil._lock:
+            MetricsUtil._gauges[name] = value
+
+    @staticmethod
+    def observe(name: str, value: float):
+        """
+        Ghi nhận một mẫu cho histogram (độ trễ, kích thước batch, ...)
+        """
+        with MetricsUtil._lock:
+            histogram = MetricsUtil._histograms.get(name)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "max": value, "samples": deque(maxlen=MetricsUtil.MAX_SAMPLES)}
+                MetricsUtil._histograms[name] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["samples"].append(value)
+
+    @staticmethod
+    def get_counter(name: str) -> float:
+        """
+        Lấy giá trị hiện tại của một counter (0 nếu chưa có)
+        """
+        with MetricsUtil._lock:
+            return MetricsUtil._counters.get(name, 0.0)
+
+    @staticmethod
+    def snapshot() -> dict:
+        """
+        Chụp lại toàn bộ metrics hiện tại
+
+        Returns:
+            dict: counters, gauges và tóm tắt histograms (count, avg, p50, p95, p99, max)
+        """
+        with MetricsUtil._lock:
+            histograms = {
+                name: MetricsUtil._summarize(histogram)
+                for name, histogram in MetricsUtil._histograms.items()
+            }
+            return {
+                "counters": dict(MetricsUtil._counters),
+                "gauges": dict(MetricsUtil._gauges),
+                "histograms": histograms,
+            }
+
+    @staticmethod
+    def reset():
+        """
+        Xóa toàn bộ metrics (dùng trong test)
+        """
+        with MetricsUtil._lock:
+            MetricsUtil._counters.clear()
+            MetricsUtil._gauges.clear()
+            MetricsUtil._histograms.clear()
+
+    @staticmethod
+    def _summarize(histogram: dict) -> dict:
+        """
+        Tóm tắt một histogram thành các giá trị thống kê
+        """
+        samples: Deque[float] = histogram["samples"]
+        ordered = sorted(samples)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+            return ordered[index]
+
+        count = histogram["count"]
+        return {
+            "count": count,
+            "avg": histogram["sum"] / count if count else 0.0,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": histogram["max"],
+        }
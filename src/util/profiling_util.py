@@ -0,0 +1,145 @@
+"""
+Utility Layer - Profiler lấy mẫu cho từng request (opt-in)
+Lấy mẫu stack của thread chạy event loop theo chu kỳ, lưu dạng "collapsed stack"
+(dùng được với flamegraph.pl, speedscope, ...)
+"""
+
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from util.metrics_util import MetricsUtil
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu chạy trên một thread phụ:
+    mỗi `interval` giây đọc stack hiện tại của thread mục tiêu qua sys._current_frames()
+    và đếm số lần mỗi stack xuất hiện. Chi phí chỉ phát sinh khi đang profile.
+
+    Lưu ý: event loop dùng chung cho mọi request nên mẫu có thể chứa cả công việc
+    của các request khác chạy xen kẽ trong cùng thời gian.
+    """
+
+    def __init__(self, interval: float = 0.005, target_thread_id: Optional[int] = None):
+        self.interval = interval
+        self.target_thread_id = target_thread_id or threading.get_ident()
+        self.samples: Counter = Counter()
+        self.started_at: Optional[float] = None
+        self.duration: float = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample_loop(self):
+        own_file = __file__
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != own_file:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - (self.started_at or time.perf_counter())
+
+    def collapsed(self) -> str:
+        """
+        Kết quả dạng collapsed stack: mỗi dòng "frame1;frame2;... số_mẫu"
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def top_functions(self, limit: int = 10) -> list:
+        """
+        Các frame lá (self time) xuất hiện nhiều nhất
+        """
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": frame, "samples": count, "percent": round(100.0 * count / total, 1)}
+                for frame, count in leaves.most_common(limit)]
+
+
+class ProfilingUtil:
+    """
+    Quản lý các profile theo request: chạy profiler, lưu file, đọc lại theo id.
+    Mỗi thời điểm chỉ profile một request để chi phí lấy mẫu không cộng dồn.
+    """
+
+    enabled: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    output_dir: str = os.getenv("PROFILE_DIR", "./logs/profiles")
+    interval: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+    _active_lock = threading.Lock()
+
+    @classmethod
+    def start(cls) -> Optional[SamplingProfiler]:
+        """
+        Bắt đầu profile request hiện tại; None nếu bị tắt hoặc đang profile request khác
+        """
+        if not cls.enabled or not cls._active_lock.acquire(blocking=False):
+            MetricsUtil.increment("profile_skipped_total")
+            return None
+        profiler = SamplingProfiler(cls.interval)
+        profiler.start()
+        return profiler
+
+    @classmethod
+    def finish(cls, profiler: SamplingProfiler, trace_id: Optional[str] = None) -> dict:
+        """
+        Dừng profiler, lưu file collapsed stack và trả về tóm tắt
+
+        Returns:
+            dict: profile_id, duration_ms, samples, top (frame lá nhiều mẫu nhất), path
+        """
+        try:
+            profiler.stop()
+        finally:
+            cls._active_lock.release()
+
+        profile_id = trace_id or secrets.token_hex(16)
+        path = os.path.join(cls.output_dir, f"{profile_id}.collapsed")
+        try:
+            os.makedirs(cls.output_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.collapsed())
+        except OSError as e:
+            print(f"Failed to store profile {profile_id}: {e}")
+            path = None
+
+        MetricsUtil.increment("profile_captured_total")
+        return {
+            "profile_id": profile_id,
+            "duration_ms": round(profiler.duration * 1000, 2),
+            "samples": sum(profiler.samples.values()),
+            "top": profiler.top_functions(),
+            "path": path,
+        }
+
+    @classmethod
+    def load(cls, profile_id: str) -> Optional[str]:
+        """
+        Đọc profile đã lưu (collapsed stack) theo id; None nếu không có
+        """
+        if not profile_id.isalnum():
+            return None
+        path = os.path.join(cls.output_dir, f"{profile_id}.collapsed")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
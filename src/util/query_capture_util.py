@@ -0,0 +1,168 @@
+"""
+Utility Layer - Ghi lại lưu lượng /query (opt-in) ra file JSONL xoay vòng theo kích thước
+Dùng làm đầu vào cho công cụ replay (benchmarks/replay_queries.py) để so sánh hai bản build
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+
+def answer_digest(answer: Optional[str]) -> Optional[str]:
+    """
+    Mã băm ngắn của câu trả lời để so sánh giữa các bản build mà không cần lưu toàn văn
+    """
+    if answer is None:
+        return None
+    return hashlib.sha1(answer.encode("utf-8")).hexdigest()[:16]
+
+
+class QueryCaptureLog:
+    """
+    Ghi mỗi truy vấn thành một dòng JSON: thời điểm, câu hỏi, mode, top_k, corpus,
+    mã HTTP, độ trễ, nguồn câu trả lời (rag/fallback/no-data) và mã băm câu trả lời.
+
+    Khi file vượt `max_bytes`, file hiện tại được đổi tên thành `<path>.1`, `<path>.1` thành `<path>.2`, ...
+    (giữ tối đa `backup_count` file cũ), giống logging.handlers.RotatingFileHandler.
+    Không có `path` thì không ghi gì (tắt).
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 5, include_answers: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.include_answers = include_answers   # Lưu toàn văn câu trả lời (file lớn hơn nhiều)
+        self.records_written = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, question: str, mode: str, top_k: int, corpus_id: str, status: int,
+               latency_ms: float, started_at: Optional[float] = None, answer: Optional[str] = None,
+               answer_source: Optional[str] = None, trace_id: Optional[str] = None,
+               filters: Optional[dict] = None):
+        """
+        Ghi một truy vấn đã xử lý xong (kể cả khi lỗi)
+
+        Args:
+            started_at: Thời điểm nhận request (epoch giây), dùng để tái tạo nhịp gửi khi replay
+            status: Mã HTTP trả về cho client
+            answer_source: Nguồn câu trả lời do RAGService báo về
+            filters: Bộ lọc metadata của truy vấn (chỉ ghi khi có)
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "ts": round(started_at if started_at is not None else time.time(), 6),
+            "question": question,
+            "mode": mode,
+            "top_k": top_k,
+            "corpus_id": corpus_id,
+            "status": status,
+            "latency_ms": round(latency_ms, 3),
+            "answer_source": answer_source,
+            "answer_sha1": answer_digest(answer),
+            "trace_id": trace_id,
+        }
+        if filters:
+            entry["filters"] = filters
+        if self.include_answers:
+            entry["answer"] = answer
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        data = line.encode("utf-8")
+
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._file = open(self.path, "ab")
+                if self.max_bytes > 0 and self._file.tell() > 0 and self._file.tell() + len(data) > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                self.records_written += 1
+            except OSError as e:
+                print(f"Failed to write query capture {self.path}: {e}")
+
+    def _rotate(self):
+        """
+        Đổi tên file hiện tại thành <path>.1 và đẩy các bản cũ lùi một số (gọi khi đang giữ lock)
+        """
+        self._file.close()
+        self._file = None
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def get_status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "records_written": self.records_written,
+        }
+
+    @staticmethod
+    def capture_files(path: str) -> List[str]:
+        """
+        Các file của một capture theo thứ tự thời gian (bản xoay vòng cũ nhất trước, file hiện tại cuối)
+        """
+        backups = []
+        index = 1
+        while os.path.exists(f"{path}.{index}"):
+            backups.append(f"{path}.{index}")
+            index += 1
+        files = list(reversed(backups))
+        if os.path.exists(path):
+            files.append(path)
+        return files
+
+    @classmethod
+    def read(cls, path: str) -> List[dict]:
+        """
+        Đọc toàn bộ capture (kể cả các bản xoay vòng), sắp theo thời điểm nhận request.
+        Dòng hỏng (ví dụ dòng cuối bị cắt khi tiến trình dừng đột ngột) được bỏ qua.
+        """
+        records = []
+        for file_path in cls.capture_files(path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        records.sort(key=lambda record: record.get("ts", 0))
+        return records
+
+
+def create_query_capture() -> QueryCaptureLog:
+    """
+    Tạo QueryCaptureLog từ biến môi trường (QUERY_CAPTURE_PATH rỗng = tắt)
+    """
+    return QueryCaptureLog(
+        os.getenv("QUERY_CAPTURE_PATH") or None,
+        max_bytes=int(float(os.getenv("QUERY_CAPTURE_MAX_MB", "50")) * 1024 * 1024),
+        backup_count=int(os.getenv("QUERY_CAPTURE_BACKUPS", "5")),
+        include_answers=os.getenv("QUERY_CAPTURE_ANSWERS", "false").lower() == "true",
+    )
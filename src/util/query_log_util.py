@@ -0,0 +1,116 @@
+"""
+Utility Layer - Thống kê tần suất câu hỏi (đã chuẩn hóa) để làm nóng cache sau khi deploy
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+
+class QueryFrequencyLog:
+    """
+    Đếm số lần mỗi câu hỏi được hỏi, theo (corpus, mode, top_k, câu hỏi chuẩn hóa).
+    Lưu ra file JSON để giữ được qua các lần khởi động lại; chỉ giữ `max_entries` câu phổ biến nhất.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 5000, save_every: int = 20):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_every = save_every          # Ghi file sau mỗi `save_every` lần ghi nhận
+        self._entries = {}                    # key -> entry dict
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()    # Mỗi lúc một lần ghi file (các lần ghi dùng chung file .tmp)
+        self.load()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """
+        Chuẩn hóa câu hỏi: NFC, chữ thường, gộp khoảng trắng, bỏ dấu câu ở cuối
+        """
+        text = unicodedata.normalize("NFC", question).lower()
+        text = re.sub(r"\s+", " ", text).strip()
+        return text.rstrip(" ?!.")
+
+    def record(self, question: str, mode: str, top_k: int, corpus_id: str) -> bool:
+        """
+        Ghi nhận một câu hỏi đã trả lời thành công (chỉ trong bộ nhớ)
+
+        Returns:
+            bool: True nếu đã đủ `save_every` lần ghi nhận chưa lưu; caller gọi save() ngoài event loop
+        """
+        normalized = self.normalize(question)
+        if not normalized:
+            return False
+        key = json.dumps([corpus_id, mode, top_k, normalized], ensure_ascii=False)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    "question": question.strip(), "normalized": normalized,
+                    "mode": mode, "top_k": top_k, "corpus_id": corpus_id, "count": 0,
+                }
+            entry["count"] += 1
+            entry["last_seen"] = time.time()
+            self._unsaved += 1
+            if len(self._entries) > self.max_entries * 2:
+                self._prune()
+            return self._unsaved >= self.save_every
+
+    def _prune(self):
+        keep = sorted(self._entries.items(), key=lambda item: item[1]["count"], reverse=True)[:self.max_entries]
+        self._entries = dict(keep)
+
+    def top(self, n: int) -> List[dict]:
+        """
+        N câu hỏi phổ biến nhất (hòa thì câu hỏi gần đây hơn trước)
+        """
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        entries.sort(key=lambda entry: (entry["count"], entry.get("last_seen", 0)), reverse=True)
+        return entries[:n]
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Failed to load query log {self.path}: {e}")
+            return
+        with self._lock:
+            for entry in entries:
+                key = json.dumps([entry["corpus_id"], entry["mode"], entry["top_k"], entry["normalized"]],
+                                 ensure_ascii=False)
+                self._entries[key] = entry
+
+    def save(self):
+        """
+        Ghi thống kê ra file (ghi file tạm rồi đổi tên để không hỏng file khi đang ghi).
+        Hàm đồng bộ: từ event loop gọi qua run_blocking. Các lần lưu đồng thời chạy lần lượt.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            # Lấy bản sao dưới lock: record() vẫn cập nhật entry trong lúc đang ghi file
+            with self._lock:
+                if len(self._entries) > self.max_entries:
+                    self._prune()
+                entries = [dict(entry) for entry in self._entries.values()]
+                self._unsaved = 0
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Failed to save query log {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -4,7 +4,9 @@ Chứa logic tìm kiếm văn bản dự phòng và các tiện ích khác
 """
 
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from util.vietnamese_tokenizer_util import DEFAULT_TOKENIZER
 
 
 class TextSearchUtil:
@@ -61,15 +63,16 @@ class TextSearchUtil:
     @staticmethod
     def _extract_tokens(text: str) -> set:
         """
-        Trích xuất các từ từ văn bản
+        Trích xuất các term từ văn bản bằng pipeline tách từ tiếng Việt
+        (NFC, bỏ dấu, lọc stopword, bigram âm tiết)
         
         Args:
             text: Văn bản đầu vào
             
         Returns:
-            Tập hợp các từ đã được chuẩn hóa
+            Tập hợp các term đã được chuẩn hóa
         """
-        return set(re.findall(r"\w+", text.lower()))
+        return set(DEFAULT_TOKENIZER.terms(text))
 
     @staticmethod
     def _score_paragraphs(paragraphs: List[str], question: str) -> List[Tuple[int, str]]:
@@ -159,7 +162,7 @@ class ValidationUtil:
         if not question or not question.strip():
             return False, "Question cannot be empty"
         
-        valid_modes = ["naive", "local", "global", "hybrid", "mix"]
+        valid_modes = ["naive", "local", "global", "hybrid", "mix", "fanout"]
         if mode not in valid_modes:
             return False, f"Invalid mode. Must be one of: {valid_modes}"
         
@@ -168,6 +171,63 @@ class ValidationUtil:
         
         return True, ""
 
+    @staticmethod
+    def validate_corpus_id(corpus_id: str) -> Tuple[bool, str]:
+        """
+        Kiểm tra corpus id (dùng làm tên thư mục nên chỉ cho phép ký tự an toàn)
+        
+        Args:
+            corpus_id: Mã corpus
+            
+        Returns:
+            Tuple (is_valid, error_message)
+        """
+        if not re.fullmatch(r"[a-z0-9][a-z0-9_-]{0,63}", corpus_id or ""):
+            return False, "corpus_id must match [a-z0-9][a-z0-9_-]{0,63}"
+        
+        return True, ""
+
+    @staticmethod
+    def validate_session_id(session_id: str) -> Tuple[bool, str]:
+        """
+        Kiểm tra mã phiên hội thoại do client gửi
+        
+        Args:
+            session_id: Mã phiên
+            
+        Returns:
+            Tuple (is_valid, error_message)
+        """
+        if not re.fullmatch(r"[A-Za-z0-9_-]{1,128}", session_id or ""):
+            return False, "session_id must match [A-Za-z0-9_-]{1,128}"
+        
+        return True, ""
+
+    @staticmethod
+    def validate_filters(section: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> Tuple[bool, str]:
+        """
+        Kiểm tra bộ lọc metadata của truy vấn
+        
+        Args:
+            section: Path JSON (ví dụ "tran_chien_lon" hoặc "than_can.cac_tuong_than_can[0]")
+            date_from: Ngày bắt đầu YYYY, YYYY-MM hoặc YYYY-MM-DD
+            date_to: Ngày kết thúc cùng định dạng
+            
+        Returns:
+            Tuple (is_valid, error_message)
+        """
+        if section is not None and not re.fullmatch(r"\w+(\[\d+\])*(\.\w+(\[\d+\])*)*", section):
+            return False, "section must be a JSON path like 'tran_chien_lon' or 'tran_chien_lon[0].ten'"
+        
+        for name, value in (("date_from", date_from), ("date_to", date_to)):
+            if value is not None and not re.fullmatch(r"\d{4}(-\d{2}(-\d{2})?)?", value):
+                return False, f"{name} must be YYYY, YYYY-MM or YYYY-MM-DD"
+        
+        if date_from is not None and date_to is not None and date_from[:len(date_to)] > date_to:
+            return False, "date_from must not be after date_to"
+        
+        return True, ""
+
 
 class LogUtil:
     """
@@ -0,0 +1,199 @@
+"""
+Utility Layer - Tracing nhẹ, tương thích OpenTelemetry
+Ghi span quanh từng bước xử lý truy vấn; xuất ra file JSONL theo định dạng OTLP/JSON
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from util.metrics_util import MetricsUtil
+
+# Span đang chạy trong context hiện tại (mỗi asyncio task có bản sao riêng)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Một span: tên bước, thời điểm bắt đầu/kết thúc (unix nano), thuộc tính, trạng thái
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start_ns", "end_ns",
+                 "attributes", "status", "root", "children")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], attributes: Optional[dict]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, object] = dict(attributes or {})
+        self.status = "OK"
+        self.root: "Span" = self           # Span gốc của trace
+        self.children: List["Span"] = []   # Chỉ span gốc giữ danh sách toàn bộ span của trace
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        """
+        Định dạng span theo OTLP/JSON (có thể nạp bằng OpenTelemetry Collector filelog/otlpjson)
+        """
+        def encode(value):
+            if isinstance(value, bool):
+                return {"boolValue": value}
+            if isinstance(value, int):
+                return {"intValue": str(value)}
+            if isinstance(value, float):
+                return {"doubleValue": value}
+            return {"stringValue": str(value)}
+
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": encode(v)} for k, v in self.attributes.items()],
+            "status": {"code": 1 if self.status == "OK" else 2},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class TracingUtil:
+    """
+    Tracer dùng chung cho cả tiến trình:
+    - Span luôn được ghi (chi phí vài micro-giây) và cộng vào histogram `span_seconds{name=...}`
+    - Nếu đặt TRACE_EXPORT_PATH, mỗi trace hoàn chỉnh được ghi thành một dòng OTLP/JSON
+      (resourceSpans) khi span gốc kết thúc
+    """
+
+    SERVICE_NAME = "lightrag-api"
+    export_path: Optional[str] = os.getenv("TRACE_EXPORT_PATH") or None
+    _export_lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, export_path: Optional[str]):
+        cls.export_path = export_path or None
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @staticmethod
+    def current_trace_id() -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span else None
+
+    @classmethod
+    @contextmanager
+    def span(cls, name: str, **attributes):
+        """
+        Mở span con của span hiện tại (hoặc span gốc nếu chưa có trace)
+
+        Ví dụ:
+            with TracingUtil.span("rag.query", mode=mode) as span:
+                ...
+        """
+        parent = _current_span.get()
+        if parent is None:
+            span = Span(name, secrets.token_hex(16), None, attributes)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+            span.root = parent.root
+        span.root.children.append(span)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "ERROR"
+            span.attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            MetricsUtil.observe(f"span_seconds{{name={name}}}", span.duration_seconds)
+            if span.root is span:
+                cls._export(span)
+
+    @classmethod
+    def _export(cls, root: Span):
+        if not cls.export_path:
+            return
+        record = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": cls.SERVICE_NAME}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "util.tracing_util"},
+                    "spans": [span.to_otlp() for span in root.children if span.end_ns is not None],
+                }],
+            }]
+        }
+        try:
+            with cls._export_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(cls.export_path)), exist_ok=True)
+                with open(cls.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Failed to export trace {root.trace_id}: {e}")
+
+
+def traced(name: str):
+    """
+    Decorator bọc một hàm async trong span (dùng cho hàm LLM/embedding truyền vào LightRAG)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with TracingUtil.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedStorage:
+    """
+    Bọc một storage của LightRAG (graph Neo4j, vector DB): mỗi lời gọi phương thức async công khai
+    trong một trace đang chạy được đo bằng span `{prefix}.{tên phương thức}`, nên thời gian Neo4j và
+    vector store hiện riêng trong trace và histogram span_seconds.
+    Lời gọi ngoài request (ingestion, khởi tạo storage) không mở trace mới để không ghi mỗi lời gọi
+    thành một trace riêng. Các thuộc tính khác được chuyển thẳng tới storage gốc.
+    """
+
+    def __init__(self, storage: Any, prefix: str):
+        self._storage = storage
+        self.prefix = prefix
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._storage, name)
+        if name.startswith("_") or not inspect.iscoroutinefunction(attr):
+            return attr
+
+        span_name = f"{self.prefix}.{name}"
+
+        async def call(*args, **kwargs):
+            if _current_span.get() is None:
+                return await attr(*args, **kwargs)
+            with TracingUtil.span(span_name):
+                return await attr(*args, **kwargs)
+        return call
+
+    @property
+    def storage(self) -> Any:
+        return self._storage
@@ -0,0 +1,101 @@
+"""
+Utility Layer - Tách từ tiếng Việt cho tìm kiếm dự phòng
+Chuẩn hóa NFC, bỏ dấu (tùy chọn), lọc stopword và sinh bigram âm tiết
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+
+class VietnameseTokenizer:
+    """
+    Pipeline tách từ cho văn bản tiếng Việt (và tiếng Anh):
+    1. Chuẩn hóa Unicode NFC + chữ thường (văn bản có thể lẫn dạng dựng sẵn/tổ hợp)
+    2. Tách âm tiết bằng \\w+
+    3. Lọc stopword (hư từ); giữ lại từ để hỏi "ai", "gì", "nào" vì dữ liệu có các cặp Q/A
+    4. Sinh bigram âm tiết liền kề ("hoàng_đế", "cách_mạng") vì từ tiếng Việt thường gồm nhiều âm tiết
+    5. (Tùy chọn) thêm dạng bỏ dấu với tiền tố "~" để câu hỏi gõ không dấu vẫn khớp
+
+    Câu hỏi có dấu khớp cả dạng gốc lẫn dạng bỏ dấu nên được điểm cao hơn câu hỏi không dấu.
+    """
+
+    FOLDED_PREFIX = "~"
+
+    STOPWORDS = frozenset({
+        # Hư từ và đại từ tiếng Việt
+        "là", "của", "và", "các", "những", "có", "được", "trong", "cho", "với", "một",
+        "này", "đó", "kia", "thì", "mà", "ở", "tại", "từ", "đã", "đang",
+        "sẽ", "bị", "về", "ra", "vào", "như", "cũng", "rất", "khi", "để", "do", "vì", "nên",
+        "nhưng", "hay", "hoặc", "không", "sao", "thế", "vậy", "còn", "nhé", "ạ", "à", "ư",
+        "hãy", "bạn", "tôi",
+        # Hư từ tiếng Anh (dữ liệu song ngữ)
+        "a", "an", "the", "of", "and", "or", "is", "are", "was", "were", "in", "on", "at",
+        "to", "for", "by", "with", "what", "who", "when", "where", "how", "which", "did", "do",
+    })
+
+    def __init__(self, fold_accents: bool = True, remove_stopwords: bool = True, bigrams: bool = True):
+        self.fold_accents = fold_accents
+        self.remove_stopwords = remove_stopwords
+        self.bigrams = bigrams
+        # Stopword không dấu chỉ áp dụng cho âm tiết gõ không dấu ("la", "nao")
+        self._folded_stopwords = frozenset(self.fold(word) for word in self.STOPWORDS)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Chuẩn hóa NFC và chuyển chữ thường
+        """
+        return unicodedata.normalize("NFC", text).lower()
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def fold(text: str) -> str:
+        """
+        Bỏ dấu tiếng Việt: "hoàng đế" -> "hoang de"
+        """
+        decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+        return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+    def syllables(self, text: str) -> List[str]:
+        """
+        Tách văn bản thành các âm tiết đã chuẩn hóa
+        """
+        return re.findall(r"\w+", self.normalize(text))
+
+    def is_stopword(self, syllable: str) -> bool:
+        """
+        Kiểm tra âm tiết có phải stopword không (xét cả dạng gõ không dấu)
+        """
+        if syllable in self.STOPWORDS:
+            return True
+        return syllable in self._folded_stopwords and self.fold(syllable) == syllable
+
+    def terms(self, text: str) -> List[str]:
+        """
+        Sinh danh sách term dùng để đánh chỉ mục/tìm kiếm
+
+        Args:
+            text: Văn bản đầu vào
+
+        Returns:
+            Danh sách term (âm tiết, bigram và dạng bỏ dấu), có thể lặp lại
+        """
+        syllables = self.syllables(text)
+        keep = [not (self.remove_stopwords and self.is_stopword(s)) for s in syllables]
+
+        terms = [s for s, kept in zip(syllables, keep) if kept]
+        if self.bigrams:
+            terms.extend(
+                f"{syllables[i]}_{syllables[i + 1]}"
+                for i in range(len(syllables) - 1)
+                if keep[i] and keep[i + 1]
+            )
+        if self.fold_accents:
+            terms.extend([self.FOLDED_PREFIX + self.fold(term) for term in terms])
+        return terms
+
+
+# Tokenizer mặc định dùng chung cho tìm kiếm dự phòng
+DEFAULT_TOKENIZER = VietnameseTokenizer()
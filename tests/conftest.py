@@ -0,0 +1,105 @@
+"""
+Cấu hình chung cho pytest - thêm thư mục src vào Python path
+và dựng sẵn LightRAG giả / RAGService dùng chung cho các test
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from service.rag_service import RAGService  # noqa: E402
+
+
+def empty_retrieval(question, param) -> dict:
+    return {"status": "success", "data": {"entities": [], "relationships": [], "chunks": []}}
+
+
+class FakeRAG:
+    """
+    LightRAG giả: ghi lại mọi lời gọi, truy xuất và trả lời theo cấu hình
+
+    Args:
+        retrieve: (question, param) -> kết quả aquery_data (hàm thường hoặc coroutine)
+        answer: text -> câu trả lời của aquery/llm_model_func
+    """
+
+    def __init__(self, retrieve=None, answer=None):
+        self.retrieve = retrieve or empty_retrieval
+        self.answer = answer or (lambda text: "answer")
+        self.llm_delay = 0.0
+        self.inserted = []    # (input, file_paths) của ainsert
+        self.retrieved = []   # Câu hỏi của aquery_data
+        self.queries = []     # Câu hỏi của aquery
+        self.calls = []       # (prompt, system_prompt, history_messages) của llm_model_func
+
+    async def factory(self, working_dir):
+        """
+        Dùng làm rag_factory của RAGService
+        """
+        return self
+
+    async def ainsert(self, input, file_paths=None, **kwargs):
+        self.inserted.append((input, file_paths))
+
+    async def aquery(self, question, param=None):
+        self.queries.append(question)
+        return self.answer(question)
+
+    async def aquery_data(self, question, param):
+        self.retrieved.append(question)
+        result = self.retrieve(question, param)
+        return await result if asyncio.iscoroutine(result) else result
+
+    async def llm_model_func(self, prompt, system_prompt=None, history_messages=None, **kwargs):
+        self.calls.append((prompt, system_prompt, history_messages or []))
+        await asyncio.sleep(self.llm_delay)
+        return self.answer(prompt)
+
+    async def embedding_func(self, texts):
+        return [[0.1, 0.2] for _ in texts]
+
+    @property
+    def prompts(self) -> list:
+        """
+        System prompt (chứa ngữ cảnh) của các lần gọi LLM
+        """
+        return [system_prompt for _, system_prompt, _ in self.calls]
+
+
+async def _unavailable_rag_factory(working_dir):
+    raise ConnectionError("neo4j unavailable")
+
+
+@pytest.fixture
+def fake_rag():
+    return FakeRAG()
+
+
+@pytest.fixture
+def unavailable_rag_factory():
+    """
+    rag_factory luôn lỗi (Neo4j/LLM không kết nối được): RAGService chuyển sang tìm kiếm dự phòng
+    """
+    return _unavailable_rag_factory
+
+
+@pytest.fixture
+def make_rag_service(tmp_path, fake_rag):
+    """
+    Tạo RAGService trên tmp_path dùng `fake_rag` (mặc định một file data.txt "Napoleon" cho cả hai đường dẫn)
+    """
+    def make(data_path=None, data_path_json=None, rag_factory=None, **kwargs):
+        if data_path is None:
+            data_file = tmp_path / "data.txt"
+            if not data_file.exists():
+                data_file.write_text("Napoleon", encoding="utf-8")
+            data_path = str(data_file)
+        return RAGService(str(data_path), str(data_path_json or data_path), working_dir=str(tmp_path / "storage"),
+                          rag_factory=rag_factory or fake_rag.factory, **kwargs)
+    return make
@@ -0,0 +1,87 @@
+"""
+Unit tests cho AdmissionLimiter
+"""
+
+import asyncio
+
+import pytest
+
+from util.admission_util import AdmissionLimiter, AdmissionRejectedError
+from util.metrics_util import MetricsUtil
+
+
+def test_rejects_with_429_when_queue_is_full():
+    async def scenario():
+        limiter = AdmissionLimiter(max_in_flight=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert limiter.get_status()["queue_depth"] == 1
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with limiter.admit():
+                pass
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return exc_info.value
+
+    MetricsUtil.reset()
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.retry_after >= 1
+    assert MetricsUtil.get_counter("query_rejected_total{reason=queue_full}") == 1
+
+
+def test_rejects_with_503_after_queue_timeout():
+    async def scenario():
+        limiter = AdmissionLimiter(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            async with limiter.admit():
+                pass
+        release.set()
+        await holder
+        return limiter, exc_info.value
+
+    limiter, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert limiter.get_status()["queue_depth"] == 0
+    assert limiter.get_status()["in_flight"] == 0
+
+
+def test_queued_requests_run_in_order_and_respect_limit():
+    async def scenario():
+        limiter = AdmissionLimiter(max_in_flight=2, max_queue=10, queue_timeout=5)
+        running = 0
+        peak = 0
+        order = []
+
+        async def work(i):
+            nonlocal running, peak
+            async with limiter.admit():
+                running += 1
+                peak = max(peak, running)
+                order.append(i)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(work(i) for i in range(8)))
+        return limiter, peak, order
+
+    limiter, peak, order = asyncio.run(scenario())
+    assert peak == 2
+    assert order == list(range(8))
+    assert limiter.get_status()["in_flight"] == 0
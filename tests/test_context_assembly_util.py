@@ -0,0 +1,105 @@
+"""
+Unit tests cho lắp ráp ngữ cảnh: gộp chunk chồng lấn, bỏ đoạn gần trùng, xếp vào ngân sách token
+"""
+
+import asyncio
+
+from ingestion import chunk_text
+from util.context_assembly_util import ContextAssembler, approx_tokens, estimate_jaccard, minhash_signature
+
+SENTENCES = [
+    f"Câu số {i}: Napoleon chỉ huy quân đoàn {i} tiến về phía đông qua thành phố {i * 7}."
+    for i in range(120)
+]
+TEXT = " ".join(SENTENCES)
+
+
+def _chunks(text, file_path="data.txt", size=120, overlap=30):
+    pieces, _ = chunk_text(text, size, overlap)
+    return [{"chunk_id": f"{file_path}-{i}", "content": piece, "file_path": file_path}
+            for i, piece in enumerate(pieces)]
+
+
+def test_overlapping_chunks_are_stitched_back():
+    chunks = _chunks(TEXT)
+    assert len(chunks) > 5
+    # Thứ hạng truy xuất không theo thứ tự trong tài liệu
+    ranked = chunks[3:] + chunks[:3]
+    assembled, stats = ContextAssembler(token_budget=0).assemble(ranked)
+
+    assert len(assembled) == 1 and stats["chunks_merged"] == len(chunks) - 1
+    assert " ".join(assembled[0]["content"].split()) == TEXT
+    assert sorted(assembled[0]["merged_ids"]) == sorted(chunk["chunk_id"] for chunk in chunks)
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+    # Chunk không liền nhau chỉ gộp những cặp thật sự chồng lấn
+    assembled, _ = ContextAssembler(token_budget=0).assemble([chunks[0], chunks[2], chunks[1], chunks[5]])
+    assert len(assembled) == 2
+
+
+def test_near_duplicates_dropped_and_budget_respected():
+    passage = " ".join(SENTENCES[:20])
+    edited = passage.replace("quân đoàn 3 ", "quân đoàn III ")
+    other = " ".join(SENTENCES[60:80])
+    assert estimate_jaccard(minhash_signature(passage), minhash_signature(edited)) >= 0.8
+    assert estimate_jaccard(minhash_signature(passage), minhash_signature(other)) < 0.3
+    assert estimate_jaccard(minhash_signature("Napoleon"), minhash_signature("napoleon ")) == 1.0
+
+    chunks = [
+        {"chunk_id": "a", "content": passage, "file_path": "data.txt"},
+        {"chunk_id": "b", "content": edited, "file_path": "backup.txt"},
+        {"chunk_id": "c", "content": other, "file_path": "data.txt"},
+    ]
+    assembled, stats = ContextAssembler(token_budget=0).assemble(chunks)
+    assert [chunk["chunk_id"] for chunk in assembled] == ["a", "c"] and stats["duplicates_dropped"] == 1
+
+    # Ngân sách chỉ đủ một đoạn: giữ đoạn điểm cao nhất
+    budget = approx_tokens(passage) + 10
+    assembled, stats = ContextAssembler(token_budget=budget).assemble(chunks)
+    assert [chunk["chunk_id"] for chunk in assembled] == ["a"]
+    assert stats["tokens_after"] <= budget and stats["over_budget_dropped"] == 1
+
+    # Điểm có sẵn được ưu tiên hơn thứ hạng; đoạn lớn hơn ngân sách thì bị cắt
+    scored = [dict(chunk, score=score) for chunk, score in zip(chunks, (0.1, 0.0, 0.9))]
+    assembled, stats = ContextAssembler(token_budget=50).assemble(scored)
+    assert [chunk["chunk_id"] for chunk in assembled] == ["c"] and stats["tokens_after"] <= 50
+
+
+class _AnswerCache:
+    """
+    llm_response_cache giả (KV storage của LightRAG)
+    """
+
+    global_config = {"enable_llm_cache": True}
+
+    def __init__(self):
+        self.data = {}
+
+    async def get_by_id(self, key):
+        return self.data.get(key)
+
+    async def upsert(self, data):
+        self.data.update(data)
+
+
+def test_standard_modes_generate_from_assembled_context_with_cache(fake_rag, make_rag_service):
+    chunks = _chunks(TEXT)
+    fake_rag.retrieve = lambda question, param: {
+        "status": "success", "data": {"entities": [], "relationships": [], "chunks": chunks[3:] + chunks[:3]}}
+    fake_rag.llm_response_cache = _AnswerCache()
+    service = make_rag_service()
+
+    async def ask():
+        return await service.get_answer_with_source("Napoleon chỉ huy quân đoàn nào?", mode="mix")
+
+    # Chế độ mix (mặc định) cũng gửi ngữ cảnh đã gộp đoạn chồng lấn, không gọi aquery của LightRAG
+    assert asyncio.run(ask()) == ("answer", "rag")
+    assert fake_rag.queries == [] and len(fake_rag.prompts) == 1
+    assert fake_rag.prompts[0].count(SENTENCES[50]) == 1
+
+    # Cùng câu hỏi và cùng ngữ cảnh: lấy câu trả lời từ cache, không gọi LLM
+    assert asyncio.run(ask()) == ("answer", "rag") and len(fake_rag.calls) == 1
+    # Ngữ cảnh đổi (dữ liệu mới): sinh lại
+    chunks.append({"chunk_id": "new", "content": "Napoleon mất năm 1821.", "file_path": "other.txt"})
+    asyncio.run(ask())
+    assert len(fake_rag.calls) == 2
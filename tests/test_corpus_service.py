@@ -0,0 +1,68 @@
+"""
+Unit tests cho quản lý nhiều corpus: thư mục index riêng của corpus mặc định, corpus không tồn tại
+"""
+
+import asyncio
+
+import pytest
+
+from service.corpus_service import CorpusNotFoundError, CorpusService, DEFAULT_CORPUS_ID
+from service.rag_service import RAGService
+
+
+def _corpus_service(tmp_path, fake_rag):
+    data_dir = tmp_path / "data"
+    (data_dir / "corpora" / "history").mkdir(parents=True)
+    for directory in (data_dir, data_dir / "corpora" / "history"):
+        (directory / "data.txt").write_text("Napoleon sinh năm 1769.", encoding="utf-8")
+        (directory / "data.json").write_text('{"name": "Napoleon"}', encoding="utf-8")
+
+    def factory(corpus_id, data_path, data_path_json, working_dir):
+        return RAGService(data_path, data_path_json, working_dir=working_dir, rag_factory=fake_rag.factory)
+
+    return CorpusService(str(data_dir / "data.txt"), str(data_dir / "data.json"),
+                         storage_root=str(tmp_path / "storage"), service_factory=factory)
+
+
+def test_default_corpus_index_is_separate_from_other_corpora(tmp_path, fake_rag):
+    storage = tmp_path / "storage"
+    service = _corpus_service(tmp_path, fake_rag)
+    assert service.default_service.working_dir == str(storage / DEFAULT_CORPUS_ID)
+
+    async def run():
+        await service.default_service.initialize()
+        default_size = service.default_service.estimate_memory_bytes()
+        history = await service.get_service("history")
+        # Index của corpus khác không bị tính vào kích thước của corpus mặc định
+        (storage / "corpora" / "history" / "vdb_chunks.json").write_bytes(b"x" * 1_000_000)
+        assert service.default_service.estimate_memory_bytes() == default_size
+        assert history.estimate_memory_bytes() >= 1_000_000
+
+        # corpus_id không tồn tại không để lại lock
+        for i in range(100):
+            with pytest.raises(CorpusNotFoundError):
+                await service.get_service(f"missing-{i}")
+        assert set(service._load_locks) == {"history"}
+
+        # Đọc phiên bản cho ETag không làm corpus "mới dùng" và không tính là hit
+        stats = service.get_status()
+        assert service.index_version("history") == history.index_version
+        assert service.faq_revision(DEFAULT_CORPUS_ID) is None
+        assert service.get_status() == stats
+
+    asyncio.run(run())
+
+
+def test_legacy_default_index_is_moved_into_its_directory(tmp_path, fake_rag):
+    storage = tmp_path / "storage"
+    (storage / "corpora" / "history").mkdir(parents=True)
+    (storage / "kv_store_full_docs.json").write_text("{}", encoding="utf-8")
+    (storage / "vdb_chunks.json").write_text("{}", encoding="utf-8")
+    (storage / "query_frequencies.json").write_text("{}", encoding="utf-8")
+
+    _corpus_service(tmp_path, fake_rag)
+    assert sorted(path.name for path in (storage / DEFAULT_CORPUS_ID).iterdir()) == [
+        "kv_store_full_docs.json", "vdb_chunks.json"
+    ]
+    # File không phải index của LightRAG và index của corpus khác giữ nguyên chỗ
+    assert (storage / "query_frequencies.json").exists() and (storage / "corpora" / "history").is_dir()
@@ -0,0 +1,64 @@
+"""
+Unit tests cho EmbeddingBatcher - gom lời gọi embedding đồng thời
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from util.embedding_batcher_util import EmbeddingBatcher
+from util.local_backend_util import hash_embed, local_embed
+
+
+class CountingEmbed:
+    """
+    Stub embedding cục bộ ghi lại kích thước mỗi lời gọi
+    """
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, texts, **kwargs):
+        self.calls.append(len(texts))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("embedding API down")
+        return await local_embed(texts)
+
+
+def test_concurrent_calls_are_coalesced():
+    stub = CountingEmbed()
+    batcher = EmbeddingBatcher(stub, max_batch_size=8, max_wait=0.01)
+    texts = [f"câu hỏi số {i}" for i in range(20)]
+
+    async def run():
+        return await asyncio.gather(*(batcher([text]) for text in texts))
+
+    results = asyncio.run(run())
+    assert stub.calls == [8, 8, 4]
+    for text, result in zip(texts, results):
+        assert np.array_equal(result, hash_embed([text]))
+
+
+def test_large_request_is_split_and_reassembled():
+    stub = CountingEmbed()
+    batcher = EmbeddingBatcher(stub, max_batch_size=4, max_wait=0.01)
+    texts = [f"đoạn {i}" for i in range(10)]
+
+    result = asyncio.run(batcher(texts))
+    assert stub.calls == [4, 4, 2]
+    assert np.array_equal(result, hash_embed(texts))
+
+
+def test_errors_fan_out_to_every_caller():
+    batcher = EmbeddingBatcher(CountingEmbed(fail=True), max_batch_size=8, max_wait=0.01)
+
+    async def run():
+        return await asyncio.gather(batcher(["a"]), batcher(["b"]), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher(["c"]))
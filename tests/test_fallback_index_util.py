@@ -0,0 +1,32 @@
+"""
+Unit tests cho FallbackIndex - kết quả phải giống tìm kiếm dự phòng cũ
+"""
+
+import os
+
+from util.fallback_index_util import FallbackIndex
+from util.text_search_util import TextSearchUtil
+
+DATA_TXT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "data.txt")
+
+
+def test_matches_legacy_search_on_bundled_corpus():
+    with open(DATA_TXT, "r", encoding="utf-8") as f:
+        text = f.read()
+    index = FallbackIndex.from_text(text)
+
+    for question in ["Napoleon là ai?", "Napoleon sinh năm nào?", "Trận Waterloo diễn ra khi nào?"]:
+        for top_k in (1, 5, 10):
+            assert index.local_search(question, top_k) == TextSearchUtil.local_search(text, question, top_k)
+    index.close()
+
+
+def test_no_match_and_empty_corpus():
+    index = FallbackIndex.from_text("alpha beta\n\ngamma delta")
+    assert index.num_paragraphs == 2
+    assert index.local_search("zeta", 5).endswith("[no-context]")
+    assert [p for _, p in index.search("gamma", 5)] == ["gamma delta"]
+
+    empty = FallbackIndex.from_text("")
+    assert empty.num_paragraphs == 0
+    assert empty.search("anything", 5) == []
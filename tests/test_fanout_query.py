@@ -0,0 +1,102 @@
+"""
+Unit tests cho chế độ fan-out: truy xuất song song nhiều chiến lược, gộp ngữ cảnh, một lần gọi LLM
+"""
+
+import asyncio
+import time
+
+from lightrag.prompt import PROMPTS
+
+from util.fanout_util import format_context, merge_retrievals
+
+
+def _data(entities=(), relations=(), chunks=()):
+    return {
+        "status": "success",
+        "data": {
+            "entities": [{"entity_name": name, "entity_type": "person", "description": name} for name in entities],
+            "relationships": [{"src_id": src, "tgt_id": tgt, "description": f"{src}-{tgt}"} for src, tgt in relations],
+            "chunks": [{"chunk_id": chunk_id, "content": f"nội dung {chunk_id}", "file_path": "data.txt"}
+                       for chunk_id in chunks],
+        },
+    }
+
+
+RETRIEVALS = {
+    "naive": (0.05, _data(chunks=["c1", "c2"])),
+    "local": (0.1, _data(entities=["Napoleon", "Ney"], relations=[("Napoleon", "Ney")], chunks=["c2", "c3"])),
+    "global": (5.0, _data(entities=["Waterloo"], chunks=["c9"])),
+    "hybrid": (0.1, _data(entities=["Ney"], relations=[("Ney", "Napoleon")], chunks=["c3", "c4"])),
+}
+
+
+async def _retrieve(question, param):
+    delay, result = RETRIEVALS[param.mode]
+    if param.mode != "naive":
+        assert param.ll_keywords == ["Napoleon"]
+    await asyncio.sleep(delay)
+    return result
+
+
+def test_merge_deduplicates_and_interleaves():
+    merged = merge_retrievals([RETRIEVALS["local"][1], RETRIEVALS["hybrid"][1]])
+    assert [e["entity_name"] for e in merged["entities"]] == ["Napoleon", "Ney"]
+    assert len(merged["relationships"]) == 1   # Quan hệ vô hướng
+    assert [c["chunk_id"] for c in merged["chunks"]] == ["c2", "c3", "c4"]
+    assert format_context(merge_retrievals([])) == ""
+    assert '"reference_id": "1"' in format_context(merged)
+
+
+def test_fanout_drops_late_strategies_and_generates_once(fake_rag, make_rag_service):
+    rag = fake_rag
+    rag.retrieve = _retrieve
+    rag.keyword_calls = 0
+    service = make_rag_service()
+    service.fanout_strategies = ["naive", "local", "global", "hybrid"]
+    service.fanout_timeouts = {"naive": 1.0, "local": 1.0, "global": 0.3, "hybrid": 1.0}
+
+    async def extract_keywords(question, query_param):
+        rag.keyword_calls += 1
+        await asyncio.sleep(0.02)
+        return [], ["Napoleon"]
+
+    service._extract_keywords = extract_keywords
+
+    started = time.perf_counter()
+    answer, source = asyncio.run(service.get_answer_with_source("Ney là ai?", mode="fanout"))
+    elapsed = time.perf_counter() - started
+
+    # Câu trả lời trên ngữ cảnh thiếu một chiến lược: không được cache như câu trả lời RAG đầy đủ
+    assert (answer, source) == ("answer", "degraded")
+    # Chiến lược global (5s) bị bỏ ở thời hạn 0.3s: tổng thời gian ~ thời hạn, không phải tổng các chiến lược
+    assert elapsed < 1.0
+    assert rag.keyword_calls == 1 and len(rag.prompts) == 1
+    context = rag.prompts[0]
+    assert "Waterloo" not in context and "c9" not in context
+    for chunk_id in ("c1", "c2", "c3", "c4"):
+        assert context.count(f"nội dung {chunk_id}") == 1
+    assert context.count('"entity": "Ney"') == 1
+
+
+def test_fanout_sources_when_strategies_fail_or_find_nothing(fake_rag, make_rag_service):
+    service = make_rag_service()
+    service.fanout_strategies = ["naive", "local"]
+    service.fanout_timeouts = {"naive": 0.05, "local": 0.05}
+
+    async def extract_keywords(question, query_param):
+        return [], ["Napoleon"]
+
+    service._extract_keywords = extract_keywords
+
+    # Mọi chiến lược hết hạn: fail_response với nguồn "degraded" (không phải "rag"), không gọi LLM
+    async def too_slow(question, param):
+        await asyncio.sleep(1.0)
+
+    fake_rag.retrieve = too_slow
+    answer, source = asyncio.run(service.get_answer_with_source("Ney là ai?", mode="fanout"))
+    assert (answer, source) == (PROMPTS["fail_response"], "degraded") and fake_rag.calls == []
+
+    # Mọi chiến lược xong nhưng không có ngữ cảnh
+    fake_rag.retrieve = lambda question, param: _data()
+    answer, source = asyncio.run(service.get_answer_with_source("Ney là ai?", mode="fanout"))
+    assert (answer, source) == (PROMPTS["fail_response"], "no-data")
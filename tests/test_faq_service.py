@@ -0,0 +1,102 @@
+"""
+Unit tests cho automaton Aho-Corasick và lớp FAQ trả lời nhanh
+"""
+
+import asyncio
+import json
+import os
+import random
+
+from service.faq_service import FAQService
+from service.rag_service import RAGService
+from util.aho_corasick_util import AhoCorasick
+
+REPO_FAQ = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "faq.json")
+
+FAQ = {
+    "entries": [
+        {"id": "who", "questions": ["Napoleon là ai", "Who was Napoleon"], "answer": "Hoàng đế Pháp."},
+        {"id": "born", "questions": ["Napoleon sinh năm nào"], "answer": "1769."},
+        {"id": "waterloo", "questions": ["Trận Waterloo là gì"], "answer": "Trận đánh năm 1815.",
+         "min_confidence": 1.0},
+    ]
+}
+
+
+def _write_faq(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def test_aho_corasick_finds_same_matches_as_naive_search():
+    rng = random.Random(7)
+    patterns = list({"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)})
+    automaton = AhoCorasick((pattern, pattern) for pattern in patterns)
+    for _ in range(50):
+        text = "".join(rng.choice("abcd") for _ in range(40))
+        expected = sorted((i, i + len(p), p) for p in patterns for i in range(len(text)) if text.startswith(p, i))
+        assert sorted(automaton.iter_matches(text)) == expected
+
+
+def test_faq_matching_rules(tmp_path):
+    path = str(tmp_path / "faq.json")
+    _write_faq(path, FAQ)
+    faq = FAQService(path)
+
+    # Không dấu, dấu câu, từ đệm vẫn khớp
+    assert faq.match("Napoleon là ai?")["id"] == "who"
+    assert faq.match("cho toi hoi napoleon la ai")["id"] == "who"
+    assert faq.match("WHO WAS NAPOLEON?")["answer"] == "Hoàng đế Pháp."
+    # Khớp một phần câu hỏi hoặc khớp nhiều mục -> để RAG trả lời
+    assert faq.match("Napoleon là ai trong lịch sử nước Pháp thời cận đại") is None
+    assert faq.match("Napoleon là ai và Napoleon sinh năm nào") is None
+    # Chỉ nhận khớp trọn từ; ngưỡng riêng của từng mục
+    assert faq.match("Napoleon là aix") is None
+    assert faq.match("Xin hỏi trận Waterloo là gì thế") is None
+    assert faq.match("Trận Waterloo là gì?")["id"] == "waterloo"
+
+    status = faq.get_status()
+    assert status["entries"] == 3 and status["lookups"] == 8 and status["hits"] == 4
+
+
+def test_shipped_faq_rejects_questions_with_extra_words():
+    faq = FAQService(REPO_FAQ)
+    assert faq.match("Who was Napoleon Bonaparte?")["id"] == "napoleon-who"
+    assert faq.match("When was the Battle of Waterloo")["id"] == "waterloo"
+    # Một từ không được che phủ đổi nghĩa câu hỏi: không trả lời bằng FAQ
+    for question in ("Who was Napoleon III?", "Who is Napoleon III", "Who was Napoleon Bonaparte III",
+                     "When was the Battle of Waterloo lost"):
+        assert faq.match(question) is None, question
+
+
+def test_faq_hot_reload_keeps_last_good_version(tmp_path):
+    path = str(tmp_path / "faq.json")
+    _write_faq(path, FAQ)
+    faq = FAQService(path, reload_interval=0)
+    assert faq.match("Napoleon chết khi nào") is None
+
+    data = {"entries": FAQ["entries"] + [{"id": "death", "questions": ["Napoleon chết khi nào"], "answer": "1821."}]}
+    _write_faq(path, data)
+    os.utime(path, ns=(1, 10 ** 18))   # đảm bảo mtime thay đổi trên mọi hệ thống file
+    assert faq.match("Napoleon chết khi nào")["id"] == "death"
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    os.utime(path, ns=(1, 2 * 10 ** 18))
+    assert faq.match("Napoleon chết khi nào")["id"] == "death"
+    assert faq.get_status()["last_error"] is not None
+
+
+def test_rag_service_answers_faq_without_touching_rag(tmp_path):
+    path = str(tmp_path / "faq.json")
+    _write_faq(path, FAQ)
+
+    async def failing_factory(working_dir):
+        raise AssertionError("RAG must not be initialized for FAQ answers")
+
+    service = RAGService(str(tmp_path / "missing.txt"), str(tmp_path / "missing.json"),
+                         working_dir=str(tmp_path / "storage"), rag_factory=failing_factory,
+                         faq_service=FAQService(path))
+    answer, source = asyncio.run(service.get_answer_with_source("Napoleon sinh năm nào?"))
+    assert (answer, source) == ("1769.", "faq")
+    assert service.rag is None
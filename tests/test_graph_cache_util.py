@@ -0,0 +1,66 @@
+"""
+Unit tests cho cache đọc xuyên trước graph storage
+"""
+
+import asyncio
+
+from util.graph_cache_util import CachedGraphStorage, wrap_graph_storage
+from util.local_backend_util import LocalGraphStorage
+
+
+async def _build_graph() -> LocalGraphStorage:
+    backend = LocalGraphStorage()
+    await backend.upsert_edge("Napoleon", "Waterloo", {"weight": 2.0, "description": "thua trận"})
+    await backend.upsert_edge("Napoleon", "Ney", {"weight": 1.0, "description": "thống chế"})
+    backend.round_trips = 0
+    return backend
+
+
+def test_repeated_lookups_hit_cache_and_only_misses_reach_storage():
+    async def scenario():
+        backend = await _build_graph()
+        graph = CachedGraphStorage(backend)
+
+        nodes = await graph.get_nodes_batch(["Napoleon", "Waterloo", "Không tồn tại"])
+        assert set(nodes) == {"Napoleon", "Waterloo"} and backend.round_trips == 1
+        # Node thiếu cũng được cache; chỉ "Ney" được hỏi storage
+        nodes = await graph.get_nodes_batch(["Napoleon", "Không tồn tại", "Ney"])
+        assert set(nodes) == {"Napoleon", "Ney"} and backend.round_trips == 2
+
+        neighbors = await graph.get_nodes_edges_batch(["Napoleon"])
+        assert sorted(neighbors["Napoleon"]) == [("Napoleon", "Ney"), ("Napoleon", "Waterloo")]
+        degrees = await graph.edge_degrees_batch([("Waterloo", "Napoleon")])
+        assert degrees == {("Waterloo", "Napoleon"): 3}
+        trips = backend.round_trips
+
+        # Cạnh vô hướng dùng chung mục cache; caller sửa kết quả không làm hỏng cache
+        edge = await graph.get_edge("Napoleon", "Waterloo")
+        edge["weight"] = 99.0
+        edges = await graph.get_edges_batch([{"src": "Waterloo", "tgt": "Napoleon"}])
+        assert edges == {("Waterloo", "Napoleon"): {"weight": 2.0, "description": "thua trận"}}
+        assert backend.round_trips == trips + 1
+
+        await graph.get_nodes_edges_batch(["Napoleon"])
+        assert await graph.node_degree("Waterloo") == 1
+        assert backend.round_trips == trips + 1
+
+    asyncio.run(scenario())
+
+
+def test_writes_invalidate_cache():
+    async def scenario():
+        backend = await _build_graph()
+        graph = CachedGraphStorage(backend)
+        assert await graph.node_degree("Napoleon") == 2
+
+        await graph.upsert_edge("Napoleon", "Elba", {"weight": 1.0})
+        assert graph.get_status()["items"] == 0
+        assert await graph.node_degree("Napoleon") == 3
+        assert (await graph.get_node("Elba"))["entity_id"] == "Elba"
+
+        # Thuộc tính/phương thức khác chuyển thẳng tới storage gốc
+        assert await graph.has_node("Elba")
+        assert wrap_graph_storage(backend, max_mb=0) is backend
+        assert wrap_graph_storage(graph, max_mb=8) is graph
+
+    asyncio.run(scenario())
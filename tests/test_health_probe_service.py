@@ -0,0 +1,113 @@
+"""
+Unit tests cho probe sức khỏe chạy nền: kết quả được cache, liveness/readiness không gọi tới phụ thuộc
+"""
+
+import asyncio
+import time
+
+from service.health_probe_service import DEFAULT_PROBES, HealthProbeService, create_health_probe_service
+from util.graph_cache_util import CachedGraphStorage
+
+
+class FakeGraph:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def has_node(self, node_id):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("neo4j unavailable")
+        return False
+
+
+class FakeVector:
+    async def get_by_ids(self, ids):
+        return [None for _ in ids]
+
+
+def test_probes_are_cached_and_classified(fake_rag):
+    rag = fake_rag
+    rag.chunk_entity_relation_graph = CachedGraphStorage(FakeGraph(), max_bytes=1024)
+    rag.chunks_vdb = FakeVector()
+    graph = rag.chunk_entity_relation_graph.storage
+    service = HealthProbeService(lambda: rag, interval=10, timeout=0.2)
+
+    assert service.readiness()["status"] == "starting"
+    service.system_ready = True
+    assert service.readiness()["status"] == "stale"    # Chưa có kết quả probe nào
+
+    asyncio.run(service.probe_once())
+    deep = service.deep()
+    assert deep["status"] == "healthy" and set(deep["probes"]) == set(DEFAULT_PROBES)
+    assert all(result["latency_ms"] >= 0 and result["checked_at"] for result in deep["probes"].values())
+    assert service.readiness()["ready"] is True
+    assert graph.calls == 1   # Probe đi qua cache tới storage thật
+
+    # Đọc kết quả nhiều lần không chạy lại probe
+    for _ in range(100):
+        service.readiness(), service.deep(), service.liveness()
+    assert graph.calls == 1
+
+    # LLM chậm (không quan trọng) -> degraded nhưng vẫn ready
+    rag.llm_delay = 1.0
+    started = time.perf_counter()
+    asyncio.run(service.probe_once())
+    assert time.perf_counter() - started < 0.6
+    assert service.deep()["status"] == "degraded"
+    assert service.deep()["probes"]["llm"]["error"].startswith("timeout")
+    assert service.readiness()["ready"] is True
+
+    # Graph lỗi (quan trọng) -> không ready, đếm số lần lỗi liên tiếp
+    graph.fail = True
+    asyncio.run(service.probe_once())
+    asyncio.run(service.probe_once())
+    readiness = service.readiness()
+    assert readiness["ready"] is False and readiness["status"] == "unavailable"
+    assert readiness["probes"]["graph"]["consecutive_failures"] == 2
+    assert "neo4j unavailable" in readiness["probes"]["graph"]["error"]
+    assert service.deep()["status"] == "unhealthy"
+
+    # Kết quả quá cũ thì không còn được tin
+    graph.fail = False
+    asyncio.run(service.probe_once())
+    assert service.readiness()["ready"] is True
+    service.last_run_at -= service.stale_after + 1
+    assert service.readiness()["status"] == "stale"
+
+
+def test_background_loop_and_uninitialized_rag():
+    service = HealthProbeService(lambda: None, interval=0.01, timeout=0.1)
+    service.system_ready = True
+
+    async def run():
+        service.start()
+        await asyncio.sleep(0.1)
+        await service.stop()
+
+    asyncio.run(run())
+    assert service.runs >= 2
+    assert all(not result["ok"] for result in service.results.values())
+    # Chỉ còn tìm kiếm dự phòng: vẫn phục vụ được nên degraded nhưng ready (trừ khi cấu hình khác)
+    readiness = service.readiness()
+    assert readiness["ready"] is True and readiness["status"] == "degraded"
+    assert service.deep()["fallback"] is True
+    service.ready_on_fallback = False
+    assert service.readiness()["ready"] is False and service.readiness()["status"] == "unavailable"
+    assert service.liveness()["status"] == "alive"
+
+    disabled = HealthProbeService(lambda: None, interval=0)
+    disabled.system_ready = True
+    assert disabled.start() is None and disabled.readiness()["ready"] is True
+
+
+def test_factory_defaults_skip_llm_probe(monkeypatch):
+    for name in ("HEALTH_PROBE_LLM", "HEALTH_READY_ON_FALLBACK"):
+        monkeypatch.delenv(name, raising=False)
+    service = create_health_probe_service(lambda: None)
+    assert "llm" not in service.probes and service.ready_on_fallback is True
+
+    monkeypatch.setenv("HEALTH_PROBE_LLM", "true")
+    monkeypatch.setenv("HEALTH_READY_ON_FALLBACK", "false")
+    service = create_health_probe_service(lambda: None)
+    assert "llm" in service.probes and service.ready_on_fallback is False
@@ -0,0 +1,141 @@
+"""
+Unit tests cho GET /query cache được: URL chuẩn, ETag theo phiên bản chỉ mục, If-None-Match và 304
+"""
+
+import asyncio
+import json
+import os
+import unicodedata
+
+from controller.rag_controller import RAGController
+from dto.QueryRequest import QueryRequest
+from util.http_cache_util import canonical_query_params, canonical_query_string, etag_matches, make_etag
+from util.metrics_util import MetricsUtil
+
+
+def _data_files(tmp_path):
+    data_file, data_json = tmp_path / "data" / "data.txt", tmp_path / "data" / "data.json"
+    data_file.parent.mkdir()
+    data_file.write_text("Napoleon sinh năm 1769.", encoding="utf-8")
+    data_json.write_text('{"name": "Napoleon"}', encoding="utf-8")
+    return data_file, data_json
+
+
+def test_canonical_query_and_etag_matching():
+    # Dấu tổ hợp (NFD), khoảng trắng thừa và thứ tự tham số khác nhau cho cùng một URL chuẩn
+    first = canonical_query_params(unicodedata.normalize("NFD", "  Napoleon  sinh năm nào? "), None, None,
+                                   section="people")
+    second = canonical_query_params("Napoleon sinh năm nào?", "mix", 5, None, section=" people ")
+    assert first == second
+    query = canonical_query_string(first)
+    assert query == "mode=mix&question=Napoleon%20sinh%20n%C4%83m%20n%C3%A0o%3F&section=people&top_k=5"
+    assert canonical_query_string(first, 3).endswith("&v=3")
+
+    etag = make_etag(query, 3)
+    assert etag.startswith('W/"v3-') and etag != make_etag(query, 4)
+    assert etag_matches(etag, etag) and etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches(f'"other", {etag}', etag) and etag_matches("*", etag)
+    assert not etag_matches(make_etag(query, 2), etag) and not etag_matches(None, etag)
+
+
+def test_index_version_bumps_on_reindex_and_data_change(tmp_path, make_rag_service):
+    data_file, data_json = _data_files(tmp_path)
+
+    def service():
+        return make_rag_service(data_file, data_json)
+
+    first = service()
+    asyncio.run(first.initialize())
+    assert first.index_version == 1
+    asyncio.run(first.initialize(force_reindex=True))
+    assert first.get_status()["index_version"] == 2
+
+    # Khởi động lại với cùng dữ liệu giữ phiên bản (ETag cũ vẫn khớp); dữ liệu đổi thì tăng
+    restarted = service()
+    asyncio.run(restarted.initialize())
+    assert restarted.index_version == 2
+    data_file.write_text("Napoleon sinh năm 1769 ở Corsica.", encoding="utf-8")
+    changed = service()
+    asyncio.run(changed.initialize())
+    assert changed.index_version == 3
+
+
+def test_get_query_redirects_and_revalidates(tmp_path, monkeypatch, fake_rag):
+    MetricsUtil.reset()
+    monkeypatch.setenv("RAG_STORAGE_PATH", str(tmp_path / "storage"))
+    monkeypatch.setenv("QUERY_CACHE_MAX_AGE", "30")
+    data_file, data_json = _data_files(tmp_path)
+    rag = fake_rag
+    rag.answer = lambda question: f"Trả lời: {question}"
+    rag.retrieve = lambda question, param: {"status": "success", "data": {
+        "entities": [], "relationships": [],
+        "chunks": [{"chunk_id": "c1", "content": "Napoleon sinh năm 1769.", "file_path": "data.txt"}]}}
+    controller = RAGController(str(data_file), str(data_json))
+    controller.rag_service.rag_factory = rag.factory
+    asyncio.run(controller.rag_service.initialize())
+
+    def get(query_string, if_none_match=None, v=None, **params):
+        request = QueryRequest(question=params.pop("question", "Napoleon sinh năm nào?"), mode="naive", **params)
+        return asyncio.run(controller.process_get_query(request, query_string, if_none_match, v))
+
+    # URL không chuẩn: chuyển hướng, chưa trả lời
+    response = get("question=Napoleon+sinh+n%C4%83m+n%C3%A0o%3F&mode=naive")
+    assert response.status_code == 308 and rag.calls == []
+    canonical = response.headers["location"].removeprefix("/query?")
+
+    response = get(canonical)
+    assert response.status_code == 200 and b"Tr\xe1\xba\xa3 l\xe1\xbb\x9di" in response.body
+    assert response.headers["Cache-Control"] == "public, max-age=30, must-revalidate"
+    assert response.headers["X-Index-Version"] == "1"
+    etag = response.headers["ETag"]
+
+    # ETag còn khớp: 304 mà không gọi lại RAG
+    response = get(canonical, if_none_match=etag)
+    assert response.status_code == 304 and len(rag.calls) == 1
+    assert MetricsUtil.get_counter("query_not_modified_total") == 1
+
+    # URL ghim đúng phiên bản hiện tại được cache bất biến
+    response = get(f"{canonical}&v=1", v=1)
+    assert response.headers["Cache-Control"].endswith("immutable") and response.headers["ETag"] == etag
+
+    # Reindex tăng phiên bản: ETag cũ hết khớp
+    asyncio.run(controller.reindex_data())
+    response = get(canonical, if_none_match=etag)
+    assert response.status_code == 200 and response.headers["X-Index-Version"] == "2"
+    assert response.headers["ETag"] != etag and len(rag.calls) == 3
+
+
+def test_faq_answers_are_never_immutable_and_follow_faq_reloads(tmp_path, monkeypatch, fake_rag):
+    monkeypatch.setenv("RAG_STORAGE_PATH", str(tmp_path / "storage"))
+    monkeypatch.setenv("FAQ_RELOAD_INTERVAL", "0")
+    data_file, data_json = _data_files(tmp_path)
+    faq_file = data_file.parent / "faq.json"
+    faq_file.write_text(json.dumps({"entries": [
+        {"id": "born", "questions": ["Napoleon sinh năm nào"], "answer": "1769."}
+    ]}, ensure_ascii=False), encoding="utf-8")
+    controller = RAGController(str(data_file), str(data_json))
+    controller.rag_service.rag_factory = fake_rag.factory
+    asyncio.run(controller.rag_service.initialize())
+    canonical = canonical_query_string(canonical_query_params("Napoleon sinh năm nào?", "naive", 5, None))
+
+    def get(if_none_match=None, v=None):
+        request = QueryRequest(question="Napoleon sinh năm nào?", mode="naive")
+        query_string = canonical if v is None else f"{canonical}&v={v}"
+        return asyncio.run(controller.process_get_query(request, query_string, if_none_match, v))
+
+    # URL ghim phiên bản chỉ mục nhưng câu trả lời từ FAQ: chỉ must-revalidate
+    response = get(v=1)
+    assert b"1769." in response.body and fake_rag.calls == []
+    assert response.headers["Cache-Control"].endswith("must-revalidate")
+    etag = response.headers["ETag"]
+    response = get(etag, v=1)
+    assert response.status_code == 304 and response.headers["Cache-Control"].endswith("must-revalidate")
+
+    # Sửa FAQ (phiên bản chỉ mục không đổi): ETag cũ hết khớp, trả lời lại
+    faq_file.write_text(json.dumps({"entries": [
+        {"id": "born", "questions": ["Napoleon sinh năm nào"], "answer": "Ngày 15/8/1769."}
+    ]}, ensure_ascii=False), encoding="utf-8")
+    os.utime(faq_file, ns=(1, 10 ** 18))
+    response = get(etag, v=1)
+    assert response.status_code == 200 and "15/8/1769".encode() in response.body
+    assert response.headers["ETag"] != etag and response.headers["X-Index-Version"] == "1"
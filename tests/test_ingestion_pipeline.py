@@ -0,0 +1,77 @@
+"""
+Unit tests cho pipeline ingestion offline (process pool + insert bất đồng bộ)
+"""
+
+import asyncio
+import json
+
+from lightrag.chunker.token_size import chunking_by_token_size
+
+from ingestion import chunk_text, discover_data_files, run_ingestion_pipeline
+
+
+class RecordingRAG:
+    """
+    LightRAG giả ghi lại các document được insert và số insert chạy đồng thời tối đa
+    """
+
+    def __init__(self):
+        self.documents = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainsert(self, input, split_by_character=None, split_by_character_only=False, ids=None,
+                      file_paths=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        # Tách như chunker của LightRAG (mỗi từ một token) để kiểm tra ranh giới chunk được giữ nguyên
+        chunks = chunking_by_token_size(WhitespaceTokenizer(), input, split_by_character, split_by_character_only,
+                                        chunk_token_size=64)
+        self.documents.append((ids, file_paths, [chunk["content"] for chunk in chunks]))
+        self.in_flight -= 1
+
+
+class WhitespaceTokenizer:
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_chunk_text_overlaps_and_covers_text():
+    text = " ".join(f"w{i}" for i in range(1000))
+    chunks, num_tokens = chunk_text(text, chunk_size=100, overlap=20)
+    assert num_tokens >= 1000
+    assert len(chunks) > 1
+    assert chunks[0].startswith("w0")
+    assert chunks[-1].endswith("w999")
+    # Cuối chunk trước lặp lại ở đầu chunk sau
+    assert chunks[0].split()[-1] in chunks[1].split()
+
+
+def test_pipeline_ingests_all_files(tmp_path):
+    for i in range(6):
+        (tmp_path / f"doc{i}.txt").write_text(f"Tài liệu số {i}\n\n" + "nội dung " * 200, encoding="utf-8")
+    (tmp_path / "data.json").write_text(json.dumps({"a": {"b": 1}}), encoding="utf-8")
+    (tmp_path / "ignored.md").write_text("bỏ qua", encoding="utf-8")
+
+    files = discover_data_files(str(tmp_path))
+    assert len(files) == 7
+
+    rag = RecordingRAG()
+    report = asyncio.run(run_ingestion_pipeline(files, rag, workers=2, concurrency=3, max_pending=4,
+                                                chunk_size=64, overlap=8))
+    assert report["documents"] == 7
+    assert report["failed"] == []
+    assert len(rag.documents) == 7
+    assert report["chunks"] == sum(len(chunks) for _, _, chunks in rag.documents)
+    # Mỗi document mang file nguồn (bộ lọc source_file) và id riêng
+    assert sorted(paths[0] for _, paths, _ in rag.documents) == files
+    assert len({ids[0] for ids, _, _ in rag.documents}) == 7
+    _, _, chunks = next(document for document in rag.documents if document[1] == [str(tmp_path / "doc0.txt")])
+    text = (tmp_path / "doc0.txt").read_text(encoding="utf-8").strip()
+    assert len(chunks) > 1 and chunks == chunk_text(text, chunk_size=64, overlap=8)[0]
+    assert 1 < rag.max_in_flight <= 3
+    assert report["tokens_per_second"] > 0
@@ -0,0 +1,125 @@
+"""
+Unit tests cho việc chạy I/O file và parse dữ liệu ngoài event loop khi khởi tạo/đánh chỉ mục
+"""
+
+import asyncio
+import json
+import time
+
+from util.fallback_index_util import FallbackIndex
+from util.io_util import map_blocking, run_blocking
+
+MAX_LOOP_LAG = 0.2   # giây; đọc/parse chạy trên event loop sẽ chặn lâu hơn nhiều
+
+
+def _write_large_corpus(tmp_path):
+    paragraph = "Napoleon Bonaparte chỉ huy quân đội Pháp trong trận Austerlitz năm 1805. "
+    text_path = tmp_path / "data.txt"
+    text_path.write_text("\n\n".join(f"{i} {paragraph * 4}" for i in range(10000)), encoding="utf-8")
+    json_path = tmp_path / "data.json"
+    json_path.write_text(json.dumps({
+        "battles": [{"name": f"Battle {i}", "year": 1800 + i % 20, "notes": paragraph} for i in range(15000)]
+    }), encoding="utf-8")
+    return str(text_path), str(json_path)
+
+
+async def _max_loop_lag(work):
+    """
+    Chạy `work` song song với một tác vụ đo độ trễ event loop; trả về (kết quả, độ trễ lớn nhất)
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - started - 0.005)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    try:
+        result = await work
+    finally:
+        done.set()
+        await probe_task
+    return result, max(lags)
+
+
+def test_run_blocking_and_map_blocking_keep_order_and_errors():
+    def parse(value):
+        if value == "bad":
+            raise ValueError(value)
+        return int(value)
+
+    async def run():
+        assert await run_blocking(parse, "7") == 7
+        return await map_blocking(parse, ["1", "bad", "3"], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results[0] == 1 and isinstance(results[1], ValueError) and results[2] == 3
+
+
+def test_initialize_keeps_event_loop_responsive(tmp_path, fake_rag, make_rag_service):
+    text_path, json_path = _write_large_corpus(tmp_path)
+    service = make_rag_service(text_path, json_path)
+    _, lag = asyncio.run(_max_loop_lag(service.initialize()))
+
+    assert [(type(document).__name__, paths) for document, paths in fake_rag.inserted] == [
+        ("str", [text_path]), ("str", [json_path])
+    ]
+    assert service.indexing_complete
+    assert lag < MAX_LOOP_LAG
+
+
+def test_fallback_indexing_keeps_event_loop_responsive(tmp_path, make_rag_service, unavailable_rag_factory):
+    text_path, json_path = _write_large_corpus(tmp_path)
+    service = make_rag_service(text_path, json_path, rag_factory=unavailable_rag_factory)
+    started = time.perf_counter()
+    _, lag = asyncio.run(_max_loop_lag(service.initialize()))
+    elapsed = time.perf_counter() - started
+
+    assert service.rag is None and service.fallback_index is not None
+    assert service.fallback_index.search("Austerlitz", 1)
+    # Dựng chỉ mục dự phòng mất vài giây nhưng event loop chỉ bị chặn từng quãng ngắn
+    assert lag < MAX_LOOP_LAG
+    assert lag < elapsed / 5
+    service.fallback_index.close()
+
+
+def test_fallback_rebuild_keeps_serving_concurrent_queries(tmp_path, monkeypatch, make_rag_service,
+                                                           unavailable_rag_factory):
+    (tmp_path / "data.txt").write_text("Napoleon chỉ huy trận Austerlitz năm 1805.\n\nTrận Waterloo năm 1815.",
+                                       encoding="utf-8")
+    service = make_rag_service(rag_factory=unavailable_rag_factory)
+    asyncio.run(service.initialize())
+    builds = []
+    from_text = FallbackIndex.from_text.__func__
+
+    def counting_from_text(cls, text, tokenizer):
+        builds.append(text)
+        time.sleep(0.05)   # dựng chậm để truy vấn chen vào giữa chừng
+        return from_text(cls, text, tokenizer)
+
+    monkeypatch.setattr(FallbackIndex, "from_text", classmethod(counting_from_text))
+
+    async def ask(question, **filters):
+        return await service.get_answer_with_source(question, mode="naive", filters=filters or None)
+
+    async def run():
+        # Dựng lại chỉ mục trong lúc các truy vấn (có lọc: chờ dựng chỉ mục metadata) vẫn chạy
+        old_index = service.fallback_index
+        results = await asyncio.gather(service._prepare_fallback_text(), ask("Austerlitz"),
+                                       ask("Waterloo", date_from="1815"), service._prepare_fallback_text())
+        assert service.fallback_index is not old_index and old_index._buffer == b""
+        assert results[1][1] == results[2][1] == "fallback"
+        assert "Austerlitz năm 1805" in results[1][0] and "Waterloo năm 1815" in results[2][0]
+
+        # Chưa có chỉ mục: các truy vấn đồng thời chỉ dựng một lần
+        builds.clear()
+        service._replace_fallback_index(None)
+        answers = await asyncio.gather(*(ask("Waterloo") for _ in range(5)))
+        assert len(builds) == 1 and {source for _, source in answers} == {"fallback"}
+
+    asyncio.run(run())
+    asyncio.run(service.close())
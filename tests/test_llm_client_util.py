@@ -0,0 +1,76 @@
+"""
+Unit tests cho PooledLLMClient trên server completion giả lập cục bộ
+"""
+
+import asyncio
+
+from lightrag.llm.openai import gpt_4o_mini_complete
+
+from util.llm_client_util import (
+    PRIORITY_INTERACTIVE, LLMRateLimiter, PooledLLMClient, TokenBucket, llm_priority,
+)
+from util.local_backend_util import FakeCompletionServer
+
+
+def test_shared_pool_and_concurrency_limit():
+    async def run():
+        server = FakeCompletionServer(delay=0.02, reply="xin chào")
+        await server.start()
+        client = PooledLLMClient(gpt_4o_mini_complete, max_concurrency=3,
+                                 base_url=server.base_url, api_key="test-key")
+        try:
+            answers = await asyncio.gather(*(client.complete(f"câu hỏi {i}") for i in range(12)))
+        finally:
+            await client.close()
+            await server.stop()
+        return server, answers
+
+    server, answers = asyncio.run(run())
+    assert answers == ["xin chào"] * 12
+    assert len(server.requests) == 12
+    assert server.max_in_flight <= 3
+    # Kết nối keep-alive được dùng lại thay vì mở mới cho mỗi lời gọi
+    assert server.connections <= 3
+
+
+def test_interactive_calls_jump_ahead_of_background():
+    async def run():
+        server = FakeCompletionServer(delay=0.02)
+        await server.start()
+        client = PooledLLMClient(gpt_4o_mini_complete, max_concurrency=1,
+                                 base_url=server.base_url, api_key="test-key")
+
+        async def interactive(i):
+            await asyncio.sleep(0.005)   # đến sau khi các lời gọi background đã xếp hàng
+            with llm_priority(PRIORITY_INTERACTIVE):
+                return await client.complete(f"query {i}")
+
+        try:
+            await asyncio.gather(*(client.complete(f"extract {i}") for i in range(5)),
+                                 *(interactive(i) for i in range(2)))
+        finally:
+            await client.close()
+            await server.stop()
+        return server.requests
+
+    order = asyncio.run(run())
+    # Lời gọi đầu đã chạy trước khi query đến; hai query được phục vụ ngay sau đó
+    assert order[0] == "extract 0"
+    assert order[1:3] == ["query 0", "query 1"]
+
+
+def test_token_bucket_delays_when_budget_is_exhausted():
+    bucket = TokenBucket(rate=100, capacity=100)
+    assert bucket.wait_time(100) == 0
+    bucket.consume(100)
+    assert 0.4 < bucket.wait_time(50) <= 0.5
+
+    async def run():
+        limiter = LLMRateLimiter(max_concurrency=4, requests_per_minute=6000, tokens_per_minute=6000)
+        limiter.token_bucket.tokens = 0   # hết ngân sách token: 100 token/s
+        started = asyncio.get_running_loop().time()
+        async with limiter.acquire(estimated_tokens=20):
+            pass
+        return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(run()) >= 0.15
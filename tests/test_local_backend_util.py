@@ -0,0 +1,21 @@
+"""
+Unit tests cho backend cục bộ (embedding băm xác định)
+"""
+
+import numpy as np
+
+from util.local_backend_util import LOCAL_EMBEDDING_DIM, hash_embed
+
+
+def test_hash_embed_is_deterministic_and_normalized():
+    texts = ["Napoleon sinh năm 1769", "Trận Waterloo năm 1815", ""]
+    first, second = hash_embed(texts), hash_embed(texts)
+    assert first.shape == (3, LOCAL_EMBEDDING_DIM)
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first[:2], axis=1), 1.0)
+    assert not first[2].any()
+
+
+def test_hash_embed_prefers_overlapping_text():
+    query, related, unrelated = hash_embed(["Napoleon sinh năm nào", "Napoleon sinh năm 1769", "Garde Impériale"])
+    assert query @ related > query @ unrelated
@@ -0,0 +1,48 @@
+"""
+Unit tests cho SizedLRUCache
+"""
+
+from util.lru_cache_util import SizedLRUCache
+
+
+def test_evicts_least_recently_used_when_over_item_limit():
+    cache = SizedLRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    evicted = cache.put("c", 3)
+
+    assert evicted == [("b", 2)]
+    assert cache.keys() == ["a", "c"]
+
+
+def test_evicts_by_size_and_skips_pinned_entries():
+    cache = SizedLRUCache(max_bytes=100, can_evict=lambda key, _: key != "pinned")
+    cache.put("pinned", "p", size=60)
+    cache.put("x", "x", size=30)
+    evicted = cache.put("y", "y", size=30)
+
+    assert evicted == [("x", "x")]
+    assert "pinned" in cache and "y" in cache
+    assert cache.total_bytes == 90
+
+
+def test_resize_triggers_eviction():
+    cache = SizedLRUCache(max_bytes=100)
+    cache.put("a", 1, size=10)
+    cache.put("b", 2, size=10)
+    evicted = cache.resize("b", 95)
+
+    assert evicted == [("a", 1)]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_peek_does_not_promote_or_count():
+    cache = SizedLRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.peek("a") == 1 and cache.peek("missing", 0) == 0
+    assert cache.get_stats()["hits"] == 0 and cache.get_stats()["misses"] == 0
+
+    # "a" vẫn là phần tử ít dùng nhất nên bị loại trước
+    assert cache.put("c", 3) == [("a", 1)]
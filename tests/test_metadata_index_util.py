@@ -0,0 +1,204 @@
+"""
+Unit tests cho chỉ mục metadata (file nguồn, mục JSON, ngày tháng) và truy vấn có bộ lọc
+"""
+
+import asyncio
+import json
+
+import numpy as np
+
+from ingestion import convert_json_to_text
+from util.fallback_index_util import FallbackIndex
+from util.metadata_index_util import (
+    FilteredChunkStorage, MetadataIndex, MetadataIndexedVectorStorage, restrict_chunks,
+)
+
+DATA = {
+    "ten": "Napoleon Bonaparte",
+    "ngay_sinh": "1769-08-15",
+    "tieu_su": {"thoi_tho_au": "Sinh ra ở Corsica năm 1769", "sup_do": "Thoái vị năm 1815"},
+    "tran_chien_lon": [
+        {"ten": "Austerlitz", "ngay": "1805-12-02", "ket_qua": "Chiến thắng"},
+        {"ten": "Borodino", "ngay": "1812-09-07", "ket_qua": "Chiến thắng tốn kém"},
+        {"ten": "Waterloo", "ngay": "1815-06-18", "ket_qua": "Thất bại"},
+    ],
+    "than_can": {"cac_tuong_than_can": [{"ten": "Ney"}, {"ten": "Davout"}]},
+}
+
+
+def _chunks():
+    blocks = convert_json_to_text(DATA).split("\n\n")
+    chunks = {f"chunk-{i}": (block, "data.json") for i, block in enumerate(blocks)}
+    chunks["chunk-txt"] = ("Trận Austerlitz năm 1805 là chiến thắng lớn nhất.", "/app/data/data.txt")
+    return chunks
+
+
+def _index():
+    index = MetadataIndex()
+    for chunk_id, (text, source) in _chunks().items():
+        index.add(chunk_id, text, source)
+    return index
+
+
+def _contents(ids):
+    chunks = _chunks()
+    return sorted(chunks[chunk_id][0].split("\n")[0] for chunk_id in ids)
+
+
+def test_candidates_by_source_section_and_date():
+    index = _index()
+
+    assert index.candidates() is None
+    assert _contents(index.candidates(section="tran_chien_lon")) == [
+        "tran_chien_lon[0].ten: Austerlitz", "tran_chien_lon[1].ten: Borodino", "tran_chien_lon[2].ten: Waterloo"]
+    assert _contents(index.candidates(section="tran_chien_lon[2]")) == ["tran_chien_lon[2].ten: Waterloo"]
+    assert _contents(index.candidates(section="than_can.cac_tuong_than_can")) == [
+        "than_can.cac_tuong_than_can[0].ten: Ney"]
+    # Mục JSON chỉ lấy từ file .json
+    assert index.candidates(source_file="data.txt") == {"chunk-txt"}
+
+    # Khoảng ngày: ngày ISO và năm đứng riêng đều được tính
+    in_1805 = index.candidates(date_from="1805", date_to="1805")
+    assert "chunk-txt" in in_1805
+    assert _contents(in_1805 - {"chunk-txt"}) == ["tran_chien_lon[0].ten: Austerlitz"]
+    assert _contents(index.candidates(section="tran_chien_lon", date_from="1812-01")) == [
+        "tran_chien_lon[1].ten: Borodino", "tran_chien_lon[2].ten: Waterloo"]
+    assert index.candidates(section="khong_ton_tai") == frozenset()
+
+
+def test_save_load_and_remove(tmp_path):
+    index = _index()
+    path = str(tmp_path / "metadata_index.json")
+    index.save(path)
+    loaded = MetadataIndex.load(path)
+    for filters in ({"section": "tran_chien_lon"}, {"date_from": "1812", "date_to": "1815-06"},
+                    {"source_file": "data.json", "section": "tieu_su"}):
+        assert loaded.candidates(**filters) == index.candidates(**filters)
+
+    waterloo = next(iter(index.candidates(section="tran_chien_lon[2]")))
+    loaded.remove([waterloo])
+    assert waterloo not in loaded.candidates(section="tran_chien_lon")
+    assert waterloo not in loaded.candidates(date_from="1815-06-18", date_to="1815-06-18")
+    assert MetadataIndex.load(str(tmp_path / "missing.json")).candidates(section="ten") == frozenset()
+
+
+def test_fallback_search_restricted_to_candidates():
+    paragraphs = [text for text, _ in _chunks().values()]
+    index = FallbackIndex.build(paragraphs)
+    candidates = [1, 3, 5]
+
+    # Cùng kết quả với tìm trên toàn corpus rồi chỉ giữ các đoạn ứng viên
+    allowed = {paragraphs[i] for i in candidates}
+    expected = [(score, p) for score, p in index.search("Austerlitz chiến thắng", len(paragraphs)) if p in allowed]
+    assert expected
+    assert index.search("Austerlitz chiến thắng", 10, candidates) == expected
+    assert index.search("Austerlitz", 10, []) == []
+    index.close()
+
+
+class FakeVectorStorage:
+    cosine_better_than_threshold = 0.0
+
+    def __init__(self):
+        self.records = {}
+        self.full_scans = 0
+        self.vectors_read = 0
+
+    @staticmethod
+    async def embedding_func(texts):
+        return [np.array([text.count("Austerlitz"), text.count("Waterloo"), 1.0]) for text in texts]
+
+    async def upsert(self, data):
+        for chunk_id, record in data.items():
+            vector = (await self.embedding_func([record["content"]]))[0]
+            self.records[chunk_id] = {**record, "id": chunk_id, "vector": vector}
+
+    async def delete(self, ids):
+        for chunk_id in ids:
+            self.records.pop(chunk_id, None)
+
+    async def query(self, query, top_k, query_embedding=None):
+        self.full_scans += 1
+        return list(self.records.values())[:top_k]
+
+    async def get_vectors_by_ids(self, ids):
+        self.vectors_read += len(ids)
+        return {chunk_id: self.records[chunk_id]["vector"] for chunk_id in ids if chunk_id in self.records}
+
+    async def get_by_ids(self, ids):
+        return [{k: v for k, v in self.records[i].items() if k != "vector"} if i in self.records else None
+                for i in ids]
+
+    async def index_done_callback(self):
+        pass
+
+
+def test_vector_storage_wrapper_indexes_upserts_and_filters_queries(tmp_path):
+    storage = FakeVectorStorage()
+    index = MetadataIndex()
+    chunks_vdb = MetadataIndexedVectorStorage(storage, index, str(tmp_path / "metadata_index.json"))
+    text_chunks = FilteredChunkStorage(storage)
+
+    async def run():
+        await chunks_vdb.upsert({chunk_id: {"content": text, "file_path": source}
+                                 for chunk_id, (text, source) in _chunks().items()})
+        await chunks_vdb.index_done_callback()
+        battles = index.candidates(section="tran_chien_lon")
+        with restrict_chunks(battles):
+            results = await chunks_vdb.query("Waterloo", top_k=2)
+            records = await text_chunks.get_by_ids(["chunk-txt", *sorted(battles)])
+        unfiltered = await chunks_vdb.query("Waterloo", top_k=2)
+        return battles, results, records, unfiltered
+
+    battles, results, records, unfiltered = asyncio.run(run())
+    # Chỉ đọc vector của các chunk ứng viên, không quét toàn bộ chỉ mục
+    assert storage.full_scans == 1 and storage.vectors_read == len(battles) == 3
+    assert results[0]["content"].startswith("tran_chien_lon[2].ten: Waterloo")
+    assert all(result["id"] in battles for result in results)
+    assert records[0] is None and all(record is not None for record in records[1:])
+    assert len(unfiltered) == 2
+    assert len(MetadataIndex.load(str(tmp_path / "metadata_index.json"))) == len(_chunks())
+
+
+def test_rag_service_fallback_applies_filters(tmp_path, make_rag_service, unavailable_rag_factory):
+    text_path, json_path = tmp_path / "data.txt", tmp_path / "data.json"
+    text_path.write_text("Trận Waterloo năm 1815 là thất bại cuối cùng.", encoding="utf-8")
+    json_path.write_text(json.dumps(DATA, ensure_ascii=False), encoding="utf-8")
+
+    service = make_rag_service(text_path, json_path, rag_factory=unavailable_rag_factory)
+
+    async def run():
+        unfiltered = await service.get_answer("Waterloo", top_k=1)
+        filtered = await service.get_answer("Waterloo", top_k=1, filters={"section": "tran_chien_lon"})
+        empty = await service.get_answer("Waterloo", top_k=1, filters={"date_from": "1900"})
+        return unfiltered, filtered, empty
+
+    unfiltered, filtered, empty = asyncio.run(run())
+    assert "data.txt" in unfiltered
+    assert filtered.startswith("tran_chien_lon[2].ten: Waterloo")
+    assert empty.endswith("[no-context]")
+
+
+def test_chunks_cut_mid_identifier_keep_their_real_section(tmp_path):
+    json_path = tmp_path / "data.json"
+    json_path.write_text(json.dumps(DATA, ensure_ascii=False), encoding="utf-8")
+    # Chunk cắt theo token bắt đầu giữa định danh "than_can..." / giữa giá trị "Thất bại"
+    cut_root = "can.cac_tuong_than_can[1].ten: Davout"
+    cut_inner = "ong_than_can[0].ten: Ney\nthan_can.cac_tuong_than_can[1].ten: Davout"
+    cut_value = "bại: cuối cùng\ntran_chien_lon[2].ngay: 1815-06-18"
+    chunks = {"a": cut_root, "b": cut_inner, "c": cut_value}
+
+    index = MetadataIndex()
+    chunks_vdb = MetadataIndexedVectorStorage(FakeVectorStorage(), index)
+    asyncio.run(chunks_vdb.upsert({chunk_id: {"content": text, "file_path": str(json_path)}
+                                   for chunk_id, text in chunks.items()}))
+    assert index.candidates(section="can") == frozenset()
+    assert index.candidates(section="than_can") == {"a", "b"}
+    assert index.candidates(section="than_can.cac_tuong_than_can[1]") == {"a", "b"}
+    assert index.candidates(section="than_can.cac_tuong_than_can[0]") == frozenset()
+    assert index.candidates(section="tran_chien_lon[2]") == {"c"}
+
+    # Không đọc được file nguồn: bỏ qua dòng đầu thay vì tạo mục giả
+    fallback = MetadataIndex()
+    fallback.add("a", cut_root, "missing.json", starts_at_line=False)
+    assert fallback.candidates(section="can") == frozenset() == fallback.candidates(section="than_can")
@@ -0,0 +1,44 @@
+"""
+Unit tests cho capture lưu lượng /query (file JSONL xoay vòng)
+"""
+
+import os
+
+from util.query_capture_util import QueryCaptureLog, answer_digest
+
+
+def test_capture_rotates_and_reads_back_in_order(tmp_path):
+    path = str(tmp_path / "capture.jsonl")
+    capture = QueryCaptureLog(path, max_bytes=600, backup_count=2)
+    for i in range(12):
+        capture.record(f"Câu hỏi số {i}?", "mix", 5, "default", status=200, latency_ms=10.0 + i,
+                       started_at=1000.0 + i, answer=f"trả lời {i}", answer_source="fallback")
+    capture.close()
+
+    assert os.path.exists(f"{path}.1") and os.path.exists(f"{path}.2")
+    assert not os.path.exists(f"{path}.3")
+    assert all(os.path.getsize(file_path) <= 600 for file_path in QueryCaptureLog.capture_files(path))
+
+    records = QueryCaptureLog.read(path)
+    timestamps = [record["ts"] for record in records]
+    assert timestamps == sorted(timestamps)
+    # Bản cũ nhất bị loại khi vượt backup_count, các bản còn lại liền mạch tới request cuối
+    assert records[-1]["question"] == "Câu hỏi số 11?"
+    assert [int(ts) for ts in timestamps] == list(range(1012 - len(records), 1012))
+    assert records[-1]["answer_sha1"] == answer_digest("trả lời 11")
+    assert "answer" not in records[-1]
+
+
+def test_capture_disabled_and_truncated_lines(tmp_path):
+    QueryCaptureLog(None).record("q", "mix", 5, "default", status=200, latency_ms=1.0)
+
+    path = str(tmp_path / "capture.jsonl")
+    capture = QueryCaptureLog(path, include_answers=True)
+    capture.record("Napoleon là ai?", "naive", 3, "default", status=200, latency_ms=5.0, answer="Hoàng đế")
+    capture.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"ts": 1, "question": "bị cắ')   # dòng cuối bị cắt khi tiến trình dừng đột ngột
+
+    records = QueryCaptureLog.read(path)
+    assert len(records) == 1
+    assert records[0]["answer"] == "Hoàng đế" and records[0]["mode"] == "naive"
@@ -0,0 +1,104 @@
+"""
+Unit tests cho phiên hội thoại: dùng lại/mở rộng ngữ cảnh, nén lịch sử, giới hạn kích thước và TTL
+"""
+
+import asyncio
+
+from service.session_service import Session, SessionService
+from util.metrics_util import MetricsUtil
+
+CHUNKS = {
+    "Napoleon": {"chunk_id": "c-napoleon", "file_path": "data.txt",
+                 "content": "Napoleon Bonaparte sinh năm 1769 ở Corsica, đăng quang hoàng đế năm 1804."},
+    "Austerlitz": {"chunk_id": "c-austerlitz", "file_path": "data.txt",
+                   "content": "Trận Austerlitz năm 1805 là chiến thắng lớn nhất của Napoleon."},
+    "Waterloo": {"chunk_id": "c-waterloo", "file_path": "data.txt",
+                 "content": "Trận Waterloo năm 1815 là thất bại cuối cùng của Napoleon."},
+}
+
+
+def _retrieve(question, param):
+    chunks = [chunk for name, chunk in CHUNKS.items() if name in question]
+    return {"status": "success", "data": {"entities": [], "relationships": [], "chunks": chunks}}
+
+
+def test_follow_ups_reuse_or_extend_session_context(fake_rag, make_rag_service):
+    MetricsUtil.reset()
+    rag = fake_rag
+    rag.retrieve, rag.answer = _retrieve, lambda prompt: f"Trả lời: {prompt}"
+    service = make_rag_service()
+    sessions = SessionService()
+
+    async def ask(question, session_id="s1"):
+        session = sessions.get(session_id, "default")
+        answer, source = await service.get_answer_with_source(question, mode="naive", session=session)
+        session.add_turn(question, answer)
+        return source
+
+    async def run():
+        assert await ask("Napoleon và trận Austerlitz") == "rag"
+        await ask("Trận Austerlitz năm nào?")            # Đã có trong ngữ cảnh: không truy xuất
+        await ask("Còn trận Waterloo thì sao?")          # Chủ đề mới: truy xuất và mở rộng ngữ cảnh
+        await ask("Napoleon sinh năm nào?", "s2")        # Phiên khác không thấy ngữ cảnh của s1
+
+    asyncio.run(run())
+    assert len(rag.retrieved) == 3
+    assert rag.retrieved[1] == "Trận Austerlitz năm nào?\nCòn trận Waterloo thì sao?"
+    assert MetricsUtil.get_counter("session_retrievals_total") == 3
+    assert MetricsUtil.get_counter("session_retrievals_saved_total") == 1
+
+    # Ngữ cảnh mở rộng giữ cả chunk cũ, chunk mới đứng trước; lịch sử gửi kèm lời gọi LLM
+    _, context, history = rag.calls[2]
+    assert context.index("Waterloo năm 1815") < context.index("sinh năm 1769")
+    assert [message["content"] for message in history] == [
+        "Napoleon và trận Austerlitz", "Trả lời: Napoleon và trận Austerlitz",
+        "Trận Austerlitz năm nào?", "Trả lời: Trận Austerlitz năm nào?",
+    ]
+    assert rag.calls[3][2] == [] and "Waterloo" not in rag.calls[3][1]
+
+    # Đổi bộ lọc thì không dùng lại ngữ cảnh cũ
+    session = sessions.get("s1", "default")
+    asyncio.run(service.get_answer_with_source("Trận Austerlitz năm nào?", mode="naive",
+                                               filters={"date_from": "1805"}, session=session))
+    assert len(rag.retrieved) == 4
+
+    # Đánh chỉ mục lại cũng vậy: chunk đã cache có thể không còn trong chỉ mục mới
+    asyncio.run(service.get_answer_with_source("Trận Austerlitz năm nào?", mode="naive",
+                                               filters={"date_from": "1805"}, session=session))
+    assert len(rag.retrieved) == 4
+    service.index_version += 1
+    asyncio.run(service.get_answer_with_source("Trận Austerlitz năm nào?", mode="naive",
+                                               filters={"date_from": "1805"}, session=session))
+    assert len(rag.retrieved) == 5
+
+
+def test_history_compression_and_item_bounds():
+    session = Session("s", "default", max_turns=2, max_summary_chars=120, max_items=3)
+    for i in range(6):
+        session.add_turn(f"Câu hỏi {i}?", f"Câu trả lời số {i}. Chi tiết dài dòng không cần giữ.")
+    assert [turn["question"] for turn in session.turns] == ["Câu hỏi 4?", "Câu hỏi 5?"]
+    assert sum(len(line) + 1 for line in session.summary) <= 120
+    assert session.summary[-1] == "- Hỏi: Câu hỏi 3? → Đáp: Câu trả lời số 3."
+    assert session.history_messages()[0]["role"] == "system"
+
+    session.remember({"chunks": [{"chunk_id": f"c{i}", "content": "x"} for i in range(5)]})
+    session.remember({"chunks": [{"chunk_id": "c9", "content": "y"}, {"chunk_id": "c0", "content": "x"}]})
+    assert [chunk["chunk_id"] for chunk in session.context["chunks"]] == ["c9", "c0", "c1"]
+
+
+def test_ttl_and_capacity_eviction():
+    sessions = SessionService(max_sessions=2, ttl=60)
+    first = sessions.get("a", "default")
+    sessions.get("b", "default")
+    assert sessions.get("a", "default") is first      # Vừa dùng lại nên "b" là phiên cũ nhất
+    sessions.get("c", "default")
+    assert len(sessions) == 2 and sessions.evictions["capacity"] == 1
+    assert sessions.get("a", "default") is first
+
+    first.last_used -= 120
+    sessions._sessions.move_to_end("a", last=False)
+    sessions.evict_expired()
+    assert len(sessions) == 1 and sessions.evictions["ttl"] == 1
+    assert sessions.get("a", "default") is not first
+    # Đổi corpus thì bắt đầu phiên mới
+    assert sessions.get("c", "other").corpus_id == "other"
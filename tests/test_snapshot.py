@@ -0,0 +1,222 @@
+"""
+Unit tests cho snapshot chỉ mục - lưu/nạp FallbackIndex và phát hiện snapshot cũ
+"""
+
+import asyncio
+import io
+import json
+import os
+import tarfile
+
+from ingestion import (
+    FALLBACK_INDEX_DIR, SNAPSHOT_GRAPH_FILE, compute_corpus_hash, convert_json_to_text, export_graph, file_sha256,
+    restore_snapshot, write_snapshot,
+)
+from util.fallback_index_util import FallbackIndex
+
+
+class MemoryGraph:
+    """
+    Graph storage trong bộ nhớ; get_all_edges trả cả hai chiều như Neo4JStorage
+    """
+
+    def __init__(self, nodes=None, edges=None):
+        self.nodes = dict(nodes or {})
+        self.edges = dict(edges or {})
+        self.drops = 0
+
+    async def get_all_nodes(self):
+        return [{**data, "id": node_id} for node_id, data in self.nodes.items()]
+
+    async def get_all_edges(self):
+        return [{**data, "source": a, "target": b} for (src, tgt), data in self.edges.items()
+                for a, b in ((src, tgt), (tgt, src))]
+
+    async def get_all_labels(self):
+        return sorted(self.nodes)
+
+    async def upsert_nodes_batch(self, nodes):
+        self.nodes.update(nodes)
+
+    async def upsert_edges_batch(self, edges):
+        self.edges.update(((src, tgt), data) for src, tgt, data in edges)
+
+    async def index_done_callback(self):
+        pass
+
+    async def drop(self):
+        self.drops += 1
+        self.nodes.clear()
+        self.edges.clear()
+
+
+def _graph():
+    return MemoryGraph({"Napoleon": {"entity_id": "Napoleon"}, "Ney": {"entity_id": "Ney"}},
+                       {("Napoleon", "Ney"): {"description": "thống chế"}})
+
+
+def _export(directory, graph=None):
+    directory.mkdir(parents=True, exist_ok=True)
+    return asyncio.run(export_graph(graph or _graph(), str(directory)))
+
+
+def test_fallback_index_save_load_roundtrip(tmp_path):
+    index = FallbackIndex.from_text("Napoleon là hoàng đế\n\nTrận Waterloo năm 1815")
+    index.save(str(tmp_path / "index"))
+    loaded = FallbackIndex.load(str(tmp_path / "index"))
+
+    for question in ["Napoleon là ai?", "waterloo", "hoang de"]:
+        assert loaded.search(question, 5) == index.search(question, 5)
+    index.close()
+    loaded.close()
+
+
+def test_restore_detects_stale_and_corrupt_snapshot(tmp_path):
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("alpha beta\n\ngamma delta", encoding="utf-8")
+    built_dir = tmp_path / "built"
+    FallbackIndex.from_text(data_file.read_text(encoding="utf-8")).save(str(built_dir / FALLBACK_INDEX_DIR))
+    _export(built_dir)
+    archive = str(tmp_path / "snapshot.tar.gz")
+    write_snapshot(str(built_dir), [str(data_file)], archive)
+
+    # Snapshot khớp dữ liệu -> khôi phục được, chỉ mục nạp lại bằng memory-map
+    working_dir = tmp_path / "restored"
+    manifest = restore_snapshot(archive, str(working_dir), [str(data_file)])
+    assert manifest is not None
+    index = FallbackIndex.load(str(working_dir / FALLBACK_INDEX_DIR))
+    assert [p for _, p in index.search("gamma", 5)] == ["gamma delta"]
+    index.close()
+
+    # Khôi phục lần hai không cần giải nén lại
+    assert restore_snapshot(archive, str(working_dir), [str(data_file)]) is not None
+
+    # Dữ liệu thay đổi -> snapshot cũ
+    data_file.write_text("alpha beta\n\nepsilon", encoding="utf-8")
+    assert restore_snapshot(archive, str(tmp_path / "stale"), [str(data_file)]) is None
+    assert not os.path.exists(tmp_path / "stale")
+
+    # Archive bị sửa -> checksum sai
+    with open(archive, "ab") as f:
+        f.write(b"garbage")
+    assert restore_snapshot(archive, str(tmp_path / "corrupt"), [str(data_file)]) is None
+
+
+def test_restore_replaces_contents_in_place(tmp_path):
+    data_file, data_json = tmp_path / "data.txt", tmp_path / "data.json"
+    data_file.write_text("alpha beta", encoding="utf-8")
+    data_json.write_text('{"name": "alpha"}', encoding="utf-8")
+    assert compute_corpus_hash([str(data_file), str(data_json)]) == compute_corpus_hash([str(data_json), str(data_file)])
+
+    built_dir = tmp_path / "built"
+    built_dir.mkdir()
+    (built_dir / "kv_store_full_docs.json").write_text("{}", encoding="utf-8")
+    _export(built_dir)
+    archive = str(tmp_path / "snapshot.tar.gz")
+    write_snapshot(str(built_dir), [str(data_file), str(data_json)], archive)
+    # Thư mục vừa đóng gói đã có manifest cục bộ: khởi động lại không giải nén
+    (built_dir / "marker").write_text("", encoding="utf-8")
+    assert restore_snapshot(archive, str(built_dir), [str(data_file), str(data_json)]) is not None
+    assert (built_dir / "marker").exists()
+
+    # working_dir (có thể là mount point) được giữ nguyên, chỉ nội dung bị thay; không sót thư mục tạm
+    working_dir = tmp_path / "storage"
+    (working_dir / ".snapshot_old").mkdir(parents=True)
+    (working_dir / "vdb_chunks.json").write_text("cũ", encoding="utf-8")
+    inode = os.stat(working_dir).st_ino
+    assert restore_snapshot(archive, str(working_dir), [str(data_json), str(data_file)]) is not None
+    assert os.stat(working_dir).st_ino == inode
+    assert sorted(os.listdir(working_dir)) == ["kv_store_full_docs.json", "snapshot_graph.json",
+                                               "snapshot_manifest.json"]
+
+
+def test_snapshot_packages_graph_and_rejects_archives_without_it(tmp_path):
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("Napoleon và Ney", encoding="utf-8")
+    built_dir = tmp_path / "built"
+    assert _export(built_dir) == {"nodes": 2, "edges": 1}   # cạnh hai chiều chỉ ghi một lần
+    archive = str(tmp_path / "snapshot.tar.gz")
+    manifest = write_snapshot(str(built_dir), [str(data_file)], archive)
+    assert manifest["graph"] == {"file": SNAPSHOT_GRAPH_FILE, "nodes": 2, "edges": 1}
+
+    assert restore_snapshot(archive, str(tmp_path / "ok"), [str(data_file)])["graph"]["nodes"] == 2
+
+    # Archive có đồ thị không khớp manifest (hoặc thiếu đồ thị): không dùng snapshot
+    broken = str(tmp_path / "broken.tar.gz")
+    empty_graph = json.dumps({"nodes": [], "edges": []}).encode("utf-8")
+    with tarfile.open(archive, "r:gz") as src, tarfile.open(broken, "w:gz") as dst:
+        for member in src.getmembers():
+            data = src.extractfile(member).read()
+            if member.name == SNAPSHOT_GRAPH_FILE:
+                data, member.size = empty_graph, len(empty_graph)
+            dst.addfile(member, io.BytesIO(data))
+    with open(f"{broken}.sha256", "w", encoding="utf-8") as f:
+        f.write(file_sha256(broken))
+    assert restore_snapshot(broken, str(tmp_path / "broken"), [str(data_file)]) is None
+    assert os.listdir(tmp_path / "broken") == []
+
+    # Thư mục đã đánh chỉ mục nhưng chưa xuất đồ thị: không đóng gói được
+    (built_dir / SNAPSHOT_GRAPH_FILE).unlink()
+    try:
+        write_snapshot(str(built_dir), [str(data_file)], broken)
+        raise AssertionError("write_snapshot must require the exported graph")
+    except FileNotFoundError:
+        pass
+
+
+def test_service_loads_snapshot_graph_into_empty_graph_storage(tmp_path, fake_rag, make_rag_service):
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("Napoleon", encoding="utf-8")
+    built_dir = tmp_path / "built"
+    _export(built_dir)
+    archive = str(tmp_path / "snapshot.tar.gz")
+    write_snapshot(str(built_dir), [str(data_file)] * 2, archive)   # data_path và data_path_json
+
+    # Neo4j mới (trống): đồ thị được nạp từ snapshot, không đánh chỉ mục lại
+    fake_rag.chunk_entity_relation_graph = MemoryGraph()
+    service = make_rag_service(snapshot_path=archive)
+    asyncio.run(service.initialize())
+    assert service.snapshot_manifest is not None and fake_rag.inserted == []
+    assert sorted(fake_rag.chunk_entity_relation_graph.nodes) == ["Napoleon", "Ney"]
+    assert list(fake_rag.chunk_entity_relation_graph.edges) == [("Napoleon", "Ney")]
+
+    # Đồ thị đã có đủ: không nạp lại
+    restarted = make_rag_service(snapshot_path=archive)
+    asyncio.run(restarted.initialize())
+    assert fake_rag.chunk_entity_relation_graph.drops == 1 and fake_rag.inserted == []
+
+
+def test_service_reindexes_when_snapshot_graph_cannot_be_loaded(tmp_path, fake_rag, make_rag_service):
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("Napoleon", encoding="utf-8")
+    built_dir = tmp_path / "built"
+    _export(built_dir)
+    (built_dir / "kv_store_doc_status.json").write_text("{}", encoding="utf-8")
+    archive = str(tmp_path / "snapshot.tar.gz")
+    write_snapshot(str(built_dir), [str(data_file)] * 2, archive)   # data_path và data_path_json
+
+    class FailingGraph(MemoryGraph):
+        async def upsert_nodes_batch(self, nodes):
+            raise ConnectionError("neo4j unavailable")
+
+    async def finalize_storages():
+        pass
+
+    fake_rag.chunk_entity_relation_graph = FailingGraph()
+    fake_rag.finalize_storages = finalize_storages
+    service = make_rag_service(snapshot_path=archive)
+    asyncio.run(service.initialize())
+    # Trạng thái tài liệu của snapshot bị bỏ, dữ liệu được đánh chỉ mục lại
+    assert [file_paths for _, file_paths in fake_rag.inserted] == [[str(data_file)]] * 2
+    assert not os.path.exists(os.path.join(service.working_dir, "kv_store_doc_status.json"))
+
+
+def test_convert_json_to_text():
+    text = convert_json_to_text({
+        "person": {"name": "Napoleon", "titles": ["Emperor", "General"]},
+        "battles": [{"name": "Austerlitz", "year": 1805}, {"name": "Waterloo", "year": 1815}],
+    })
+    blocks = text.split("\n\n")
+    assert blocks[0] == "person.name: Napoleon\nperson.titles: Emperor; General"
+    assert blocks[1] == "battles[0].name: Austerlitz\nbattles[0].year: 1805"
+    assert len(blocks) == 3
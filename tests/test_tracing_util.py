@@ -0,0 +1,93 @@
+"""
+Unit tests cho tracing span và profiler lấy mẫu
+"""
+
+import asyncio
+import json
+import time
+
+from util.profiling_util import ProfilingUtil
+from util.graph_cache_util import CachedGraphStorage
+from util.tracing_util import TracedStorage, TracingUtil, traced
+
+
+def test_nested_spans_are_exported_as_one_trace(tmp_path):
+    export_path = tmp_path / "traces.jsonl"
+    TracingUtil.configure(str(export_path))
+
+    @traced("llm.complete")
+    async def fake_llm():
+        await asyncio.sleep(0)
+        return "ok"
+
+    async def handle():
+        with TracingUtil.span("query", mode="mix") as root:
+            with TracingUtil.span("validate"):
+                pass
+            # Task con kế thừa span hiện tại qua contextvars
+            await asyncio.gather(fake_llm(), fake_llm())
+            return root
+
+    try:
+        root = asyncio.run(handle())
+    finally:
+        TracingUtil.configure(None)
+
+    records = [json.loads(line) for line in export_path.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 1
+    spans = records[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["query", "validate", "llm.complete", "llm.complete"]
+    assert {s["traceId"] for s in spans} == {root.trace_id}
+    assert all(s["parentSpanId"] == root.span_id for s in spans[1:])
+    assert "parentSpanId" not in spans[0]
+
+
+def test_profiler_samples_busy_code(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProfilingUtil, "enabled", True)
+    monkeypatch.setattr(ProfilingUtil, "output_dir", str(tmp_path))
+    monkeypatch.setattr(ProfilingUtil, "interval", 0.001)
+
+    def busy_loop():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+
+    profiler = ProfilingUtil.start()
+    assert profiler is not None
+    assert ProfilingUtil.start() is None   # chỉ profile một request mỗi lúc
+    busy_loop()
+    summary = ProfilingUtil.finish(profiler, "abc123")
+
+    assert summary["samples"] > 0
+    assert "busy_loop" in ProfilingUtil.load("abc123")
+    assert ProfilingUtil.load("../etc") is None
+
+
+def test_traced_storage_spans_backend_calls_only_inside_a_trace(tmp_path):
+    export_path = tmp_path / "traces.jsonl"
+    TracingUtil.configure(str(export_path))
+
+    class FakeNeo4j:
+        namespace = "chunk_entity_relation"
+
+        async def get_nodes_batch(self, node_ids):
+            return {node_id: {"entity_id": node_id} for node_id in node_ids}
+
+    graph = CachedGraphStorage(TracedStorage(FakeNeo4j(), "neo4j"))
+
+    async def handle():
+        with TracingUtil.span("query"):
+            await graph.get_nodes_batch(["Napoleon"])
+            await graph.get_nodes_batch(["Napoleon"])   # cache hit: không gọi Neo4j
+
+    try:
+        asyncio.run(graph.get_nodes_batch(["Waterloo"]))   # ngoài request: không tạo trace
+        asyncio.run(handle())
+    finally:
+        TracingUtil.configure(None)
+
+    records = [json.loads(line) for line in export_path.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 1
+    spans = records[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["query", "neo4j.get_nodes_batch"]
+    assert graph.storage.namespace == "chunk_entity_relation"
@@ -0,0 +1,38 @@
+"""
+Unit tests cho VietnameseTokenizer
+"""
+
+import unicodedata
+
+from util.fallback_index_util import FallbackIndex
+from util.vietnamese_tokenizer_util import VietnameseTokenizer
+
+
+def test_nfc_normalization_makes_composed_and_decomposed_equal():
+    tokenizer = VietnameseTokenizer()
+    decomposed = unicodedata.normalize("NFD", "Hoàng đế")
+    assert tokenizer.terms(decomposed) == tokenizer.terms("Hoàng đế")
+
+
+def test_stopwords_removed_and_bigrams_added():
+    tokenizer = VietnameseTokenizer(fold_accents=False)
+    terms = tokenizer.terms("Napoleon là Hoàng đế của Pháp")
+    assert "là" not in terms and "của" not in terms
+    assert "hoàng_đế" in terms
+    assert "napoleon_là" not in terms
+
+
+def test_unaccented_question_matches_accented_passage():
+    index = FallbackIndex.build([
+        "Napoleon sinh năm 1769 trên đảo Corsica.",
+        "Trận Waterloo diễn ra năm 1815.",
+    ])
+    results = index.search("napoleon sinh nam nao", 1)
+    assert results and "1769" in results[0][1]
+
+
+def test_accented_question_scores_higher_than_unaccented():
+    index = FallbackIndex.build(["Cách mạng Pháp bùng nổ năm 1789."])
+    accented = index.search("Cách mạng Pháp", 1)[0][0]
+    unaccented = index.search("cach mang phap", 1)[0][0]
+    assert accented > unaccented > 0
@@ -0,0 +1,117 @@
+"""
+Unit tests cho thống kê câu hỏi và warm-up cache
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from controller.rag_controller import RAGController
+from dto.QueryRequest import QueryRequest
+from service.warmup_service import WarmupService
+from util.query_capture_util import QueryCaptureLog
+from util.query_log_util import QueryFrequencyLog
+
+
+class RecordingService:
+    def __init__(self):
+        self.questions = []
+
+    async def get_answer(self, question, mode="mix", top_k=5, force_reindex=False):
+        self.questions.append((question, mode, top_k))
+        return "ok"
+
+
+class FakeCorpusService:
+    def __init__(self):
+        self.service = RecordingService()
+
+    @asynccontextmanager
+    async def use(self, corpus_id=None):
+        yield self.service
+
+
+def test_frequencies_are_normalized_and_persisted(tmp_path):
+    path = str(tmp_path / "queries.json")
+    log = QueryFrequencyLog(path, save_every=1000)
+    for question in ["Napoleon là ai?", "  napoleon   LÀ ai ", "Napoleon sinh năm nào?"]:
+        log.record(question, "mix", 5, "default")
+    log.record("Napoleon là ai?", "naive", 5, "default")
+    log.save()
+
+    reloaded = QueryFrequencyLog(path)
+    top = reloaded.top(2)
+    assert top[0]["normalized"] == "napoleon là ai" and top[0]["count"] == 2 and top[0]["mode"] == "mix"
+    assert len(reloaded) == 3
+
+
+def test_record_leaves_saving_to_the_caller_and_saves_are_serialized(tmp_path, capsys):
+    path = str(tmp_path / "queries.json")
+    log = QueryFrequencyLog(path, save_every=3)
+    assert [log.record(f"Câu hỏi {i}?", "mix", 5, "default") for i in range(3)] == [False, False, True]
+    assert not os.path.exists(path)   # record() không ghi file trên event loop
+
+    # Nhiều lần lưu đồng thời (thread pool I/O) trong khi vẫn ghi nhận câu hỏi mới
+    def record_and_save(worker):
+        for i in range(20):
+            log.record(f"Luồng {worker} câu {i}?", "mix", 5, "default")
+            log.save()
+
+    threads = [threading.Thread(target=record_and_save, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.save()
+    assert len(QueryFrequencyLog(path)) == 83 and not os.path.exists(f"{path}.tmp")
+    assert "Failed to save" not in capsys.readouterr().out
+
+
+def test_warmup_replays_top_questions_and_reports_progress():
+    log = QueryFrequencyLog()
+    for _ in range(3):
+        log.record("Napoleon là ai?", "mix", 5, "default")
+    log.record("Trận Waterloo?", "naive", 3, "default")
+    log.record("Trận Waterloo?", "naive", 3, "default")
+    log.record("hiếm gặp", "mix", 5, "default")
+
+    corpus_service = FakeCorpusService()
+    warmup = WarmupService(corpus_service, log, top_n=2, rate_per_second=1000)
+    assert warmup.get_status()["state"] == "idle"
+
+    async def run():
+        await warmup.start()
+
+    asyncio.run(run())
+    assert corpus_service.service.questions == [("Napoleon là ai?", "mix", 5), ("Trận Waterloo?", "naive", 3)]
+    status = warmup.get_status()
+    assert status["state"] == "done" and status["completed"] == 2 and status["progress"] == 1.0
+    assert WarmupService(corpus_service, log, top_n=0).get_status()["state"] == "disabled"
+
+
+def test_controller_logs_only_replayable_questions_outside_storage(tmp_path, monkeypatch, fake_rag):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("QUERY_LOG_PATH", raising=False)
+    monkeypatch.setenv("RAG_STORAGE_PATH", str(tmp_path / "storage"))
+    monkeypatch.setenv("QUERY_CAPTURE_PATH", str(tmp_path / "capture.jsonl"))
+    data_file = tmp_path / "data" / "data.txt"
+    data_file.parent.mkdir()
+    data_file.write_text("Napoleon sinh năm 1769.", encoding="utf-8")
+    controller = RAGController(str(data_file), str(data_file))
+    controller.rag_service.rag_factory = fake_rag.factory
+
+    # Thống kê nằm ngoài thư mục chỉ mục (bị thay khi nạp snapshot/đánh chỉ mục lại)
+    log_path = os.path.abspath(controller.query_log.path)
+    assert not log_path.startswith(str(tmp_path / "storage"))
+
+    for request in (QueryRequest(question="Napoleon là ai?", mode="naive"),
+                    QueryRequest(question="Còn Ney?", mode="naive", session_id="s1"),
+                    QueryRequest(question="Trận nào?", mode="naive", source_file="data.json")):
+        asyncio.run(controller.process_query(request))
+    assert [entry["question"] for entry in controller.query_log.top(10)] == ["Napoleon là ai?"]
+
+    # Capture ghi cả bộ lọc nên giữ truy vấn có lọc, nhưng bỏ câu hỏi tiếp nối trong phiên
+    controller.query_capture.close()
+    records = QueryCaptureLog.read(str(tmp_path / "capture.jsonl"))
+    assert [record["question"] for record in records] == ["Napoleon là ai?", "Trận nào?"]